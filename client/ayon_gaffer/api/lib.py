@@ -4,6 +4,7 @@ import re
 from typing import Tuple, List, Optional
 
 import Gaffer
+import GafferDispatch
 import GafferScene
 import imath
 
@@ -728,6 +729,46 @@ def create_multishot_context_vars(script_node):
         context_vars.addChild(render_shot_plug)
 
 
+def disable_render_shot_members(node):
+    """Disable `render:shot` on the ContextVariables nodes feeding the task
+    output of `node`.
+
+    Publishes used to set `render:shot` on the render layer's
+    ContextVariables node and left the member enabled with an empty value.
+    `render:shot` is now set in the context the layer is dispatched in,
+    which that member would override on the farm.
+
+    Args:
+        node (Gaffer.Node): The render layer node.
+
+    Returns:
+        list: The member plugs that were disabled.
+    """
+    disabled = []
+    for plug in node.children(GafferDispatch.TaskNode.TaskPlug):
+        if (
+            plug.direction() != Gaffer.Plug.Direction.Out or
+            plug.getInput() is None
+        ):
+            continue
+        source_node = plug.getInput().node()
+        context_nodes = [source_node] + list(Gaffer.NodeAlgo.upstreamNodes(
+            source_node, Gaffer.ContextVariables))
+        for context_node in context_nodes:
+            if not isinstance(context_node, Gaffer.ContextVariables):
+                continue
+            for member in context_node["variables"].children():
+                if (
+                    member["name"].getValue() == "render:shot" and
+                    "enabled" in member and
+                    member["enabled"].getValue()
+                ):
+                    member["enabled"].setValue(False)
+                    disabled.append(member)
+
+    return disabled
+
+
 def node_name_from_template(template_string, context):
     try:
         from ayon_core.pipeline.template_data import (
@@ -772,21 +813,29 @@ def node_name_from_template(template_string, context):
     return template.format(formatting_data)
 
 
-def append_to_csv_plug(plug, value_to_add, allow_duplicates=False):
+def append_to_csv(current_value, value_to_add, allow_duplicates=False):
     '''
-    csv in this case is comma-separated-value
-    some plugs, like deadline's limit parameter expects a comma separated list
-    of things. This utility function makes adding to such lists easier
+    Return `current_value` with `value_to_add` appended, see
+    `append_to_csv_plug()`.
     '''
-
-    current_value = plug.getValue()
     value_list = current_value.split(',')
     if allow_duplicates:
         value_list.append(value_to_add)
     else:
         if value_to_add not in value_list:
             value_list.append(value_to_add)
-    plug.setValue(",".join(value_list))
+    return ",".join(value_list)
+
+
+def append_to_csv_plug(plug, value_to_add, allow_duplicates=False):
+    '''
+    csv in this case is comma-separated-value
+    some plugs, like deadline's limit parameter expects a comma separated list
+    of things. This utility function makes adding to such lists easier
+    '''
+
+    plug.setValue(
+        append_to_csv(plug.getValue(), value_to_add, allow_duplicates))
 
 
 def traverse_nodegraph(root_node: Gaffer.Node, result: list):
@@ -807,3 +856,65 @@ def get_all_children(root_node: Gaffer.Node):
     all_nodes = []
     traverse_nodegraph(root_node, all_nodes)
     return all_nodes
+
+
+class NodeTypeIndex(object):
+    """Index of all the nodes in a script by their type name.
+
+    The index is built by traversing the script once and isn't updated
+    when the script changes, so build one when it is needed, for instance
+    once per publish. Whether a node is enabled is only evaluated the first
+    time it is needed, in the context current at the time.
+
+    """
+
+    def __init__(self, script_node: Gaffer.ScriptNode):
+        self._nodes_by_type = {}
+        self._types = {}
+        self._enabled = {}
+        for node in get_all_children(script_node):
+            type_name = node.typeName()
+            self._nodes_by_type.setdefault(type_name, []).append(node)
+            self._types.setdefault(type_name, type(node))
+
+    def nodes(self, node_type) -> List[Gaffer.Node]:
+        """Return the nodes of `node_type`, which is either a type name or
+        a node class. Subclasses of a node class are matched too.
+
+        """
+        if isinstance(node_type, str):
+            return list(self._nodes_by_type.get(node_type, ()))
+
+        return [
+            node
+            for type_name, nodes in self._nodes_by_type.items()
+            if issubclass(self._types[type_name], node_type)
+            for node in nodes
+        ]
+
+    def enabled_nodes(self, node_type) -> List[Gaffer.Node]:
+        return [
+            node for node in self.nodes(node_type) if self.is_enabled(node)
+        ]
+
+    def active_type_names(self) -> set:
+        """Return the type names of all the types with an enabled node."""
+        return {
+            type_name
+            for type_name, nodes in self._nodes_by_type.items()
+            if any(self.is_enabled(node) for node in nodes)
+        }
+
+    def is_enabled(self, node: Gaffer.Node) -> bool:
+        """Return the value of the `enabled` plug of `node`, or False if it
+        doesn't have one.
+
+        """
+        enabled = self._enabled.get(node)
+        if enabled is None:
+            enabled_plug = node.getChild("enabled")
+            enabled = (
+                enabled_plug is not None and enabled_plug.getValue()
+            )
+            self._enabled[node] = enabled
+        return enabled
@@ -31,7 +31,6 @@ PUBLISH_PATH = os.path.join(PLUGINS_DIR, "publish")
 LOAD_PATH = os.path.join(PLUGINS_DIR, "load")
 CREATE_PATH = os.path.join(PLUGINS_DIR, "create")
 INVENTORY_PATH = os.path.join(PLUGINS_DIR, "inventory")
-DEADLINE_LIMIT_GROUPS = []
 
 self = sys.modules[__name__]
 self.root = None
@@ -48,6 +47,31 @@ def get_root() -> Gaffer.ScriptNode:
     return self.root
 
 
+def get_deadline_limit_groups():
+    """Return the Deadline limit groups from the list cache shared by all
+    sessions.
+
+    GafferDeadline is only imported the first time the limit groups are
+    needed, so Gaffer starts without it. Out of date groups are fetched
+    again in the background, but groups that have never been fetched are
+    fetched straight away.
+    """
+    import GafferDeadline
+
+    cache = GafferDeadline.DeadlineListCache.defaultCache()
+    limit_groups = cache.values("limits", refresh=False)
+    if cache.isStale("limits"):
+        if limit_groups:
+            cache.refresh("limits")
+        else:
+            try:
+                limit_groups = cache.fetch("limits")
+            except Exception as err:
+                log.warning(f"Could not fetch Deadline limit groups: {err}")
+
+    return limit_groups
+
+
 class GafferHost(HostBase, IWorkfileHost, ILoadHost, IPublishHost):
     name = "gaffer"
 
@@ -0,0 +1,157 @@
+##########################################################################
+#
+#  Copyright (c) 2019, Hypothetical Inc. All rights reserved.
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#      * Redistributions of source code must retain the above
+#        copyright notice, this list of conditions and the following
+#        disclaimer.
+#
+#      * Redistributions in binary form must reproduce the above
+#        copyright notice, this list of conditions and the following
+#        disclaimer in the documentation and/or other materials provided with
+#        the distribution.
+#
+#      * Neither the name of Hypothetical Inc. nor the names of
+#        any other contributors to this software may be used to endorse or
+#        promote products derived from this software without specific prior
+#        written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+#  IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+#  THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+#  PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+#  CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+#  EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+#  PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+#  PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+#  LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+#  NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+#  SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+##########################################################################
+
+import os
+import sys
+import traceback
+
+import imath
+
+import IECore
+
+import Gaffer
+
+
+class deadlineWorker(Gaffer.Application):
+
+    def __init__(self):
+
+        Gaffer.Application.__init__(
+            self,
+            """
+            Loads a script once and then executes task nodes for each frame range sent to
+            it on stdin. Used by the Deadline Gaffer plugin to run all the tasks of a job
+            in a single process. The commands are `execute <frames>` and `quit`, and each
+            command is answered with a `GafferDeadlineWorker: DONE` or
+            `GafferDeadlineWorker: FAILED <message>` line on stdout.
+            """
+        )
+
+        self.parameters().addParameters(
+            [
+                IECore.FileNameParameter(
+                    name="script",
+                    description="The script to execute.",
+                    defaultValue="",
+                    allowEmptyString=False,
+                    extensions="gfr",
+                    check=IECore.FileNameParameter.CheckType.MustExist,
+                ),
+                IECore.BoolParameter(
+                    name="ignoreScriptLoadErrors",
+                    description="Causes errors which occur while loading the script "
+                    "to be ignored. Not recommended.",
+                    defaultValue=False,
+                ),
+                IECore.StringVectorParameter(
+                    name="nodes",
+                    description="The names of the task nodes to execute.",
+                    defaultValue=IECore.StringVectorData([]),
+                ),
+                IECore.StringVectorParameter(
+                    name="context",
+                    description="The context used during execution, as pairs of "
+                    "-name value arguments, as for the execute app.",
+                    defaultValue=IECore.StringVectorData([]),
+                ),
+            ]
+        )
+
+        self.parameters().userData()["parser"] = IECore.CompoundObject(
+            {
+                "flagless": IECore.StringVectorData(["script"])
+            }
+        )
+
+    def _run(self, args):
+
+        scriptNode = Gaffer.ScriptNode()
+        scriptNode["fileName"].setValue(os.path.abspath(args["script"].value))
+        try:
+            scriptNode.load(continueOnError=args["ignoreScriptLoadErrors"].value)
+        except Exception as exception:
+            self.__reply("FAILED", "Unable to load script : {}".format(exception))
+            return 1
+
+        self.root()["scripts"].addChild(scriptNode)
+
+        nodes = []
+        for nodeName in args["nodes"]:
+            node = scriptNode.descendant(nodeName)
+            if not isinstance(node, Gaffer.Node) or "task" not in node:
+                self.__reply("FAILED", "\"{}\" is not a task node".format(nodeName))
+                return 1
+            nodes.append(node)
+
+        if len(args["context"]) % 2:
+            self.__reply("FAILED", "Context parameter must have matching entry/value pairs")
+            return 1
+
+        context = Gaffer.Context(scriptNode.context())
+        for i in range(0, len(args["context"]), 2):
+            entry = args["context"][i].lstrip("-")
+            context[entry] = eval(args["context"][i + 1], {"IECore": IECore, "imath": imath})
+
+        self.__reply("READY")
+
+        for line in sys.stdin:
+            command, _, argument = line.strip().partition(" ")
+            if command == "quit":
+                break
+            elif command != "execute":
+                self.__reply("FAILED", "Unknown command \"{}\"".format(command))
+                continue
+
+            try:
+                frames = IECore.FrameList.parse(argument).asList()
+                with context:
+                    for node in nodes:
+                        node["task"].executeSequence(frames)
+            except Exception as exception:
+                traceback.print_exc()
+                self.__reply("FAILED", " ".join(str(exception).split()))
+            else:
+                self.__reply("DONE")
+
+        return 0
+
+    @staticmethod
+    def __reply(status, message=""):
+        sys.stdout.write("GafferDeadlineWorker: {}\n".format(" ".join([status, message]).strip()))
+        sys.stdout.flush()
+
+
+IECore.registerRunTimeTyped(deadlineWorker)
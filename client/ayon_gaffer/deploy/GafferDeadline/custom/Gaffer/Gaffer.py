@@ -36,6 +36,8 @@
 
 import os
 import re
+import time
+import hashlib
 
 from System.IO import *
 from System.Text.RegularExpressions import *
@@ -70,23 +72,37 @@ class GafferPlugin(DeadlinePlugin):
     def __init__(self):
         super().__init__()
         self.InitializeProcessCallback += self.InitializeProcess
-        # self.RenderTasksCallback += self.RenderTasks
+        # Advanced plugin callbacks, used by persistent worker jobs
+        self.StartJobCallback += self.StartJob
+        self.RenderTasksCallback += self.RenderTasks
+        self.EndJobCallback += self.EndJob
         self.RenderExecutableCallback += self.GetRenderExecutable
         self.RenderArgumentCallback += self.GetRenderArguments
         self.PreRenderTasksCallback += self.PreRenderTasks
         # Some tasks like Ply2Vrmesh and Houdini sims handle multiple frames rather than a separate Deadline task per frame
         self.currentFrame = 0.0
         self.totalFrames = 0.0
+        self.WorkerProcess = None
 
     def Cleanup(self):
         for stdoutHandler in self.StdoutHandlers:
             del stdoutHandler.HandleCallback
 
         del self.InitializeProcessCallback
+        del self.StartJobCallback
         del self.RenderTasksCallback
+        del self.EndJobCallback
+
+        if self.WorkerProcess is not None:
+            self.WorkerProcess.Cleanup()
+            del self.WorkerProcess
 
     def InitializeProcess(self):
-        self.PluginType = PluginType.Simple
+        # Persistent worker jobs keep one Gaffer process running for all of their tasks
+        if self.GetBooleanPluginInfoEntryWithDefault("PersistentWorker", False):
+            self.PluginType = PluginType.Advanced
+        else:
+            self.PluginType = PluginType.Simple
         self.StdoutHandling = True
 
         # Generic Gaffer progress and error
@@ -116,6 +132,10 @@ class GafferPlugin(DeadlinePlugin):
         self.SetEnvironmentVariable("CPUTHREAD", str(self.GetThreadNumber()))
 
     def PreRenderTasks(self):
+        if self.PluginType == PluginType.Simple:
+            self._gafferScript = self.GetGafferScript()
+
+    def GetGafferScript(self):
         self.LogInfo("Performing path mapping")
         network_script = RepositoryUtils.CheckPathMapping(self.GetPluginInfoEntryWithDefault("ScriptFile", ""))
         network_script = self.replaceSlashesByOS(network_script)
@@ -128,19 +148,96 @@ class GafferPlugin(DeadlinePlugin):
             if not os.path.isfile(localScript):
                 self.FailRender("Could not find Gaffer script {}".format(localScript))
 
-            tempSceneDirectory = self.CreateTempDirectory("thread" + str(self.GetThreadNumber()))
-            tempSceneFilename = Path.Combine(tempSceneDirectory, Path.GetFileName(localScript))
-
-            with open(localScript, "r") as inFile, open(tempSceneFilename, "w") as outFile:
-                for line in inFile:
-                    newLine = RepositoryUtils.CheckPathMapping(line)
-                    outFile.write(newLine)
-            
-            self._gafferScript = tempSceneFilename
+            return self.GetPathMappedScript(localScript)
         else:
             self.LogInfo(f"Found network script [{network_script}]. Way better.")
-            self._gafferScript = network_script
-
+            return network_script
+
+    def StartJob(self):
+        self._gafferScript = self.GetGafferScript()
+
+        self.WorkerProcess = GafferWorkerProcess(
+            self,
+            self.GetRenderExecutable(),
+            self.GetGafferArguments("deadlineWorker")
+        )
+        self.StartMonitoredManagedProcess(GafferWorkerProcess.Name, self.WorkerProcess)
+        self.WaitForWorker()
+
+    def RenderTasks(self):
+        frames = self.GetFrames()
+        self.LogInfo(f"Executing frames {frames} in persistent Gaffer worker")
+        self.WriteStdinToMonitoredManagedProcess(GafferWorkerProcess.Name, f"execute {frames}")
+        self.WaitForWorker()
+
+    def EndJob(self):
+        if self.WorkerProcess is None:
+            return
+
+        self.WriteStdinToMonitoredManagedProcess(GafferWorkerProcess.Name, "quit")
+        self.ShutdownMonitoredManagedProcess(GafferWorkerProcess.Name)
+
+    def WaitForWorker(self):
+        self.WorkerProcess.Result = None
+        while self.WorkerProcess.Result is None:
+            if self.IsCanceled():
+                self.FailRender("Received cancel task command from Deadline.")
+            self.VerifyMonitoredManagedProcess(GafferWorkerProcess.Name)
+            self.FlushMonitoredManagedProcessStdout(GafferWorkerProcess.Name)
+            time.sleep(0.1)
+
+        status, message = self.WorkerProcess.Result
+        if status == "FAILED":
+            self.FailRender(f"Gaffer worker failed : {message}")
+
+    def GetPathMappedScript(self, localScript):
+        # The path mapped script is the same for every task of the job on this worker, so it
+        # is written once to the job's data directory and shared by all task threads.
+        mappedDirectory = os.path.join(
+            self.GetJobsDataDirectory(),
+            "pathMapped",
+            self.GetPathMappedScriptKey(localScript)
+        )
+        mappedScript = os.path.join(mappedDirectory, os.path.basename(localScript))
+        if os.path.isfile(mappedScript):
+            self.LogInfo(f"Reusing path mapped script [{mappedScript}]")
+            return mappedScript
+
+        if not os.path.isdir(mappedDirectory):
+            os.makedirs(mappedDirectory, exist_ok=True)
+
+        # Concurrent tasks may map the script at the same time, so each writes its own copy
+        # and the last one in replaces the others with an identical file.
+        tempScript = "{}.thread{}.tmp".format(mappedScript, self.GetThreadNumber())
+        RepositoryUtils.CheckPathMappingInFile(localScript, tempScript)
+        try:
+            os.replace(tempScript, mappedScript)
+        except OSError:
+            # Windows won't replace a script another task has open, which is already mapped
+            if not os.path.isfile(mappedScript):
+                raise
+            os.remove(tempScript)
+
+        self.LogInfo(f"Path mapped script to [{mappedScript}]")
+        return mappedScript
+
+    def GetPathMappedScriptKey(self, localScript):
+        scriptHash = self.GetPluginInfoEntryWithDefault("ScriptHash", "")
+        if not scriptHash:
+            # Jobs submitted before scripts were hashed
+            with open(localScript, "rb") as f:
+                scriptHash = hashlib.md5(f.read()).hexdigest()
+
+        # Plugins can't read the path mapping rules, so the key records how the rules map the
+        # paths this job uses. Editing the rules for those paths gives a new mapped script.
+        h = hashlib.md5(scriptHash.encode("utf-8"))
+        paths = [self.GetPluginInfoEntryWithDefault("ScriptFile", "")]
+        paths += list(self.GetJob().JobOutputDirectories)
+        for path in paths:
+            h.update(RepositoryUtils.CheckPathMapping(path).encode("utf-8"))
+            h.update(b"\0")
+
+        return h.hexdigest()
 
     def GetRenderExecutable(self):
         self.Version = self.GetPluginInfoEntry("Version")
@@ -153,6 +250,14 @@ class GafferPlugin(DeadlinePlugin):
         return gafferExe
 
     def GetRenderArguments(self):
+        arguments = self.GetGafferArguments("execute")
+
+        frames = self.GetFrames()
+        arguments += " -frames {}".format(frames) if frames != "" else ""
+
+        return arguments
+
+    def GetGafferArguments(self, application):
         script = self._gafferScript
 
         if not os.path.isfile(script):
@@ -160,14 +265,9 @@ class GafferPlugin(DeadlinePlugin):
 
         ignoreErrors = self.GetPluginInfoEntryWithDefault("IgnoreScriptLoadErrors", "False")
         nodes = self.GetPluginInfoEntryWithDefault("Nodes", "")
-        frames = self.GetPluginInfoEntryWithDefault("Frames", "")
-        frames = re.sub(r"<(?i)STARTFRAME>", str(self.GetStartFrame()), frames)
-        frames = re.sub(r"<(?i)ENDFRAME>", str(self.GetEndFrame()), frames)
-        frames = self.ReplacePaddedFrame(frames, "<(?i)STARTFRAME%([0-9]+)>", self.GetStartFrame())
-        frames = self.ReplacePaddedFrame(frames, "<(?i)ENDFRAME%([0-9]+)>", self.GetEndFrame())
         context = self.GetPluginInfoEntryWithDefault("Context", "")
 
-        arguments = "execute"
+        arguments = application
 
         threads = self.GetIntegerPluginInfoEntryWithDefault("Threads", 0)
         if self.OverrideCpuAffinity():
@@ -178,11 +278,19 @@ class GafferPlugin(DeadlinePlugin):
         arguments += " -script \"{}\"".format(script)
         arguments += " -ignoreScriptLoadErrors" if ignoreErrors.lower() == "true" else ""
         arguments += " -nodes {}".format(nodes) if nodes != "" else ""
-        arguments += " -frames {}".format(frames) if frames != "" else ""
         arguments += " -context {}".format(context) if context != "" else ""
 
         return arguments
 
+    def GetFrames(self):
+        frames = self.GetPluginInfoEntryWithDefault("Frames", "")
+        frames = re.sub(r"<(?i)STARTFRAME>", str(self.GetStartFrame()), frames)
+        frames = re.sub(r"<(?i)ENDFRAME>", str(self.GetEndFrame()), frames)
+        frames = self.ReplacePaddedFrame(frames, "<(?i)STARTFRAME%([0-9]+)>", self.GetStartFrame())
+        frames = self.ReplacePaddedFrame(frames, "<(?i)ENDFRAME%([0-9]+)>", self.GetEndFrame())
+
+        return frames
+
     def ReplacePaddedFrame(self, arguments, pattern, frame):
         frameRegex = Regex(pattern)
         while True:
@@ -262,3 +370,54 @@ class GafferPlugin(DeadlinePlugin):
             value = value.replace("\\", "/")
 
         return value
+
+
+######################################################################
+# The Gaffer process used by persistent worker jobs. It loads the script
+# once and executes each task's frames when told to through stdin.
+######################################################################
+
+
+class GafferWorkerProcess(ManagedProcess):
+    Name = "GafferWorker"
+
+    def __init__(self, deadlinePlugin, executable, arguments):
+        super().__init__()
+        self.deadlinePlugin = deadlinePlugin
+        self.executable = executable
+        self.arguments = arguments
+        # (status, message) of the last reply from the worker, None while it is busy
+        self.Result = None
+
+        self.InitializeProcessCallback += self.InitializeProcess
+        self.RenderExecutableCallback += self.GetRenderExecutable
+        self.RenderArgumentCallback += self.GetRenderArguments
+
+    def Cleanup(self):
+        for stdoutHandler in self.StdoutHandlers:
+            del stdoutHandler.HandleCallback
+
+        del self.InitializeProcessCallback
+        del self.RenderExecutableCallback
+        del self.RenderArgumentCallback
+
+    def InitializeProcess(self):
+        self.StdoutHandling = True
+
+        self.AddStdoutHandlerCallback("GafferDeadlineWorker: (READY|DONE|FAILED) ?(.*)").HandleCallback += self.HandleReply
+
+        # Generic Gaffer and Arnold progress
+        self.AddStdoutHandlerCallback(".*Progress: (\d+)%.*").HandleCallback += self.HandleProgress
+        self.AddStdoutHandlerCallback("([0-9]+)% done").HandleCallback += self.HandleProgress
+
+    def GetRenderExecutable(self):
+        return self.executable
+
+    def GetRenderArguments(self):
+        return self.arguments
+
+    def HandleReply(self):
+        self.Result = (self.GetRegexMatch(1), self.GetRegexMatch(2))
+
+    def HandleProgress(self):
+        self.deadlinePlugin.SetProgress(float(self.GetRegexMatch(1)))
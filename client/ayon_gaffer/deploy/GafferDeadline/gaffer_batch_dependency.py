@@ -35,11 +35,26 @@
 ##########################################################################
 
 import re
+import bisect
 
-from Deadline.Scripting import *
+try:
+    from Deadline.Scripting import RepositoryUtils
+except ImportError:
+    # Outside of Deadline, such as in the unit tests, a stand-in is assigned to
+    # `RepositoryUtils` before calling `__main__()`.
+    RepositoryUtils = None
 
 """ ExtraInfoKeyValue<xxx> denote dependecies in the form of
-<job frame>:<dependent job id>=><dependent job task number>
+<job tasks>:<dependent job id>=><dependent job tasks>
+
+where <job tasks> is a task number or a range of task numbers `a-b`, and
+<dependent job tasks> is either
+- a single task number `u`, meaning the tasks in the range wait for upstream
+  tasks `u`, `u + 1`, ... in turn (for a single task this is the original
+  one task per entry format), or
+- a comma separated list of task numbers and `u-v` ranges that every task in
+  the range waits for. With a range of job tasks single upstream tasks are
+  written as `u-u`.
 
 Deadline doesn't seem to include a logging facility for dependency scripts
 so just using print for informative info in case jobs aren't releasing
@@ -48,78 +63,127 @@ as expected.
 
 printDebug = False
 
+_dependencyKey = re.compile(r"^([0-9]+)(?:-([0-9]+))?:([A-Za-z0-9]+)$")
+
+
+def parseUpstreamTasks(taskStart, taskEnd, value, tasks=None):
+    """ Decodes the upstream tasks of one ExtraInfo entry, returning a
+    dictionary mapping each task from `taskStart` to `taskEnd` to the set of
+    upstream task numbers it waits for. If `tasks` is given, only those tasks
+    of the range are decoded.
+    """
+    if tasks is None:
+        tasks = range(taskStart, taskEnd + 1)
+
+    value = value.strip()
+    if value.isdigit():
+        # Offset form, which is also the original single task form
+        upstreamStart = int(value)
+        return {task: {upstreamStart + task - taskStart} for task in tasks}
+
+    upstream = set()
+    for item in value.split(","):
+        start, _, end = item.strip().partition("-")
+        upstream.update(range(int(start), int(end or start) + 1))
+
+    return {task: upstream for task in tasks}
+
+
+def parseDependencies(job, taskIds):
+    """ Returns a dictionary mapping each of `taskIds` to the set of
+    (upstreamJobId, upstreamTaskId) pairs it waits for, read from the job's
+    ExtraInfo keys. Tasks without dependencies map to an empty set.
+    """
+    dependencies = {taskId: set() for taskId in taskIds}
+    # Sorted once so the tasks in each entry's range are found by bisection
+    sortedTaskIds = sorted(dependencies)
+
+    for key in job.GetJobExtraInfoKeys():
+        match = _dependencyKey.match(key)
+        if match is None:
+            continue
+        taskStart = int(match.group(1))
+        taskEnd = int(match.group(2) or taskStart)
+        # Skip entries for tasks that aren't being checked without decoding them
+        first = bisect.bisect_left(sortedTaskIds, taskStart)
+        last = bisect.bisect_right(sortedTaskIds, taskEnd)
+        if first == last:
+            continue
+        try:
+            upstreamTasks = parseUpstreamTasks(
+                taskStart,
+                taskEnd,
+                job.GetJobExtraInfoKeyValue(key),
+                sortedTaskIds[first:last]
+            )
+        except (AttributeError, ValueError):
+            continue
+        jobId = match.group(3)
+        for taskId, upstreamTaskIds in upstreamTasks.items():
+            dependencies[taskId].update((jobId, u) for u in upstreamTaskIds)
+
+    return dependencies
+
+
+def completedTasks(jobId):
+    """ Returns the set of completed task IDs for `jobId`, or None if the job
+    no longer exists.
+    """
+    job = RepositoryUtils.GetJob(jobId, False)
+    if job is None:
+        return None
+
+    tasks = RepositoryUtils.GetJobTasks(job, False).TaskCollectionTasks
+    completed = {int(t.TaskId) for t in tasks if t.TaskStatus.lower() == "completed"}
+    if printDebug:
+        print("{} has {} completed tasks of {} total tasks".format(
+            jobId, len(completed), len(tasks)
+        ))
+
+    return completed
+
+
+def releasedTasks(dependencies, completed):
+    """ Returns the sorted task IDs from `dependencies` whose upstream tasks
+    have all completed. `completed` maps upstream job IDs to their completed
+    task IDs, or to None for jobs that no longer exist, whose dependents are
+    released.
+    """
+    released = []
+    for taskId, taskDependencies in dependencies.items():
+        if all(
+            completed[jobId] is None or upstreamTaskId in completed[jobId]
+            for jobId, upstreamTaskId in taskDependencies
+        ):
+            released.append(taskId)
+
+    return sorted(released)
+
 
 def __main__(jobID, taskIDs=None):
 
-    # simple data structure to hold information about a dependency
-    class dependency(object):
-        def __init__(self, task, jobDep, depTask, isReleased):
-            self.taskId = int(task)
-            self.jobDependencyId = jobDep
-            self.dependencyTaskId = int(depTask)
-            self.isReleased = isReleased
-
-    taskIDs = [int(t) for t in taskIDs] # Deadline gives task IDs in string format
-
-    if taskIDs:
-        re_dep = re.compile(r'^([0-9]+):([a-z0-9]+)')
-
-        job = RepositoryUtils.GetJob(jobID, False)
-        if printDebug:
-            print("Checking dependencies for {}".format(job.JobName))
-
-        dependencies = []   # list of dependency objects
-        jobDependencyIds = []   # list of job ids this job depends on
-
-        # collect this job's dependencies
-        for k in job.GetJobExtraInfoKeys():
-            result = re_dep.match(k)
-            if len(result.groups()) == 2:
-                task, jobDep = result.groups()
-                if int(task) in taskIDs:
-                    taskDep = job.GetJobExtraInfoKeyValue(k)
-                    newDep = dependency(task, jobDep, taskDep, False)
-                    jobDependencyIds.append(jobDep)
-                    dependencies.append(newDep)
-
-        if printDebug: print("Found {} dependencies".format(len(dependencies)))
-
-        jobDependencyIds = list(set(jobDependencyIds))
-        # if no dependencies, release all tasks
-        if len(dependencies) == 0:
-            return taskIDs
-
-        for jobDepId in jobDependencyIds:
-            if printDebug: print "Scanning {} for released dependencies".format(jobDepId)
-            jobDepObj = RepositoryUtils.GetJob(jobDep, False)
-            # If the job can't be found, assume it is ok to release it's dependents
-            if jobDepObj is None:
-                for d in dependencies:
-                    if d.jobDependencyId == jobDepId:
-                        d.isReleased = True
-            else:
-                jobDepTaskList = RepositoryUtils.GetJobTasks(jobDepObj, False).TaskCollectionTasks
-                completedTasks = [t for t in jobDepTaskList if t.TaskStatus.lower() == "completed"]
-                if printDebug: print "{} has {} completed tasks of {} total tasks: {}".format(jobDepId, len(completedTasks), len(jobDepTaskList), [t.TaskId for t in completedTasks])
-                for completedTask in completedTasks:
-                    for d in dependencies:
-                        if d.jobDependencyId == jobDepId and d.dependencyTaskId == int(completedTask.TaskId):
-                            d.isReleased = True
-                            print("{}:{} released".format(d.jobDependencyId, d.dependencyTaskId))
-
-        releasedTasks = []
-        for task in dependencies:
-            if printDebug: print "Scanning task #{} for dependencies".format(task.taskId)
-            depsForThisTask = list(set([t for t in dependencies if t.taskId == task.taskId]))
-            # print "Task #{} has {} dependencies: {}".format(task.taskId, len(depsForThisTask), ",".join([d.dependencyTaskId for d in depsForThisTask]))
-            releasedDeps = list(set([d for d in depsForThisTask if d.isReleased]))
-            if printDebug: print "Task #{} has {} released dependencies".format(task.taskId, len(releasedDeps))
-            if(len(depsForThisTask) == len(releasedDeps)):
-                releasedTasks.append(str(task.taskId))
-                if printDebug: print "All dependencies for task #{} have been completed. Releasing task #{}".format(task.taskId, task.taskId)
-
-        if printDebug: print("Released tasks for {} = {}".format(jobID, releasedTasks))
-        return list(set(releasedTasks))
-
-    # not entirely sure what to do about a job that does not have frame dependencies enabled, that is considered an error state
-    return False
+    # not entirely sure what to do about a job that does not have frame dependencies enabled,
+    # that is considered an error state
+    if not taskIDs:
+        return False
+
+    taskIDs = [int(t) for t in taskIDs]  # Deadline gives task IDs in string format
+
+    job = RepositoryUtils.GetJob(jobID, False)
+    if job is None:
+        return []
+    if printDebug:
+        print("Checking dependencies for {}".format(job.JobName))
+
+    dependencies = parseDependencies(job, taskIDs)
+
+    # Only fetch the tasks of each upstream job once, however many tasks depend on it
+    completed = {}
+    for jobId in {j for taskDependencies in dependencies.values() for j, _ in taskDependencies}:
+        completed[jobId] = completedTasks(jobId)
+
+    released = [str(t) for t in releasedTasks(dependencies, completed)]
+    if printDebug:
+        print("Released tasks for {} = {}".format(jobID, released))
+
+    return released
@@ -0,0 +1,190 @@
+##########################################################################
+#
+#  Copyright (c) 2019, Hypothetical Inc. All rights reserved.
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#      * Redistributions of source code must retain the above
+#        copyright notice, this list of conditions and the following
+#        disclaimer.
+#
+#      * Redistributions in binary form must reproduce the above
+#        copyright notice, this list of conditions and the following
+#        disclaimer in the documentation and/or other materials provided with
+#        the distribution.
+#
+#      * Neither the name of Hypothetical Inc. nor the names of
+#        any other contributors to this software may be used to endorse or
+#        promote products derived from this software without specific prior
+#        written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+#  IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+#  THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+#  PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+#  CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+#  EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+#  PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+#  PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+#  LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+#  NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+#  SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+##########################################################################
+
+import threading
+
+import IECore
+
+import Gaffer
+
+
+class BackgroundDispatch(object):
+    """ Handle for a DeadlineDispatcher dispatch whose jobs are built and submitted on a
+    background thread. It follows the `concurrent.futures.Future` interface, so callers can
+    poll it, wait for `result()`, or register callbacks to run when the dispatch finishes.
+
+    The work runs as a `Gaffer.BackgroundTask` with the script as its subject, so editing the
+    graph cancels the dispatch before the edit is made. Jobs submitted before the
+    cancellation are left on Deadline.
+    """
+
+    def __init__(self, resultCallback=None):
+        self.__lock = threading.Lock()
+        self.__task = None
+        self.__finished = False
+        self.__cancelled = False
+        self.__jobs = None
+        self.__exception = None
+        self.__callbacks = [resultCallback] if resultCallback is not None else []
+        self.__progressSignal = Gaffer.Signal3()
+
+    # Emitted from the background thread as the dispatch progresses.
+    #
+    # Slots should have the signature `slot( backgroundDispatch, progress, message )`,
+    # where progress is the fraction of jobs that have been submitted. Slots that update
+    # the UI must defer to the UI thread with `GafferUI.EventLoop.executeOnUIThread()`.
+    def progressSignal(self):
+        return self.__progressSignal
+
+    def cancel(self):
+        """ Requests cancellation. The dispatch stops before preparing the next job, but a
+        wave of jobs that is already being sent to Deadline is allowed to finish.
+        """
+        if self.__task is not None:
+            self.__task.cancel()
+
+    def running(self):
+        return self.__task is not None and not self.done()
+
+    def done(self):
+        with self.__lock:
+            return self.__finished
+
+    def cancelled(self):
+        with self.__lock:
+            return self.__cancelled
+
+    def status(self):
+        """ Returns "running", "cancelled", "failed" or "submitted". Unlike `result()` this
+        never waits, so it can be used from done callbacks.
+        """
+        with self.__lock:
+            if not self.__finished:
+                return "running"
+            if self.__cancelled:
+                return "cancelled"
+            if self.__exception is not None:
+                return "failed"
+            return "submitted"
+
+    def jobs(self):
+        """ Returns the GafferDeadlineJobs of a dispatch that was submitted, or None. Unlike
+        `result()` this never waits or raises.
+        """
+        with self.__lock:
+            return self.__jobs
+
+    def wait(self, timeout=None):
+        """ Blocks until the dispatch has finished, returning False if `timeout` seconds
+        passed first.
+        """
+        if self.__task is None:
+            return self.done()
+        if timeout is None:
+            self.__task.wait()
+        elif not self.__task.waitFor(timeout):
+            return False
+        # A task cancelled before it started never calls our function
+        self.__finish(cancelled=True)
+        return True
+
+    def result(self, timeout=None):
+        """ Returns the GafferDeadlineJobs built by the dispatch, raising the exception that
+        stopped it if it failed, or `IECore.Cancelled` if it was cancelled.
+        """
+        if not self.wait(timeout):
+            raise TimeoutError("Deadline dispatch did not finish within {}s".format(timeout))
+        if self.__cancelled:
+            raise IECore.Cancelled()
+        if self.__exception is not None:
+            raise self.__exception
+        return self.__jobs
+
+    def exception(self, timeout=None):
+        if not self.wait(timeout):
+            raise TimeoutError("Deadline dispatch did not finish within {}s".format(timeout))
+        return self.__exception
+
+    def addDoneCallback(self, callback):
+        """ Calls `callback( backgroundDispatch )` once the dispatch has finished. Callbacks
+        are called on the background thread, or immediately if the dispatch is already done.
+        """
+        with self.__lock:
+            if not self.__finished:
+                self.__callbacks.append(callback)
+                return
+        callback(self)
+
+    def _start(self, subject, function):
+        """ Runs `function( canceller, progress )` as a background task, where `progress` is a
+        callable taking the progress fraction and a message. Used by DeadlineDispatcher.
+        """
+        def run(canceller):
+            try:
+                jobs = function(canceller, self.__progress)
+            except IECore.Cancelled:
+                self.__finish(cancelled=True)
+                raise
+            except Exception as e:
+                self.__finish(exception=e)
+                raise
+            self.__finish(jobs=jobs)
+
+        self.__task = Gaffer.BackgroundTask(subject, run)
+
+    def __progress(self, progress, message):
+        self.__progressSignal(self, progress, message)
+
+    def __finish(self, jobs=None, exception=None, cancelled=False):
+        with self.__lock:
+            if self.__finished:
+                return
+            self.__finished = True
+            self.__jobs = jobs
+            self.__exception = exception
+            self.__cancelled = cancelled
+            callbacks = self.__callbacks
+            self.__callbacks = []
+
+        for callback in callbacks:
+            try:
+                callback(self)
+            except Exception as e:
+                IECore.msg(
+                    IECore.Msg.Level.Error,
+                    "BackgroundDispatch",
+                    "Done callback failed : {}".format(e)
+                )
@@ -35,7 +35,17 @@
 ##########################################################################
 
 import os
+import sys
+import json
+import math
+import time
+import uuid
+import socket
 import getpass
+import functools
+import threading
+import contextlib
+import concurrent.futures
 
 import IECore
 
@@ -47,9 +57,32 @@ import GafferDeadline
 
 class DeadlineDispatcher(GafferDispatch.Dispatcher):
 
+    # Deadline's job status for failed jobs, which are never reused by incremental dispatch.
+    __failedJobStatus = 4
+
+    # Written next to the job directories while a dispatch is submitting jobs, so a dispatch
+    # that didn't finish can be resumed by the next one.
+    __resumeFileName = "deadlineDispatchResume.json"
+    # Resume files older than this are left by dispatches that are not worth resuming, and
+    # locks older than this by dispatches that died without releasing them.
+    __resumeFileMaxAge = 24 * 60 * 60
+
     def __init__(self, name="DeadlineDispatcher"):
         GafferDispatch.Dispatcher.__init__(self, name)
         self._deadlineJobs = []
+        self._deadlineJobsByKey = {}
+
+        self["incremental"] = Gaffer.BoolPlug(defaultValue=False)
+        self["submitInBackground"] = Gaffer.BoolPlug(defaultValue=False)
+        self["adaptiveBatching"] = Gaffer.BoolPlug(defaultValue=False)
+        self["targetTaskDuration"] = Gaffer.FloatPlug(defaultValue=300.0, minValue=1.0)
+        self["dryRun"] = Gaffer.BoolPlug(defaultValue=False)
+
+        self.__pendingBackgroundDispatch = None
+        self.__backgroundDispatch = None
+        self.__submissionOverrides = None
+        self.__reuseScript = False
+        self.__storedScript = None
 
     # Emitted prior to submitting the Deadline job, to allow
     # custom modifications to be applied.
@@ -58,12 +91,101 @@ class DeadlineDispatcher(GafferDispatch.Dispatcher):
     # where dispatcher is the DeadlineDispatcher and job will
     # be the instance of GafferDeadlineJob that is about
     # to be spooled.
+    #
+    # When submitting in the background this is emitted on the
+    # background thread. Slots must not edit the graph, and slots
+    # updating the UI must defer to the UI thread with
+    # `GafferUI.EventLoop.executeOnUIThread()`.
     @classmethod
     def preSpoolSignal(cls):
         return cls.__preSpoolSignal
 
     __preSpoolSignal = Gaffer.Signal2()
 
+    # Emitted once the Deadline jobs of a dispatch have been submitted,
+    # or when submitting them failed or was cancelled. Gaffer's
+    # `postDispatchSignal()` is emitted as soon as `dispatch()` returns,
+    # which is before any job exists when submitting in the background.
+    #
+    # Slots should have the signature `slot( dispatcher, jobs, status )`,
+    # where jobs is the list of GafferDeadlineJobs, or None if the
+    # submission didn't succeed, and status is one of "submitted",
+    # "failed" or "cancelled". For background dispatches in a session
+    # with GafferUI loaded the signal is emitted on the UI thread,
+    # otherwise it is emitted on the thread that submitted the jobs.
+    @classmethod
+    def submittedSignal(cls):
+        return cls.__submittedSignal
+
+    __submittedSignal = Gaffer.Signal3()
+
+    @staticmethod
+    def invalidateSettings():
+        """ Forget the cached AYON and Deadline settings, so the next dispatch fetches them
+        again. Use this after changing project settings in a running session.
+        """
+        GafferDeadline.DeadlineTools.invalidateSettings()
+
+    def dispatch(self, nodes):
+        """ Dispatches `nodes` in a context holding the context variables of the submission
+        overrides, so they are taken into account when the tasks are batched and replace any
+        script variables with the same name.
+        """
+        contextVariables = {}
+        if self.__submissionOverrides is not None:
+            contextVariables = self.__submissionOverrides.contextVariables()
+        if not contextVariables:
+            return GafferDispatch.Dispatcher.dispatch(self, nodes)
+
+        with Gaffer.Context(Gaffer.Context.current()) as context:
+            for name, value in contextVariables.items():
+                context[name] = value
+            return GafferDispatch.Dispatcher.dispatch(self, nodes)
+
+    def dispatchInBackground(self, nodes, resultCallback=None):
+        """ Dispatches `nodes` without waiting for the jobs to be submitted. The script is
+        serialised before this returns, then the Deadline jobs are built and submitted on a
+        background thread. Returns a BackgroundDispatch to follow the progress, cancel the
+        dispatch or wait for its result. `resultCallback( backgroundDispatch )` is called on
+        the background thread once the dispatch has finished.
+        """
+        backgroundDispatch = GafferDeadline.BackgroundDispatch(resultCallback)
+        self.__pendingBackgroundDispatch = backgroundDispatch
+        try:
+            self.dispatch(nodes)
+        finally:
+            self.__pendingBackgroundDispatch = None
+
+        return backgroundDispatch
+
+    def backgroundDispatch(self):
+        """ Returns the BackgroundDispatch for the most recent background dispatch, or None if
+        there hasn't been one.
+        """
+        return self.__backgroundDispatch
+
+    def setSubmissionOverrides(self, overrides):
+        """ Uses the SubmissionOverrides `overrides` in place of plug values for the following
+        dispatches, until set to None. The script itself is left untouched.
+        """
+        self.__submissionOverrides = overrides
+
+    def getSubmissionOverrides(self):
+        return self.__submissionOverrides
+
+    def setReuseScript(self, reuse):
+        """ When True, a script is only serialised the first time it is dispatched and later
+        dispatches of it submit the same file. Use this when dispatching an unchanged script
+        several times in a row, for instance with different frame ranges or overrides.
+        Setting it to False forgets the stored script.
+        """
+        self.__reuseScript = reuse
+        if not reuse:
+            self.__storedScript = None
+
+    def getReuseScript(self):
+        return self.__reuseScript
+
     def _doDispatch(self, rootBatch):
         '''
         _doDispatch is called by Gaffer, the others (prefixed with __) are just helpers for
@@ -96,40 +218,570 @@ class DeadlineDispatcher(GafferDispatch.Dispatcher):
 
         To be compatible with Deadline's ExtraInfoKeyValue system, dependencies are reformatted at
         submission as task:jobDependencyId=taskDependencyNumber
+
+        When dispatching in the background, only the script is serialised here. Building and
+        submitting the jobs is left to a BackgroundDispatch so the UI isn't blocked.
         '''
+        if self.__backgroundDispatch is not None and not self.__backgroundDispatch.done():
+            raise RuntimeError("A background dispatch from {} is still running".format(
+                self.getName()
+            ))
+
         self._deadlineJobs = []
+        self._deadlineJobsByKey = {}
         IECore.Log.info("Beginning Deadline submission")
         dispatchData = {}
-        dispatchData["scriptNode"] = rootBatch.preTasks()[0].node().scriptNode()
-        dispatchData["scriptFile"] = os.path.join(
-            self.jobDirectory(),
-            os.path.basename(
-                dispatchData["scriptNode"]["fileName"].getValue()
-            ) or "untitled.gfr"
+        # Kept with the dispatch data since background submission outlives `dispatch()`
+        dispatchData["jobDirectory"] = self.jobDirectory()
+        dispatchData["trace"] = GafferDeadline.DispatchTrace.begin(self.getName())
+        try:
+            dispatchData["scriptNode"] = rootBatch.preTasks()[0].node().scriptNode()
+            # Scripts are stored by content, so an unchanged script is only written once and every
+            # dispatch of it shares the same file on the farm.
+            scriptStore = GafferDeadline.ScriptStore(
+                GafferDeadline.ScriptStore.defaultDirectory(self["jobsDirectory"].getValue())
+            )
+            fileName = os.path.basename(dispatchData["scriptNode"]["fileName"].getValue())
+            storedScriptKey = (dispatchData["scriptNode"], scriptStore.directory(), fileName)
+            with GafferDeadline.DispatchTrace.scope("serialiseScript") as scope:
+                if (
+                    self.__reuseScript and
+                    self.__storedScript is not None and
+                    self.__storedScript[0] == storedScriptKey
+                ):
+                    dispatchData["scriptFile"], dispatchData["scriptHash"] = (
+                        self.__storedScript[1]
+                    )
+                    scope.setArg("reused", True)
+                else:
+                    dispatchData["scriptFile"], dispatchData["scriptHash"] = scriptStore.addScript(
+                        dispatchData["scriptNode"].serialise(),
+                        fileName or "untitled.gfr"
+                    )
+                    if self.__reuseScript:
+                        self.__storedScript = (
+                            storedScriptKey,
+                            (dispatchData["scriptFile"], dispatchData["scriptHash"])
+                        )
+            dispatchData["scriptFile"] = dispatchData["scriptFile"].replace("\\", os.sep).replace(
+                "/",
+                os.sep
+            )
+
+            with Gaffer.Context.current() as c:
+                dispatchData["dispatchJobName"] = self["jobName"].getValue()
+
+            dispatchData["overrides"] = (
+                self.__submissionOverrides or GafferDeadline.SubmissionOverrides()
+            )
+            # Type names of the enabled nodes evaluated by each node, keyed by context hash
+            # and shared by every job of the dispatch when resolving limit groups.
+            dispatchData["upstreamTypeNames"] = {}
+
+            # AYON settings are resolved once and shared by every job in this dispatch
+            with GafferDeadline.DispatchTrace.scope("dispatchSettings"):
+                dispatchData["settings"] = GafferDeadline.DispatchSettings()
+
+            # The manifest lives next to the per-dispatch job directories so later dispatches of
+            # the same job name can find it.
+            # A dry run sends its requests to a DryRunTransport writing the job payloads into
+            # the job directory, so the jobs can be checked without submitting them. Dry runs
+            # don't update the manifest, the timing history or the resume file.
+            dispatchData["transport"] = None
+            if self["dryRun"].getValue():
+                dispatchData["transport"] = GafferDeadline.DryRunTransport(
+                    os.path.join(str(self.jobDirectory()), "dryRun")
+                )
+            dispatchData["dryRun"] = (
+                dispatchData["transport"] is not None or
+                GafferDeadline.DeadlineTools.getTransport().isDryRun
+            )
+
+            dispatchData["manifest"] = None
+            dispatchData["submissionHashes"] = {}
+            if self["incremental"].getValue() and not dispatchData["dryRun"]:
+                dispatchData["manifest"] = GafferDeadline.DispatchManifest(
+                    os.path.dirname(os.path.normpath(str(self.jobDirectory())))
+                )
+
+            dispatchData["timingHistory"] = None
+            if self["adaptiveBatching"].getValue():
+                dispatchData["timingHistory"] = GafferDeadline.TaskTimingHistory(
+                    os.path.dirname(os.path.normpath(str(self.jobDirectory())))
+                )
+                dispatchData["targetTaskDuration"] = self["targetTaskDuration"].getValue()
+
+            # Jobs are tagged with a token for the dispatch, so they can be found again if the
+            # dispatch is interrupted. The next dispatch then reuses the token and picks up the
+            # jobs that were already submitted instead of submitting them twice.
+            # The resume file is locked while the dispatch runs, so a concurrent dispatch of the
+            # same job name neither resumes it nor overwrites it.
+            dispatchData["resumePath"] = os.path.join(
+                os.path.dirname(os.path.normpath(str(self.jobDirectory()))),
+                self.__resumeFileName
+            )
+            dispatchData["resumeLocked"] = False
+            resume = None
+            if not dispatchData["dryRun"]:
+                dispatchData["resumeLocked"] = self.__lockResumeFile(dispatchData["resumePath"])
+                if dispatchData["resumeLocked"]:
+                    resume = self.__loadResumeFile(dispatchData["resumePath"])
+                else:
+                    IECore.msg(
+                        IECore.Msg.Level.Warning,
+                        "DeadlineDispatcher",
+                        "Another dispatch is using \"{}\", this dispatch can't be resumed if it "
+                        "is interrupted".format(dispatchData["resumePath"])
+                    )
+                    dispatchData["resumePath"] = None
+            dispatchData["resuming"] = resume is not None
+            dispatchData["submissionToken"] = resume["submissionToken"] if resume else None
+            # The IDs of the jobs the interrupted dispatch is known to have submitted, keyed by
+            # payload hash, and the payload hashes of the jobs it may or may not have submitted.
+            # None means any job may have been submitted.
+            dispatchData["submittedJobIds"] = {}
+            dispatchData["pendingJobs"] = set()
+            if resume is not None:
+                dispatchData["submittedJobIds"] = dict(resume.get("submittedJobs") or {})
+                pendingJobs = resume.get("pendingJobs")
+                dispatchData["pendingJobs"] = set(pendingJobs) if pendingJobs is not None else None
+            dispatchData["submittedJobs"] = None
+            dispatchData["payloadHashes"] = {}
+            if dispatchData["resuming"]:
+                IECore.msg(
+                    IECore.Msg.Level.Info,
+                    "DeadlineDispatcher",
+                    "Resuming interrupted dispatch {}".format(dispatchData["submissionToken"])
+                )
+            else:
+                dispatchData["submissionToken"] = uuid.uuid4().hex
+
+            dispatchData["canceller"] = None
+            dispatchData["progress"] = None
+        except Exception:
+            self.__unlockResumeFile(dispatchData)
+            self.__endTrace(dispatchData)
+            raise
+
+        backgroundDispatch = self.__pendingBackgroundDispatch
+        if backgroundDispatch is None and self["submitInBackground"].getValue():
+            backgroundDispatch = GafferDeadline.BackgroundDispatch()
+
+        if backgroundDispatch is None:
+            try:
+                jobs = self.__dispatchDeadlineJobs(rootBatch, dispatchData)
+            except IECore.Cancelled:
+                self.submittedSignal()(self, None, "cancelled")
+                raise
+            except Exception:
+                self.submittedSignal()(self, None, "failed")
+                raise
+            self.submittedSignal()(self, jobs, "submitted")
+            return
+
+        # Everything that needs the main thread is done, the rest reads the graph through
+        # the dispatch context and only sends requests to Deadline.
+        context = Gaffer.Context(Gaffer.Context.current())
+
+        def backgroundFunction(canceller, progress):
+            dispatchData["canceller"] = canceller
+            dispatchData["progress"] = progress
+            with Gaffer.Context(context, canceller):
+                return self.__dispatchDeadlineJobs(rootBatch, dispatchData)
+
+        self.__backgroundDispatch = backgroundDispatch
+        backgroundDispatch.addDoneCallback(self.__backgroundDispatchDone)
+        backgroundDispatch._start(dispatchData["scriptNode"], backgroundFunction)
+
+    def __backgroundDispatchDone(self, backgroundDispatch):
+        emit = functools.partial(
+            self.submittedSignal(),
+            self,
+            backgroundDispatch.jobs(),
+            backgroundDispatch.status()
         )
-        dispatchData["scriptFile"] = dispatchData["scriptFile"].replace("\\", os.sep).replace(
-            "/",
-            os.sep
+
+        # GafferUI is only looked up, since dispatches on the farm run without it
+        GafferUI = sys.modules.get("GafferUI")
+        if GafferUI is not None and threading.current_thread() is not threading.main_thread():
+            GafferUI.EventLoop.executeOnUIThread(emit)
+        else:
+            emit()
+
+    def __dispatchDeadlineJobs(self, rootBatch, dispatchData):
+        """ Build the Deadline jobs from the batch tree and submit them. Returns the jobs. """
+        # The dry run transport is only used by this dispatch's threads, so other dispatches
+        # and list fetches running meanwhile still reach the farm.
+        transportScope = contextlib.nullcontext()
+        if dispatchData["transport"] is not None:
+            transportScope = GafferDeadline.DeadlineTools.transportScope(dispatchData["transport"])
+        with transportScope:
+            return self.__dispatchDeadlineJobsWithTransport(rootBatch, dispatchData)
+
+    def __dispatchDeadlineJobsWithTransport(self, rootBatch, dispatchData):
+        try:
+            rootDeadlineJob = GafferDeadline.GafferDeadlineJob(rootBatch.node())
+            rootDeadlineJob.setAuxFiles([dispatchData["scriptFile"]])
+            self.__addGafferDeadlineJob(rootDeadlineJob)
+            rootJobs = []
+            with GafferDeadline.DispatchTrace.scope("buildJobTree") as scope:
+                for upstreamBatch in rootBatch.preTasks():
+                    self.__checkCancellation(dispatchData)
+                    rootJob = self.__buildDeadlineJobWalk(upstreamBatch, dispatchData)
+                    if rootJob is not None:
+                        rootJobs.append(rootJob)
+                scope.setArg("jobs", len(self._deadlineJobs))
+
+            rootJobs = list(set(rootJobs))
+
+            if dispatchData["timingHistory"] is not None:
+                with GafferDeadline.DispatchTrace.scope("adaptBatchSizes"):
+                    self.__adaptBatchSizes(dispatchData)
+
+            if dispatchData["dryRun"]:
+                self.__submitDeadlineJobs(rootJobs, dispatchData)
+                self.__saveDryRunPlan(dispatchData)
+                return list(self._deadlineJobs)
+
+            self.__saveResumeFile(dispatchData)
+            try:
+                self.__submitDeadlineJobs(rootJobs, dispatchData)
+            finally:
+                if dispatchData["manifest"] is not None:
+                    dispatchData["manifest"].save()
+                if dispatchData["timingHistory"] is not None:
+                    dispatchData["timingHistory"].save()
+            # Everything was submitted, so there's nothing left to resume
+            if dispatchData["resumePath"] is not None:
+                os.remove(dispatchData["resumePath"])
+        finally:
+            self.__unlockResumeFile(dispatchData)
+            self.__endTrace(dispatchData)
+
+        return list(self._deadlineJobs)
+
+    def __adaptBatchSizes(self, dispatchData):
+        """ Regroup the Deadline tasks of every job with a measured frame time so each task
+        takes about `targetTaskDuration` seconds.
+        """
+        history = dispatchData["timingHistory"]
+        if not dispatchData["dryRun"]:
+            self.__updateTimingHistory(history)
+
+        for job in self._deadlineJobs:
+            node = job.getGafferNode()
+            if node is None or GafferDeadline.GafferDeadlineJob.isControlTask(node):
+                continue
+
+            secondsPerFrame = history.secondsPerFrame(node.relativeName(dispatchData["scriptNode"]))
+            if secondsPerFrame is None:
+                continue
+
+            framesPerTask = self.__framesPerTask(
+                dispatchData["targetTaskDuration"],
+                secondsPerFrame
+            )
+            with Gaffer.Context(job.getContext()):
+                # Nodes that need their frames in one sequence can't have their batches split
+                split = not node["task"].requiresSequenceExecution()
+            job.regroupTasks(framesPerTask, split)
+
+            IECore.msg(
+                IECore.Msg.Level.Debug,
+                "DeadlineDispatcher",
+                "{} : {:.2f}s per frame, {} frames per task".format(
+                    node.relativeName(dispatchData["scriptNode"]),
+                    secondsPerFrame,
+                    framesPerTask
+                )
+            )
+
+    @staticmethod
+    def __framesPerTask(targetTaskDuration, secondsPerFrame):
+        # Rounded down to a power of two so small changes in the measured times don't
+        # change the task layout, which would stop incremental dispatch reusing jobs.
+        frames = max(1, int(targetTaskDuration / max(secondsPerFrame, 1e-3)))
+        return 2 ** int(math.log2(frames))
+
+    @staticmethod
+    def __updateTimingHistory(history):
+        """ Read the task timings of previously submitted jobs back from Deadline. """
+        pending = [
+            (nodeName, jobId)
+            for nodeName, jobIds in history.pendingJobs().items()
+            for jobId in jobIds
+        ]
+        if not pending:
+            return
+
+        # Jobs that were deleted or failed will never report their timings, so they are
+        # forgotten instead of being queried on every dispatch.
+        try:
+            jobs = GafferDeadline.DeadlineTools.getJobs(sorted(set(j for _, j in pending)))
+        except Exception as e:
+            IECore.msg(
+                IECore.Msg.Level.Warning,
+                "DeadlineDispatcher",
+                "Could not read task timings : {}".format(e)
+            )
+            return
+
+        remaining = []
+        for nodeName, jobId in pending:
+            job = jobs.get(jobId)
+            if job is None or job.get("Stat") == DeadlineDispatcher.__failedJobStatus:
+                history.removePendingJob(nodeName, jobId)
+            else:
+                remaining.append((nodeName, jobId))
+        pending = remaining
+        if not pending:
+            return
+
+        getJobTasks = GafferDeadline.DeadlineTools.bindTransport(
+            GafferDeadline.DeadlineTools.getJobTasks
         )
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=min(len(pending), GafferDeadline.DeadlineTools.SUBMISSION_THREADS)
+        ) as executor:
+            futures = {
+                executor.submit(getJobTasks, jobId): (nodeName, jobId)
+                for nodeName, jobId in pending
+            }
+            for future in concurrent.futures.as_completed(futures):
+                nodeName, jobId = futures[future]
+                try:
+                    history.addJobTasks(nodeName, jobId, future.result())
+                except Exception as e:
+                    IECore.msg(
+                        IECore.Msg.Level.Warning,
+                        "DeadlineDispatcher",
+                        "Could not read task timings for job {} : {}".format(jobId, e)
+                    )
+
+    @staticmethod
+    def __checkCancellation(dispatchData):
+        if dispatchData["canceller"] is not None:
+            IECore.Canceller.check(dispatchData["canceller"])
+
+    @staticmethod
+    def __reportProgress(dispatchData, progress, message):
+        if dispatchData["progress"] is not None:
+            dispatchData["progress"](progress, message)
+
+    @staticmethod
+    def __lockResumeFile(path):
+        """ Claims the resume file for this dispatch. Returns False if a dispatch that is still
+        running holds it.
+        """
+        lockPath = path + ".lock"
+        directory = os.path.dirname(lockPath)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        for attempt in range(2):
+            try:
+                fd = os.open(lockPath, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                if attempt or not DeadlineDispatcher.__isStaleLock(lockPath):
+                    return False
+                try:
+                    os.remove(lockPath)
+                except FileNotFoundError:
+                    pass
+                continue
+
+            with os.fdopen(fd, "w") as f:
+                json.dump({"host": socket.gethostname(), "pid": os.getpid()}, f)
+            return True
+
+        return False
+
+    @staticmethod
+    def __isStaleLock(lockPath):
+        try:
+            age = time.time() - os.path.getmtime(lockPath)
+            with open(lockPath, "r") as f:
+                owner = json.load(f)
+        except FileNotFoundError:
+            return True
+        except (IOError, ValueError):
+            # Possibly still being written by the dispatch that created it
+            owner = {}
+
+        if age > DeadlineDispatcher.__resumeFileMaxAge:
+            return True
+
+        # A dispatch on this machine can be checked directly. Signalling a process on
+        # Windows terminates it, so there only the age is used.
+        if (
+            sys.platform != "win32" and
+            isinstance(owner, dict) and
+            owner.get("host") == socket.gethostname() and
+            isinstance(owner.get("pid"), int)
+        ):
+            try:
+                os.kill(owner["pid"], 0)
+            except ProcessLookupError:
+                return True
+            except OSError:
+                pass
 
-        dispatchData["scriptNode"].serialiseToFile(dispatchData["scriptFile"])
+        return False
 
-        with Gaffer.Context.current() as c:
-            dispatchData["dispatchJobName"] = self["jobName"].getValue()
+    @staticmethod
+    def __unlockResumeFile(dispatchData):
+        if not dispatchData.get("resumeLocked"):
+            return
 
-        rootDeadlineJob = GafferDeadline.GafferDeadlineJob(rootBatch.node())
-        rootDeadlineJob.setAuxFiles([dispatchData["scriptFile"]])
-        self.__addGafferDeadlineJob(rootDeadlineJob)
-        rootJobs = []
-        for upstreamBatch in rootBatch.preTasks():
-            rootJob = self.__buildDeadlineJobWalk(upstreamBatch, dispatchData)
-            if rootJob is not None:
-                rootJobs.append(rootJob)
+        dispatchData["resumeLocked"] = False
+        try:
+            os.remove(dispatchData["resumePath"] + ".lock")
+        except OSError as e:
+            IECore.msg(
+                IECore.Msg.Level.Warning,
+                "DeadlineDispatcher",
+                "Could not unlock resume file \"{}\" : {}".format(dispatchData["resumePath"], e)
+            )
+
+    @staticmethod
+    def __loadResumeFile(path):
+        """ Returns the resume file contents of an interrupted dispatch, or None. """
+        if not os.path.isfile(path):
+            return None
 
-        rootJobs = list(set(rootJobs))
+        age = time.time() - os.path.getmtime(path)
+        if age > DeadlineDispatcher.__resumeFileMaxAge:
+            IECore.msg(
+                IECore.Msg.Level.Info,
+                "DeadlineDispatcher",
+                "Ignoring resume file \"{}\" from {:.0f} hours ago".format(path, age / 3600)
+            )
+            return None
 
-        for rootJob in rootJobs:
-            self.__submitDeadlineJob(rootJob, dispatchData)
+        try:
+            with open(path, "r") as f:
+                resume = json.load(f)
+            if not isinstance(resume, dict) or "submissionToken" not in resume:
+                raise ValueError("No submission token")
+            return resume
+        except (IOError, ValueError) as e:
+            IECore.msg(
+                IECore.Msg.Level.Warning,
+                "DeadlineDispatcher",
+                "Ignoring unreadable resume file \"{}\" : {}".format(path, e)
+            )
+            return None
+
+    @staticmethod
+    def __saveResumeFile(dispatchData):
+        path = dispatchData["resumePath"]
+        if path is None:
+            return
+
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        resume = {
+            "submissionToken": dispatchData["submissionToken"],
+            "submittedJobs": dispatchData["submittedJobIds"],
+            "pendingJobs": (
+                sorted(dispatchData["pendingJobs"])
+                if dispatchData["pendingJobs"] is not None else None
+            ),
+        }
+
+        tempPath = path + ".tmp"
+        with open(tempPath, "w") as f:
+            json.dump(resume, f)
+        os.replace(tempPath, path)
+        # Keep the lock fresh, so a long dispatch isn't taken for a dead one
+        try:
+            os.utime(path + ".lock")
+        except OSError:
+            pass
+
+    def __saveDryRunPlan(self, dispatchData):
+        """ Write a summary of the jobs a dry run would have submitted, with their frames,
+        tasks and dependencies, next to the job payloads.
+        """
+        dependencyTypes = {
+            v: k.lstrip("_")
+            for k, v in vars(GafferDeadline.GafferDeadlineJob.DeadlineDependencyType).items()
+            if isinstance(v, int)
+        }
+
+        jobs = []
+        for job in self._deadlineJobs:
+            if job.getJobID() is None:
+                continue
+            jobs.append(
+                {
+                    "jobId": job.getJobID(),
+                    "name": job.getJobProperties()["Name"],
+                    "node": job.getGafferNode().relativeName(dispatchData["scriptNode"]),
+                    "plugin": job.getJobProperties()["Plugin"],
+                    "frames": job.getJobProperties()["Frames"],
+                    "taskCount": len(job.getTasks()),
+                    "frameCount": sum(t.getFrameCount() for t in job.getTasks()),
+                    "dependencyType": dependencyTypes.get(job.getDependencyType()),
+                    "upstreamJobIds": sorted(
+                        set(d.getDeadlineJob().getJobID() for d in job.getDependencies().values())
+                    ),
+                }
+            )
+
+        plan = {
+            "jobCount": len(jobs),
+            "taskCount": sum(j["taskCount"] for j in jobs),
+            "frameCount": sum(j["frameCount"] for j in jobs),
+            "jobs": jobs,
+        }
+
+        if dispatchData["transport"] is not None:
+            directory = dispatchData["transport"].directory()
+        else:
+            directory = str(dispatchData["jobDirectory"])
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        path = os.path.join(directory, "dispatchPlan.json")
+        with open(path, "w") as f:
+            json.dump(plan, f, indent=4)
+
+        IECore.msg(
+            IECore.Msg.Level.Info,
+            "DeadlineDispatcher",
+            "Dry run : {} jobs, {} tasks, {} frames. Plan saved to {}".format(
+                plan["jobCount"], plan["taskCount"], plan["frameCount"], path
+            )
+        )
+
+    @staticmethod
+    def __endTrace(dispatchData):
+        """ Stop tracing the dispatch and save the trace into the job directory. """
+        trace = dispatchData["trace"]
+        if trace is None:
+            return
+
+        GafferDeadline.DispatchTrace.end(trace)
+        dispatchData["trace"] = None
+
+        path = os.path.join(str(dispatchData["jobDirectory"]), trace.fileName)
+        try:
+            trace.save(path)
+        except (IOError, OSError) as e:
+            IECore.msg(
+                IECore.Msg.Level.Warning,
+                "DeadlineDispatcher",
+                "Could not save dispatch trace \"{}\" : {}".format(path, e)
+            )
+            return
+
+        IECore.msg(
+            IECore.Msg.Level.Info,
+            "DeadlineDispatcher",
+            "Saved dispatch trace to {}".format(path)
+        )
 
     def __buildDeadlineJobWalk(self, batch, dispatchData):
         IECore.msg(
@@ -152,13 +804,14 @@ class DeadlineDispatcher(GafferDispatch.Dispatcher):
                 )
             )
 
+        context = self.__jobContext(batch.context(), dispatchData)
         if batch.blindData().get("deadlineDispatcher:visited"):
-            return self.__getGafferDeadlineJob(batch.node(), batch.context())
+            return self.__getGafferDeadlineJob(batch.node(), context)
 
-        deadlineJob = self.__getGafferDeadlineJob(batch.node(), batch.context())
+        deadlineJob = self.__getGafferDeadlineJob(batch.node(), context)
         if not deadlineJob:
             deadlineJob = GafferDeadline.GafferDeadlineJob(batch.node())
-            deadlineJob.setContext(batch.context())
+            deadlineJob.setContext(context)
             deadlineJob.setAuxFiles([dispatchData["scriptFile"]])
             self.__addGafferDeadlineJob(deadlineJob)
 
@@ -172,87 +825,435 @@ class DeadlineDispatcher(GafferDispatch.Dispatcher):
 
         return deadlineJob
 
+    @staticmethod
+    def __jobContext(context, dispatchData):
+        # Context variables from the submission overrides are added to the job's context, so
+        # they are used for substitutions and passed on to the farm with the other variables.
+        contextVariables = dispatchData["overrides"].contextVariables()
+        if context is None or not contextVariables:
+            return context
+
+        context = Gaffer.Context(context)
+        for name, value in contextVariables.items():
+            context[name] = value
+
+        return context
+
+    def __jobLimits(self, limits, node, context, dispatchData):
+        # Adds the limit groups from the submission overrides for the node types `node`
+        # evaluates in the job's `context`, so jobs only wait for the licences they use.
+        limitGroups = dispatchData["overrides"].limitGroups()
+        if not limitGroups:
+            return limits
+
+        with GafferDeadline.DispatchTrace.scope("limitGroups"):
+            with Gaffer.Context(context):
+                typeNames = self.__upstreamTypeNames(node, context.hash(), dispatchData)
+
+        existingLimits = limits.split(",")
+        extraLimits = [
+            name for name, groupTypeNames in limitGroups.items()
+            if name not in existingLimits and typeNames.intersection(groupTypeNames)
+        ]
+        if not extraLimits:
+            return limits
+
+        return ",".join(([limits] if limits else []) + extraLimits)
+
+    @staticmethod
+    def __upstreamTypeNames(node, contextHash, dispatchData):
+        """ Returns the type names of `node` and the nodes upstream of it, leaving out nodes
+        that are disabled in the current context or have no `enabled` plug. Task connections
+        aren't followed, since upstream tasks are separate jobs with their own limits. Results
+        are memoised per dispatch by node and `contextHash`, the hash of the current context,
+        so graphs shared by several jobs with the same context are only walked once.
+        """
+        memo = dispatchData["upstreamTypeNames"].setdefault(contextHash, {})
+
+        def inputNodes(node):
+            nodes = {}
+            for plug in Gaffer.Plug.RecursiveInputRange(node):
+                if isinstance(plug, GafferDispatch.TaskNode.TaskPlug) or plug.getInput() is None:
+                    continue
+                sourceNode = plug.source().node()
+                if sourceNode is not None and sourceNode != node:
+                    nodes[sourceNode] = None
+            return list(nodes)
+
+        # Walked depth first without recursion, since chains of nodes can be very long. Nodes
+        # that are still being walked are skipped, to cope with the cycles made by Loops.
+        inProgress = set()
+        stack = [(node, None)]
+        while stack:
+            current, inputs = stack.pop()
+            if current in memo:
+                continue
+
+            if inputs is None:
+                if current in inProgress:
+                    continue
+                inProgress.add(current)
+                inputs = inputNodes(current)
+                stack.append((current, inputs))
+                stack.extend((n, None) for n in inputs if n not in memo)
+                continue
+
+            typeNames = set()
+            for n in inputs:
+                typeNames.update(memo.get(n, ()))
+            enabledPlug = current.getChild("enabled")
+            if enabledPlug is not None and enabledPlug.getValue():
+                typeNames.add(current.typeName())
+
+            memo[current] = frozenset(typeNames)
+            inProgress.discard(current)
+
+        return memo[node]
+
+    @staticmethod
+    def __deadlineJobKey(node, context):
+        # A DeadlineJob is defined by the combination of Gaffer TaskNode and Context,
+        # so key the registry on the node and the context hash.
+        return (node, context.hash() if context is not None else None)
+
     def __getGafferDeadlineJob(self, node, context):
-        for j in self._deadlineJobs:
-            if j.getGafferNode() == node and j.getContext() == context:
-                return j
+        return self._deadlineJobsByKey.get(self.__deadlineJobKey(node, context))
 
     def __addGafferDeadlineJob(self, newDeadlineJob):
+        key = self.__deadlineJobKey(newDeadlineJob.getGafferNode(), newDeadlineJob.getContext())
+        if key in self._deadlineJobsByKey:
+            return
+        # `_deadlineJobs` keeps insertion order for callers iterating the submitted jobs
+        self._deadlineJobsByKey[key] = newDeadlineJob
         self._deadlineJobs.append(newDeadlineJob)
-        self._deadlineJobs = list(set(self._deadlineJobs))
 
-    def __submitDeadlineJob(self, deadlineJob, dispatchData):
-        # submit jobs depth first so parent job IDs will be populated
-        for parentJob in deadlineJob.getParentJobs():
-            self.__submitDeadlineJob(parentJob, dispatchData)
+    @staticmethod
+    def __submissionWaves(rootJobs):
+        """ Group the job tree into waves that can be submitted together. Every job in a wave
+        only depends on jobs from earlier waves, so their Deadline job IDs are known by the time
+        the wave is prepared. Control tasks are never submitted, so they don't add a wave of
+        their own and pass their level through to their children.
+        """
+        # GafferDeadlineJob hashes its (still changing) properties, so key on identity instead
+        levels = {}
+
+        def jobLevel(job):
+            if id(job) in levels:
+                return levels[id(job)][1]
+            level = 0
+            for parentJob in job.getParentJobs():
+                parentLevel = jobLevel(parentJob)
+                if not GafferDeadline.GafferDeadlineJob.isControlTask(parentJob.getGafferNode()):
+                    parentLevel += 1
+                level = max(level, parentLevel)
+            levels[id(job)] = (job, level)
+            return level
+
+        for rootJob in rootJobs:
+            jobLevel(rootJob)
+
+        waves = {}
+        for job, level in levels.values():
+            if GafferDeadline.GafferDeadlineJob.isControlTask(job.getGafferNode()):
+                continue
+            waves.setdefault(level, []).append(job)
+
+        return [waves[level] for level in sorted(waves.keys())]
+
+    def __submitDeadlineJobs(self, rootJobs, dispatchData):
+        """ Submit the job tree one wave at a time. Jobs are prepared on the calling thread
+        because that touches the node graph, then the HTTP submissions for the whole wave are
+        sent concurrently, sharing the pooled connections from DeadlineTools, or as a single
+        batched request when `DeadlineTools.BATCH_SUBMISSION` is enabled.
+        """
+        waves = self.__submissionWaves(rootJobs)
+        jobCount = sum(len(wave) for wave in waves)
+        doneCount = 0
+        self.__reportProgress(dispatchData, 0.0, "Submitting {} jobs".format(jobCount))
+
+        for waveIndex, wave in enumerate(waves):
+            startTime = time.perf_counter()
+
+            readyJobs = []
+            for job in wave:
+                self.__checkCancellation(dispatchData)
+                with GafferDeadline.DispatchTrace.scope(
+                    "prepareJob", node=job.getGafferNode().relativeName(dispatchData["scriptNode"])
+                ):
+                    if self.__prepareDeadlineJob(job, dispatchData):
+                        readyJobs.append(job)
+            self.__checkCancellation(dispatchData)
+
+            if dispatchData["manifest"] is not None:
+                with GafferDeadline.DispatchTrace.scope("reuseUnchangedJobs"):
+                    readyJobs = self.__reuseUnchangedJobs(readyJobs, dispatchData)
+            if dispatchData["resuming"] and readyJobs:
+                with GafferDeadline.DispatchTrace.scope("resumeSubmittedJobs"):
+                    readyJobs = self.__resumeSubmittedJobs(readyJobs, dispatchData)
+            doneCount += len(wave)
+            if not readyJobs:
+                continue
+
+            if not dispatchData["dryRun"]:
+                # Until their submissions return, the jobs may or may not exist on the farm
+                for job in readyJobs:
+                    if id(job) not in dispatchData["payloadHashes"]:
+                        dispatchData["payloadHashes"][id(job)] = job.getPayloadHash()
+                    if dispatchData["pendingJobs"] is not None:
+                        dispatchData["pendingJobs"].add(dispatchData["payloadHashes"][id(job)])
+                self.__saveResumeFile(dispatchData)
+
+            errors = []
+            results = []
+            with GafferDeadline.DispatchTrace.scope(
+                "submitWave", wave=waveIndex, jobs=len(readyJobs)
+            ):
+                if GafferDeadline.DeadlineTools.BATCH_SUBMISSION and len(readyJobs) > 1:
+                    # The whole wave is independent, so it can go in a single request
+                    try:
+                        results = list(zip(
+                            readyJobs,
+                            GafferDeadline.GafferDeadlineJob.submitJobs(
+                                readyJobs, dispatchData["jobDirectory"]
+                            )
+                        ))
+                    except Exception as e:
+                        errors.append(e)
+                else:
+                    with concurrent.futures.ThreadPoolExecutor(
+                        max_workers=min(
+                            len(readyJobs),
+                            GafferDeadline.DeadlineTools.SUBMISSION_THREADS
+                        )
+                    ) as executor:
+                        futures = {
+                            executor.submit(
+                                GafferDeadline.DeadlineTools.bindTransport(j.submitJob),
+                                dispatchData["jobDirectory"]
+                            ): j
+                            for j in readyJobs
+                        }
+                        for future in concurrent.futures.as_completed(futures):
+                            try:
+                                results.append((futures[future], future.result()))
+                            except Exception as e:
+                                errors.append(e)
+
+            for job, (jobId, output) in results:
+                jobName = job.getJobProperties()["Name"]
+                if jobId is None:
+                    IECore.Log.error(jobName, "failed to submit to Deadline.", output)
+                else:
+                    IECore.Log.info(jobName, "submission succeeded.", output)
+                    self.__recordSubmittedJob(job, jobId, dispatchData)
+            if not dispatchData["dryRun"]:
+                # Jobs that failed to submit stay pending, since we can't tell whether the
+                # Web Service created them.
+                self.__saveResumeFile(dispatchData)
+
+            IECore.msg(
+                IECore.Msg.Level.Info,
+                "DeadlineDispatcher",
+                "Submitted wave {} ({} jobs) in {:.3f}s".format(
+                    waveIndex,
+                    len(readyJobs),
+                    time.perf_counter() - startTime
+                )
+            )
+            self.__reportProgress(
+                dispatchData,
+                float(doneCount) / jobCount,
+                "Submitted wave {} of {}".format(waveIndex + 1, len(waves))
+            )
+
+            # Let the rest of the wave finish so the submitted jobs keep their IDs, but don't
+            # submit downstream jobs that would be missing their dependencies.
+            if errors:
+                raise errors[0]
 
+    @staticmethod
+    def __recordSubmittedJob(job, jobId, dispatchData):
+        payloadHash = dispatchData["payloadHashes"].get(id(job))
+        if payloadHash is not None:
+            dispatchData["submittedJobIds"][payloadHash] = jobId
+            if dispatchData["pendingJobs"] is not None:
+                dispatchData["pendingJobs"].discard(payloadHash)
+        if dispatchData["manifest"] is not None:
+            key, submissionHash = dispatchData["submissionHashes"][id(job)]
+            dispatchData["manifest"].addJob(key, submissionHash, jobId)
+        if dispatchData["timingHistory"] is not None:
+            dispatchData["timingHistory"].addPendingJob(
+                job.getGafferNode().relativeName(dispatchData["scriptNode"]),
+                jobId
+            )
+
+    def __resumeSubmittedJobs(self, jobs, dispatchData):
+        """ Give jobs that the interrupted dispatch already submitted the ID of that Deadline
+        job. Only jobs with the same payload are matched, so anything changed since is submitted
+        again. Returns the jobs that still need to be submitted.
+        """
+        if dispatchData["submittedJobs"] is None:
+            dispatchData["submittedJobs"] = {}
+            try:
+                if dispatchData["pendingJobs"]:
+                    # Some jobs were being submitted when the dispatch was interrupted, and we
+                    # don't know their IDs, so all the jobs on the farm have to be searched.
+                    submittedJobs = GafferDeadline.DeadlineTools.getSubmittedJobs(
+                        dispatchData["submissionToken"]
+                    )
+                    # Anything that wasn't found was never submitted
+                    dispatchData["pendingJobs"] = set()
+                else:
+                    if dispatchData["pendingJobs"] is None:
+                        # Searching the whole farm for jobs that may not exist isn't worth
+                        # it, so only the jobs with known IDs are reused.
+                        IECore.msg(
+                            IECore.Msg.Level.Warning,
+                            "DeadlineDispatcher",
+                            "The interrupted dispatch didn't record which jobs it was submitting, "
+                            "only reusing the jobs with known IDs"
+                        )
+                        dispatchData["pendingJobs"] = set()
+                    submittedJobs = GafferDeadline.DeadlineTools.getSubmittedJobs(
+                        dispatchData["submissionToken"],
+                        jobIds=sorted(dispatchData["submittedJobIds"].values())
+                    )
+                dispatchData["submittedJobs"] = submittedJobs
+            except Exception as e:
+                IECore.msg(
+                    IECore.Msg.Level.Warning,
+                    "DeadlineDispatcher",
+                    "Could not find the jobs of the interrupted dispatch, submitting all jobs : "
+                    "{}".format(e)
+                )
+
+        if not dispatchData["submittedJobs"]:
+            return jobs
+
+        remainingJobs = []
+        for job in jobs:
+            payloadHash = job.getPayloadHash()
+            dispatchData["payloadHashes"][id(job)] = payloadHash
+            submittedJob = dispatchData["submittedJobs"].get(payloadHash)
+            if submittedJob is None:
+                remainingJobs.append(job)
+                continue
+
+            job.setJobID(submittedJob["_id"])
+            IECore.Log.info(
+                job.getJobProperties()["Name"],
+                "was submitted by the interrupted dispatch, reusing Deadline job",
+                submittedJob["_id"]
+            )
+            self.__recordSubmittedJob(job, submittedJob["_id"], dispatchData)
+
+        return remainingJobs
+
+    def __reuseUnchangedJobs(self, jobs, dispatchData):
+        """ Give jobs that are unchanged since they were recorded in the manifest their
+        previous Deadline job ID, as long as that job still exists and hasn't failed. Returns
+        the jobs that still need to be submitted.
+        """
+        manifest = dispatchData["manifest"]
+
+        candidates = {}
+        for job in jobs:
+            # Hash before submission, since submitting merges the Deadline settings into the
+            # job properties.
+            key = "{}:{}".format(
+                job.getGafferNode().relativeName(dispatchData["scriptNode"]),
+                job.getContext().hash().toString()
+            )
+            submissionHash = job.getSubmissionHash()
+            dispatchData["submissionHashes"][id(job)] = (key, submissionHash)
+
+            jobId = manifest.jobID(key, submissionHash)
+            if jobId is not None:
+                candidates[id(job)] = jobId
+
+        existingJobs = {}
+        if candidates:
+            try:
+                existingJobs = GafferDeadline.DeadlineTools.getJobs(
+                    sorted(set(candidates.values()))
+                )
+            except Exception as e:
+                IECore.msg(
+                    IECore.Msg.Level.Warning,
+                    "DeadlineDispatcher",
+                    "Could not check previously submitted jobs, submitting all jobs : {}".format(e)
+                )
+
+        remainingJobs = []
+        for job in jobs:
+            jobId = candidates.get(id(job))
+            if (
+                jobId in existingJobs and
+                existingJobs[jobId].get("Stat") != self.__failedJobStatus
+            ):
+                job.setJobID(jobId)
+                IECore.Log.info(
+                    job.getJobProperties()["Name"],
+                    "is unchanged, reusing Deadline job",
+                    jobId
+                )
+            else:
+                remainingJobs.append(job)
+
+        return remainingJobs
+
+    def __prepareDeadlineJob(self, deadlineJob, dispatchData):
+        """ Fill in the job and plugin properties for `deadlineJob`. Returns True if the job
+        is ready to be submitted to Deadline.
+        """
         gafferNode = deadlineJob.getGafferNode()
 
         # Don't submit command tasks, they pollute the Deadline Monitor and cause
         # potentially lengthy delays in dequeuing tasks that do nothing.
         if GafferDeadline.GafferDeadlineJob.isControlTask(deadlineJob.getGafferNode()):
-            return None
+            return False
 
         # this job is already submitted if it has an ID
         if deadlineJob.getJobID() is not None:
-            return deadlineJob.getJobID()
+            return False
 
         self.preSpoolSignal()(self, deadlineJob)
 
-        AYON_MODE = True
-        # see if we have access to Ayon
-        try:
-            from ayon_core.pipeline import registered_host
-            from ayon_core.settings import get_project_settings
-        except Exception as err:
-            print("Could not import ayon_core stuff", err)
-            AYON_MODE = False
-
-        print(f"AYON: {AYON_MODE}")
-        if AYON_MODE:
-            host = registered_host()
-            ayon_settings = get_project_settings(
-                host.get_current_project_name())
-            try:
-                deadline_settings = ayon_settings["deadline"]
-                gaffer_settings = ayon_settings["gaffer"]["deadline"]
-                print("GOT NEEDED AYON SETTINGS")
-            except KeyError as err:
-                # ok we dont have either of these settings
-                AYON_MODE = False
-                print(f"Error getting Ayon settings {err}")
-
         deadlinePlug = gafferNode["dispatcher"].getChild("deadline")
 
         if deadlinePlug is not None:
+            overrides = dispatchData["overrides"]
+            overriddenSettings = overrides.deadlineSettings(gafferNode)
+
+            def settingValue(name):
+                if name in overriddenSettings:
+                    return overriddenSettings[name]
+                return deadlinePlug[name].getValue()
+
             initialStatus = (
-                "Suspended" if deadlinePlug["submitSuspended"].getValue() else "Active"
+                "Suspended" if settingValue("submitSuspended") else "Active"
             )
             machineListType = (
-                "Blacklist" if deadlinePlug["isBlackList"].getValue() else "Whitelist"
+                "Blacklist" if settingValue("isBlackList") else "Whitelist"
             )
 
             # to prevent Deadline from splitting up our tasks (since we've already done that based
-            # on batches), set the chunk size to the largest frame range
-            chunkSize = (
-                deadlineJob.getTasks()[0].getEndFrame() -
-                deadlineJob.getTasks()[0].getStartFrame() + 1
+            # on batches), set the chunk size to the largest frame range. Tasks are only merged
+            # into one frame range where Deadline splits it back into the same tasks.
+            chunkSize = max(t.getFrameCount() for t in deadlineJob.getTasks())
+            frameString = GafferDeadline.FrameRangeAlgo.frameString(
+                [(t.getStartFrame(), t.getEndFrame(), t.getStep()) for t in deadlineJob.getTasks()],
+                deadlineJob.getFrameStep(),
+                chunkSize
             )
-            frameString = ""
-            for t in deadlineJob.getTasks():
-                chunkSize = max(t.getEndFrame() - t.getStartFrame() + 1, chunkSize)
-                if t.getStartFrame() == t.getEndFrame():
-                    frameString += ",{}".format(t.getStartFrame())
-                else:
-                    frameString += ",{}-{}".format(t.getStartFrame(), t.getEndFrame())
 
             context = deadlineJob.getContext()
 
-            primary_pool = context.substitute(deadlinePlug["pool"].getValue())
+            primary_pool = context.substitute(settingValue("pool"))
             secondary_pool = context.substitute(
-                            deadlinePlug["secondaryPool"].getValue()
+                            settingValue("secondaryPool")
                         )
-            group = context.substitute(deadlinePlug["group"].getValue())
+            group = context.substitute(settingValue("group"))
 
             with Gaffer.Context(deadlineJob.getContext()) as c:
                 jobInfo = {
@@ -270,67 +1271,56 @@ class DeadlineDispatcher(GafferDispatch.Dispatcher):
                                 gafferNode,
                                 GafferDeadline.DeadlineTask
                             ) else gafferNode["plugin"].getValue(),
-                            "BatchName": deadlinePlug["batchName"].getValue(),
-                            "Comment": deadlinePlug["comment"].getValue(),
-                            "Department": deadlinePlug["department"].getValue(),
+                            "BatchName": settingValue("batchName"),
+                            "Comment": settingValue("comment"),
+                            "Department": settingValue("department"),
                             "Pool": primary_pool,
                             "SecondaryPool": secondary_pool,
                             "Group": group,
-                            "Priority": deadlinePlug["priority"].getValue(),
-                            "TaskTimeoutMinutes": int(deadlinePlug["taskTimeout"].getValue()),
-                            "EnableAutoTimeout": deadlinePlug["enableAutoTimeout"].getValue(),
-                            "ConcurrentTasks": deadlinePlug["concurrentTasks"].getValue(),
-                            "MachineLimit": deadlinePlug["machineLimit"].getValue(),
-                            machineListType: deadlinePlug["machineList"].getValue(),
-                            "LimitGroups": deadlinePlug["limits"].getValue(),
-                            "OnJobComplete": deadlinePlug["onJobComplete"].getValue(),
+                            "Priority": settingValue("priority"),
+                            "TaskTimeoutMinutes": int(settingValue("taskTimeout")),
+                            "EnableAutoTimeout": settingValue("enableAutoTimeout"),
+                            "ConcurrentTasks": settingValue("concurrentTasks"),
+                            "MachineLimit": settingValue("machineLimit"),
+                            machineListType: settingValue("machineList"),
+                            "LimitGroups": self.__jobLimits(
+                                settingValue("limits"),
+                                gafferNode,
+                                c,
+                                dispatchData
+                            ),
+                            "OnJobComplete": settingValue("onJobComplete"),
                             "InitialStatus": initialStatus,
                             }
 
                 auxFiles = deadlineJob.getAuxFiles()   # this will already have substitutions included
-                auxFiles += [f for f in deadlinePlug["auxFiles"].getValue()]
+                auxFiles += [f for f in settingValue("auxFiles")]
                 deadlineJob.setAuxFiles(auxFiles)
 
-                for output in deadlinePlug["outputs"].getValue():
+                for output in settingValue("outputs"):
                     deadlineJob.addOutput(output, c)
 
                 environmentVariables = IECore.CompoundData()
 
                 deadlinePlug["environmentVariables"].fillCompoundData(environmentVariables)
-                extraEnvironmentVariables = deadlinePlug["extraEnvironmentVariables"].getValue()
+                extraEnvironmentVariables = settingValue("extraEnvironmentVariables")
                 for name, value in extraEnvironmentVariables.items():
                     environmentVariables[name] = value
+                for name, value in overrides.environmentVariables(gafferNode).items():
+                    environmentVariables[name] = value
                 for name, value in environmentVariables.items():
                     deadlineJob.appendEnvironmentVariable(name, str(value))
 
-                # propagate several key environment variables 
-                if AYON_MODE:
-                    vars_to_submit = []
-                    extra_vars = {}
-                    env_vars = gaffer_settings["env_vars"]
-                    for ev in env_vars:
-                        if ev["use_env_value"]:
-                            vars_to_submit.append(ev["name"])
-                        else:
-                            extra_vars[ev["name"]] = ev["value"]
-                else:
-                    vars_to_submit = [
-                        "ARNOLD_ROOT",
-                        "GAFFER_EXTENSION_PATHS"
-                    ]
-                    extra_vars = {}
-                    env_vars = {}
-
-                print("===", env_vars, extra_vars)
-                
-                for name in vars_to_submit:
+                # propagate several key environment variables
+                varsToSubmit, extraVars = dispatchData["settings"].environmentVariables()
+                for name in varsToSubmit:
                     deadlineJob.appendEnvironmentVariable(name, os.environ.get(name, ''))
-                for name, value in extra_vars.items():
+                for name, value in extraVars.items():
                     deadlineJob.appendEnvironmentVariable(name, value)
 
                 deadlineSettings = IECore.CompoundData()
                 deadlinePlug["deadlineSettings"].fillCompoundData(deadlineSettings)
-                extraDeadlineSettings = deadlinePlug["extraDeadlineSettings"].getValue()
+                extraDeadlineSettings = settingValue("extraDeadlineSettings")
                 for name, value in extraDeadlineSettings.items():
                     deadlineSettings[name] = value
                 for name, value in deadlineSettings.items():
@@ -359,73 +1349,70 @@ class DeadlineDispatcher(GafferDispatch.Dispatcher):
                             for job A runs. If the dependency start and end frame offsets don't
                             match, this has to be handled by a dependency script.
             """
-            dependencies = deadlineJob.getDependencies().values()
+            with GafferDeadline.DispatchTrace.scope("dependencies") as scope:
+                dependencies = list(deadlineJob.getDependencies().values())
+                scope.setArg("count", len(dependencies))
 
-            if len(dependencies) > 0 and deadlinePlug["dependencyMode"].getValue() != "None":
+            if len(dependencies) > 0 and settingValue("dependencyMode") != "None":
                 jobDependent = False
                 frameDependent = False
                 simpleFrameOffset = True
-                if deadlinePlug["dependencyMode"].getValue() == "Job":
+                if settingValue("dependencyMode") == "Job":
                     jobDependent = True
-                elif deadlinePlug["dependencyMode"].getValue() == "Frame":
+                elif settingValue("dependencyMode") == "Frame":
                     frameDependent = True
-                elif deadlinePlug["dependencyMode"].getValue() == "Auto":
+                elif settingValue("dependencyMode") == "Auto":
                     jobDependent = False
-                    dependencyJobs = [i.getDeadlineJob() for i in dependencies]
-                    dependencyJobs = list(set(dependencyJobs))
 
                     frameDependent = True
                     simpleFrameOffset = True
                     if (len(dependencies) > 0):
-                        deadlineJob._frameDependencyOffsetStart = (
-                            list(dependencies)[0].getUpstreamDeadlineTask().getStartFrame() -
-                            list(dependencies)[0].getDeadlineTask().getStartFrame()
-                        )
-                        deadlineJob._frameDependencyOffsetEnd = (
-                            list(dependencies)[0].getUpstreamDeadlineTask().getEndFrame() -
-                            list(dependencies)[0].getDeadlineTask().getEndFrame()
-                        )
-
-                        for d in dependencies:
-                            newFrameOffsetStart = (
-                                d.getUpstreamDeadlineTask().getStartFrame() -
-                                d.getDeadlineTask().getStartFrame()
-                            )
-                            newFrameOffsetEnd = (
-                                d.getUpstreamDeadlineTask().getEndFrame() -
-                                d.getDeadlineTask().getEndFrame()
-                            )
+                        rangePairs = [
+                            (
+                                (
+                                    d.getUpstreamDeadlineTask().getStartFrame(),
+                                    d.getUpstreamDeadlineTask().getEndFrame()
+                                ),
+                                (
+                                    d.getDeadlineTask().getStartFrame(),
+                                    d.getDeadlineTask().getEndFrame()
+                                )
+                            ) for d in dependencies
+                        ]
+                        (
+                            deadlineJob._frameDependencyOffsetStart,
+                            deadlineJob._frameDependencyOffsetEnd
+                        ) = GafferDeadline.FrameRangeAlgo.rangeOffset(*rangePairs[0])
 
-                            if (
-                                newFrameOffsetStart != deadlineJob._frameDependencyOffsetStart or
-                                newFrameOffsetEnd != deadlineJob._frameDependencyOffsetEnd
-                            ):
-                                simpleFrameOffset = False
+                        simpleFrameOffset = GafferDeadline.FrameRangeAlgo.hasCommonOffset(
+                            rangePairs
+                        )
 
                         # If we can't just shift the frame start and end, we might still be able to
                         # use frame dependency with tasks of different frame lengths
-                        if not simpleFrameOffset:
-                            for j in dependencyJobs:
-                                dependencyTasks = [
-                                    t.getUpstreamDeadlineTask() for t in dependencies if (
-                                        t.getDeadlineJob() == j
-                                    )
-                                ]
-                                dependencyFrames = []
-                                for t in dependencyTasks:
-                                    dependencyFrames += range(
-                                        t.getStartFrame(),
-                                        t.getEndFrame() + 1
-                                    )
-                                currentFrames = []
-                                for t in deadlineJob.getTasks():
-                                    currentFrames += range(
-                                        t.getStartFrame(),
-                                        t.getEndFrame() + 1
-                                    )
-                                for f in currentFrames:
-                                    if f not in dependencyFrames:
-                                        frameDependent = False
+                        if not simpleFrameOffset and (
+                            any(t.getStep() > 1 for t in deadlineJob.getTasks()) or
+                            any(d.getUpstreamDeadlineTask().getStep() > 1 for d in dependencies)
+                        ):
+                            # Ranges of stepped tasks include frames that are never rendered,
+                            # so they can't be used to prove upstream frames exist.
+                            frameDependent = False
+                        elif not simpleFrameOffset:
+                            upstreamRanges = {}
+                            for d, (upstreamRange, _) in zip(dependencies, rangePairs):
+                                upstreamRanges.setdefault(id(d.getDeadlineJob()), []).append(
+                                    upstreamRange
+                                )
+                            currentRanges = [
+                                (t.getStartFrame(), t.getEndFrame()) for t in deadlineJob.getTasks()
+                            ]
+                            for ranges in upstreamRanges.values():
+                                if not GafferDeadline.FrameRangeAlgo.containsRanges(
+                                    ranges,
+                                    currentRanges
+                                ):
+                                    frameDependent = False
+                                    break
 
                     else:
                         frameDependent = False
@@ -466,15 +1453,31 @@ class DeadlineDispatcher(GafferDispatch.Dispatcher):
                             "IsFrameDependent": True,
                         }
                     )
-                    i = 0
+                    # Group the task pairs by upstream job so runs of tasks can share one
+                    # entry, see FrameRangeAlgo.encodeTaskDependencies() for the format.
+                    upstreamTasksByJob = {}
                     for d in dependencies:
-                        jobInfo["ExtraInfoKeyValue{}".format(i)] = "{}:{}={}".format(
-                            int(d.getDeadlineTask().getTaskNumber()),
+                        upstreamTasks = upstreamTasksByJob.setdefault(
                             d.getDeadlineJob().getJobID(),
-                            d.getUpstreamDeadlineTask().getTaskNumber()
+                            {}
                         )
+                        upstreamTasks.setdefault(
+                            int(d.getDeadlineTask().getTaskNumber()),
+                            set()
+                        ).add(d.getUpstreamDeadlineTask().getTaskNumber())
 
-                        i += 1
+                    i = 0
+                    for jobId, upstreamTasks in upstreamTasksByJob.items():
+                        for tasks, upstream in GafferDeadline.FrameRangeAlgo.encodeTaskDependencies(
+                            upstreamTasks
+                        ):
+                            jobInfo["ExtraInfoKeyValue{}".format(i)] = "{}:{}={}".format(
+                                tasks,
+                                jobId,
+                                upstream
+                            )
+
+                            i += 1
 
                     deadlineJob.setDependencyType(
                         GafferDeadline.GafferDeadlineJob.DeadlineDependencyType.Scripted
@@ -489,11 +1492,16 @@ class DeadlineDispatcher(GafferDispatch.Dispatcher):
                 pluginInfo = {
                     "Script": os.path.split(dispatchData["scriptFile"])[-1],
                     "ScriptFile": dispatchData["scriptFile"],
+                    "ScriptHash": dispatchData["scriptHash"],
                     "Version": Gaffer.About.versionString(),
                     "IgnoreScriptLoadErrors": False,
                     "Nodes": gafferNode.relativeName(dispatchData["scriptNode"]),
-                    "Frames": "<STARTFRAME>-<ENDFRAME>",
-                    "Threads": deadlinePlug["threads"].getValue(),
+                    "Frames": "<STARTFRAME>-<ENDFRAME>{}".format(
+                        "x{}".format(deadlineJob.getFrameStep())
+                        if deadlineJob.getFrameStep() > 1 else ""
+                    ),
+                    "Threads": settingValue("threads"),
+                    "PersistentWorker": settingValue("persistentWorker"),
                 }
             else:
                 data = IECore.CompoundData()
@@ -523,19 +1531,14 @@ class DeadlineDispatcher(GafferDispatch.Dispatcher):
 
             deadlineJob.setJobProperties(jobInfo)
             deadlineJob.setPluginProperties(pluginInfo)
+            deadlineJob.setSubmissionToken(dispatchData["submissionToken"])
 
-            deadlineJob.setLogLevel(deadlinePlug["logLevel"].getValue())
+            deadlineJob.setLogLevel(settingValue("logLevel"))
 
-            jobId, output = deadlineJob.submitJob(self.jobDirectory())
-            if jobId is None:
-                IECore.Log.error(jobInfo["Name"], "failed to submit to Deadline.", output)
-            else:
-                IECore.Log.info(jobInfo["Name"], "submission succeeded.", output)
-
-            return deadlineJob.getJobID()
+            return True
         else:
             IECore.Log.error("GafferDeadline", "Failed to acquire Deadline plug")
-            return None
+            return False
 
     @staticmethod
     def _setupPlugs(parentPlug):
@@ -563,6 +1566,7 @@ class DeadlineDispatcher(GafferDispatch.Dispatcher):
             maxValue=16
         )
         parentPlug["deadline"]["threads"] = Gaffer.IntPlug(defaultValue=0, minValue=0)
+        parentPlug["deadline"]["persistentWorker"] = Gaffer.BoolPlug(defaultValue=False)
         parentPlug["deadline"]["machineLimit"] = Gaffer.IntPlug(defaultValue=0, minValue=0)
         parentPlug["deadline"]["machineList"] = Gaffer.StringPlug()
         parentPlug["deadline"]["isBlackList"] = Gaffer.BoolPlug(defaultValue=False)
@@ -0,0 +1,237 @@
+##########################################################################
+#
+#  Copyright (c) 2019, Hypothetical Inc. All rights reserved.
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#      * Redistributions of source code must retain the above
+#        copyright notice, this list of conditions and the following
+#        disclaimer.
+#
+#      * Redistributions in binary form must reproduce the above
+#        copyright notice, this list of conditions and the following
+#        disclaimer in the documentation and/or other materials provided with
+#        the distribution.
+#
+#      * Neither the name of Hypothetical Inc. nor the names of
+#        any other contributors to this software may be used to endorse or
+#        promote products derived from this software without specific prior
+#        written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+#  IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+#  THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+#  PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+#  CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+#  EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+#  PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+#  PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+#  LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+#  NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+#  SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+##########################################################################
+
+import os
+import json
+import time
+import threading
+
+import IECore
+
+from . import DeadlineTools
+
+
+class DeadlineListCache(object):
+    """ Keeps the lists of pools, groups, limits and Workers from Deadline in a JSON file
+    shared by all Gaffer sessions, so they can be shown without waiting for the Web Service.
+    `values()` returns the cached list straight away and refreshes it on a background thread
+    once it is older than `ttl` seconds. The lists are kept separately for each Web Service
+    URL, so sessions talking to different farms don't share them.
+    """
+
+    fileName = "deadlineLists.json"
+
+    # The DeadlineTools function fetching each list
+    listFunctions = {
+        "pools": "getPools",
+        "groups": "getGroups",
+        "limits": "getLimitGroups",
+        "slaves": "getMachineList",
+    }
+
+    __defaultCache = None
+    __defaultCacheLock = threading.Lock()
+
+    def __init__(self, path=None, ttl=None):
+        self.__path = path or self.defaultPath()
+        self.__ttl = ttl if ttl is not None else float(
+            os.environ.get("GAFFERDEADLINE_LIST_CACHE_TTL", 3600)
+        )
+        self.__lists = self.__load()
+        self.__refreshes = {}
+        self.__lock = threading.Lock()
+
+    @classmethod
+    def defaultCache(cls):
+        """ Returns the cache shared by everything in this session. """
+        with cls.__defaultCacheLock:
+            if cls.__defaultCache is None:
+                cls.__defaultCache = DeadlineListCache()
+            return cls.__defaultCache
+
+    @staticmethod
+    def defaultPath():
+        """ The `GAFFERDEADLINE_LIST_CACHE` environment variable, or a file in the user's
+        Gaffer directory.
+        """
+        return os.environ.get("GAFFERDEADLINE_LIST_CACHE") or os.path.join(
+            os.path.expanduser("~"), "gaffer", "GafferDeadline", DeadlineListCache.fileName
+        )
+
+    def path(self):
+        return self.__path
+
+    def values(self, name, refresh=True, callback=None):
+        """ Returns the cached list `name`, which is empty if it has never been fetched. If
+        the list is missing or older than the TTL and `refresh` is True, it is fetched again
+        in the background and `callback(name, values)` is called on that thread once the new
+        values are cached.
+        """
+        server = self.__server()
+        if server is None:
+            return []
+
+        with self.__lock:
+            entry = self.__lists.get(server, {}).get(name)
+
+        if refresh and self.__isStale(entry):
+            self.refresh(name, callback)
+
+        return list(entry["values"]) if entry is not None else []
+
+    def isStale(self, name):
+        server = self.__server()
+        with self.__lock:
+            return self.__isStale(self.__lists.get(server, {}).get(name))
+
+    def fetch(self, name):
+        """ Fetches the list `name` from Deadline now, caching and returning it. """
+        server = DeadlineTools.getWebServiceUrl()
+        values = list(getattr(DeadlineTools, self.listFunctions[name])())
+
+        with self.__lock:
+            self.__lists.setdefault(server, {})[name] = {"time": time.time(), "values": values}
+            self.__save(server, name)
+
+        return values
+
+    def refresh(self, name, callback=None):
+        """ Fetches the list `name` on a background thread. Refreshes of a list that is
+        already being fetched share the fetch. Returns the thread.
+        """
+        with self.__lock:
+            refresh = self.__refreshes.get(name)
+            if refresh is not None:
+                if callback is not None:
+                    refresh[1].append(callback)
+                return refresh[0]
+
+            callbacks = [callback] if callback is not None else []
+            thread = threading.Thread(
+                target=self.__refresh,
+                args=(name, callbacks),
+                name="DeadlineListCache:{}".format(name),
+                daemon=True
+            )
+            self.__refreshes[name] = (thread, callbacks)
+
+        thread.start()
+        return thread
+
+    def invalidate(self):
+        """ Marks every list as stale, so they are fetched again on next use. """
+        with self.__lock:
+            for lists in self.__lists.values():
+                for entry in lists.values():
+                    entry["time"] = 0
+
+    def __refresh(self, name, callbacks):
+        try:
+            values = self.fetch(name)
+        except Exception as e:
+            IECore.msg(
+                IECore.Msg.Level.Warning,
+                "DeadlineListCache",
+                "Could not fetch {} from Deadline : {}".format(name, e)
+            )
+            return
+        finally:
+            with self.__lock:
+                del self.__refreshes[name]
+
+        for callback in callbacks:
+            callback(name, values)
+
+    def __isStale(self, entry):
+        return entry is None or time.time() - entry["time"] > self.__ttl
+
+    def __server(self):
+        try:
+            return DeadlineTools.getWebServiceUrl()
+        except Exception as e:
+            IECore.msg(
+                IECore.Msg.Level.Warning,
+                "DeadlineListCache",
+                "Could not find the Deadline Web Service : {}".format(e)
+            )
+            return None
+
+    def __load(self):
+        if not os.path.isfile(self.__path):
+            return {}
+
+        try:
+            with open(self.__path, "r") as f:
+                lists = json.load(f)
+        except (IOError, ValueError) as e:
+            IECore.msg(
+                IECore.Msg.Level.Warning,
+                "DeadlineListCache",
+                "Ignoring unreadable cache \"{}\" : {}".format(self.__path, e)
+            )
+            return {}
+
+        if not isinstance(lists, dict):
+            return {}
+
+        # The lists are keyed by Web Service URL. Lists saved before that, directly at the top
+        # level, could be from any farm so they are dropped.
+        return {
+            server: serverLists for server, serverLists in lists.items()
+            if server not in self.listFunctions and isinstance(serverLists, dict)
+        }
+
+    def __save(self, server, name):
+        # Other sessions may have refreshed other lists since this cache was loaded, so only
+        # the list that was fetched replaces what is on disk.
+        lists = self.__load()
+        lists.setdefault(server, {})[name] = self.__lists[server][name]
+
+        directory = os.path.dirname(self.__path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory, exist_ok=True)
+
+        tempPath = "{}.{}.{}.tmp".format(self.__path, os.getpid(), threading.get_ident())
+        try:
+            with open(tempPath, "w") as f:
+                json.dump(lists, f, indent=4, sort_keys=True)
+            os.replace(tempPath, self.__path)
+        except (IOError, OSError) as e:
+            IECore.msg(
+                IECore.Msg.Level.Warning,
+                "DeadlineListCache",
+                "Could not save cache \"{}\" : {}".format(self.__path, e)
+            )
@@ -34,24 +34,276 @@
 #
 ##########################################################################
 
+import os
+import time
+import random
+import functools
+import importlib
+import threading
+import contextlib
+import concurrent.futures
+
 import IECore
 
-try:
-    from ayon_core.settings import get_project_settings
-    from ayon_core.pipeline import registered_host
-    from ayon_deadline.abstract_submit_deadline import (
-        requests_post,
-        requests_get
-    )
-    AYON_MODE = True
-except Exception as err:
-    print("Could not import ayon_core stuff", err)
-    AYON_MODE = False
-    raise RuntimeError(f"Could not import ayon modules.")
+from .DispatchTrace import DispatchTrace
+from .DryRunTransport import DryRunTransport
+
+# The functions GafferDeadline re-exports. Everything else is reached
+# through `GafferDeadline.DeadlineTools`.
+__all__ = [
+    "inject_ayon_settings",
+    "fetch_ayon_settings",
+    "getSession",
+    "getTransport",
+    "setTransport",
+    "transportScope",
+    "bindTransport",
+    "getWebServiceSettings",
+    "getWebServiceUrl",
+    "getProjectSettings",
+    "invalidateSettings",
+    "submissionToken",
+    "submitJob",
+    "submitJobs",
+    "getMachineList",
+    "getLimitGroups",
+    "getGroups",
+    "getPools",
+    "getJobs",
+    "getJobTasks",
+    "getSubmittedJobs",
+    "findSubmittedJobs",
+]
+
+# `requests` and the AYON modules are only imported when they are first
+# needed, so importing GafferDeadline stays cheap for every Gaffer session
+# and `gaffer execute` on the farm works without AYON.
+
+
+def _ayonModule(name):
+    try:
+        return importlib.import_module(name)
+    except ImportError as e:
+        raise RuntimeError("Could not import ayon modules : {}".format(e))
+
+
+def get_project_settings(project_name):
+    return _ayonModule("ayon_core.settings").get_project_settings(project_name)
+
+
+def registered_host():
+    return _ayonModule("ayon_core.pipeline").registered_host()
 
 
 DEADLINE_SETTINGS = None
 
+# Maximum number of jobs submitted to the Web Service at the same time.
+SUBMISSION_THREADS = int(os.environ.get("GAFFERDEADLINE_SUBMISSION_THREADS", 8))
+
+# Submit independent jobs with a single request to the Web Service. Not every
+# Web Service accepts multiple jobs per request, so this is opt-in and
+# `submitJobs()` falls back to posting each job when it is refused.
+BATCH_SUBMISSION = os.environ.get("GAFFERDEADLINE_BATCH_SUBMISSION", "0") == "1"
+
+# Number of times a request is retried after a connection error, a timeout or
+# a response saying the Web Service is temporarily unavailable. Retries back
+# off exponentially from RETRY_DELAY seconds.
+REQUEST_RETRIES = int(os.environ.get("GAFFERDEADLINE_REQUEST_RETRIES", 4))
+RETRY_DELAY = float(os.environ.get("GAFFERDEADLINE_RETRY_DELAY", 0.5))
+
+_transientStatusCodes = (429, 502, 503, 504)
+
+# ExtraInfo key holding the `<dispatchToken>:<payloadHash>` of submitted jobs,
+# see `getSubmittedJobs()`.
+SUBMISSION_TOKEN_KEY = "GafferDeadlineSubmission"
+
+# The `Stat` of failed jobs in the Web Service's job dictionaries.
+_failedStatus = 4
+
+_session = None
+_sessionLock = threading.Lock()
+
+
+def getSession():
+    """Return the `requests.Session` shared by all Web Service calls so
+    connections are kept alive and reused, including across submission
+    threads.
+
+    """
+    global _session
+    with _sessionLock:
+        if _session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_maxsize=SUBMISSION_THREADS)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+    return _session
+
+
+class _HTTPTransport(object):
+    """Sends requests to the Web Service using the shared session."""
+
+    isDryRun = False
+    requiresSettings = True
+
+    def request(self, method, url, **kwargs):
+        return getSession().request(method, url, **kwargs)
+
+
+_httpTransport = _HTTPTransport()
+
+# Setting GAFFERDEADLINE_DRY_RUN to a directory sends every request to a
+# DryRunTransport writing the job payloads there, so nothing reaches the farm.
+if os.environ.get("GAFFERDEADLINE_DRY_RUN"):
+    _transport = DryRunTransport(os.environ["GAFFERDEADLINE_DRY_RUN"])
+else:
+    _transport = _httpTransport
+
+# Passed to the tool functions when the transport doesn't talk to a real
+# Web Service, so no AYON settings are needed.
+_offlineSettings = {"auth": None, "verify": True, "url": ""}
+
+
+# Transports set by `transportScope()` for the current thread only.
+_threadTransport = threading.local()
+
+
+def getTransport():
+    """Return the transport Web Service requests are sent through, the one
+    of the innermost `transportScope()` of this thread if there is one.
+
+    """
+    transport = getattr(_threadTransport, "transport", None)
+    return transport if transport is not None else _transport
+
+
+def setTransport(transport=None):
+    """Send all Web Service requests through `transport`, an object with a
+    `request(method, url, **kwargs)` method returning a response like
+    `requests.Response` does. None restores the HTTP transport. Returns
+    the previous transport so it can be restored.
+
+    Transports also have an `isDryRun` attribute, True if requests never
+    reach a farm, and a `requiresSettings` attribute, False if the AYON
+    Web Service settings aren't needed. See DryRunTransport.
+
+    """
+    global _transport
+    previous = _transport
+    _transport = transport if transport is not None else _httpTransport
+    return previous
+
+
+@contextlib.contextmanager
+def transportScope(transport):
+    """Send the Web Service requests made by this thread through
+    `transport` until the scope exits, leaving every other thread with its
+    own transport. Use `bindTransport()` to carry the transport over to
+    work done on other threads.
+
+    """
+    previous = getattr(_threadTransport, "transport", None)
+    _threadTransport.transport = transport
+    try:
+        yield transport
+    finally:
+        _threadTransport.transport = previous
+
+
+def bindTransport(function):
+    """Return `function` wrapped to send its requests through the current
+    thread's transport, whichever thread it is called on.
+
+    """
+    transport = getattr(_threadTransport, "transport", None)
+    if transport is None:
+        return function
+
+    @functools.wraps(function)
+    def boundFunction(*args, **kwargs):
+        with transportScope(transport):
+            return function(*args, **kwargs)
+
+    return boundFunction
+
+
+def _request(method, endpoint, dl_settings, beforeRetry=None, **kwargs):
+    """Send a request to the Web Service endpoint `api/<endpoint>`,
+    recording how long it took in the active DispatchTrace.
+
+    Connection errors, timeouts and transient error responses are retried
+    up to REQUEST_RETRIES times with exponential backoff. Requests that
+    aren't safe to send twice pass a `beforeRetry(failedAt)` function,
+    which is called before each retry with the `time.monotonic()` the
+    failed attempt ended at. If it returns True the request is known to
+    have succeeded, so it isn't sent again and None is returned. Errors
+    raised by `beforeRetry()` are logged and the request is retried.
+
+    """
+    import requests
+
+    url = "{}/api/{}".format(dl_settings["url"], endpoint)
+    name = "{} /api/{}".format(method, endpoint)
+
+    attempt = 0
+    while True:
+        try:
+            with DispatchTrace.scope(name, "http", attempt=attempt) as scope:
+                response = getTransport().request(method,
+                                                  url,
+                                                  auth=dl_settings["auth"],
+                                                  verify=dl_settings["verify"],
+                                                  **kwargs)
+                scope.setArg("status", response.status_code)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt >= REQUEST_RETRIES:
+                raise
+            reason = str(e)
+        else:
+            if (
+                response.status_code not in _transientStatusCodes or
+                attempt >= REQUEST_RETRIES
+            ):
+                return response
+            reason = "HTTP {}".format(response.status_code)
+
+        failedAt = time.monotonic()
+        attempt += 1
+        delay = RETRY_DELAY * (2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+        IECore.msg(
+            IECore.Msg.Level.Debug,
+            "DeadlineTools",
+            "{} failed ({}), retrying in {:.2f}s".format(name, reason, delay)
+        )
+        DispatchTrace.instant("retry", "http", request=name, attempt=attempt,
+                              reason=reason, delay=delay)
+        time.sleep(delay)
+
+        if beforeRetry is None:
+            continue
+        try:
+            if beforeRetry(failedAt):
+                return None
+        except Exception as e:
+            IECore.msg(
+                IECore.Msg.Level.Warning,
+                "DeadlineTools",
+                "Could not check whether {} succeeded, retrying : {}".format(name, e)
+            )
+
+
+# How long resolved AYON settings are reused before being fetched again.
+SETTINGS_TTL = float(os.environ.get("GAFFERDEADLINE_SETTINGS_TTL", 300))
+
+_settingsExpiry = None
+_projectSettingsCache = {}
+_webServiceSettings = (None, None)
+_settingsLock = threading.RLock()
+
 
 def inject_ayon_settings(func):
     '''This decorator makes sure tht the DEADLINE_SETTINGS variable is set to
@@ -60,45 +312,145 @@ def inject_ayon_settings(func):
     '''
 
     def ayon_settings_check(*args, **kwargs):
-        if DEADLINE_SETTINGS is None:
-            fetch_ayon_settings()
-        # now we have populated settings.
-        ws_settings = DEADLINE_SETTINGS["deadline_urls"][0]
-        auth = (ws_settings["default_username"],
-                ws_settings["default_password"])
-        verify = not ws_settings["not_verify_ssl"]
-        url = ws_settings["value"]
-
-        deadline_settings = {
-            "auth": auth,
-            "verify": verify,
-            "url": url
-        }
-        return func(*args, deadline_settings, **kwargs)
+        if not getTransport().requiresSettings:
+            return func(*args, _offlineSettings, **kwargs)
+        return func(*args, getWebServiceSettings(), **kwargs)
 
     return ayon_settings_check
 
 
+def getWebServiceSettings():
+    """Return the `auth`, `verify` and `url` used to talk to the Web Service.
+
+    These are only derived again when DEADLINE_SETTINGS changes, so
+    repeated submissions and list fetches don't pay for it.
+
+    """
+    global _webServiceSettings
+    with _settingsLock:
+        if DEADLINE_SETTINGS is None or (
+            _settingsExpiry is not None and time.monotonic() > _settingsExpiry
+        ):
+            fetch_ayon_settings()
+
+        if _webServiceSettings[0] is not DEADLINE_SETTINGS:
+            # now we have populated settings.
+            ws_settings = DEADLINE_SETTINGS["deadline_urls"][0]
+            auth = (ws_settings["default_username"],
+                    ws_settings["default_password"])
+            verify = not ws_settings["not_verify_ssl"]
+            url = ws_settings["value"]
+
+            _webServiceSettings = (
+                DEADLINE_SETTINGS,
+                {
+                    "auth": auth,
+                    "verify": verify,
+                    "url": url
+                }
+            )
+
+        return _webServiceSettings[1]
+
+
+def getWebServiceUrl():
+    """Return the URL of the Web Service requests are sent to, which is
+    empty when the transport doesn't need the Web Service settings.
+
+    """
+    if not getTransport().requiresSettings:
+        return _offlineSettings["url"]
+    return getWebServiceSettings()["url"]
+
+
+def getProjectSettings(project_name=None):
+    """Return the AYON project settings, reusing them for `SETTINGS_TTL`
+    seconds.
+
+    """
+    with _settingsLock:
+        if project_name is None:
+            project_name = registered_host().get_current_project_name()
+
+        expiry, settings = _projectSettingsCache.get(project_name, (0, None))
+        if settings is None or time.monotonic() > expiry:
+            settings = get_project_settings(project_name)
+            _projectSettingsCache[project_name] = (
+                time.monotonic() + SETTINGS_TTL,
+                settings
+            )
+
+        return settings
+
+
+def invalidateSettings():
+    """Forget all cached settings so they are fetched again on next use."""
+    global DEADLINE_SETTINGS, _settingsExpiry, _webServiceSettings
+    with _settingsLock:
+        DEADLINE_SETTINGS = None
+        _settingsExpiry = None
+        _webServiceSettings = (None, None)
+        _projectSettingsCache.clear()
+
+
 def fetch_ayon_settings():
-    global DEADLINE_SETTINGS
-    host = registered_host()
-    ayon_settings = get_project_settings(
-        host.get_current_project_name())
+    global DEADLINE_SETTINGS, _settingsExpiry
+    ayon_settings = getProjectSettings()
     try:
         DEADLINE_SETTINGS = ayon_settings["deadline"]
     except KeyError:
         print(f"NO deadline settings found!")
         raise RuntimeError
+    _settingsExpiry = time.monotonic() + SETTINGS_TTL
+
+
+def submissionToken(payload):
+    """Return the `<dispatchToken>:<payloadHash>` token stored in the
+    ExtraInfo of a job payload, or None if it doesn't have one.
+
+    """
+    prefix = SUBMISSION_TOKEN_KEY + "="
+    for key, value in payload["JobInfo"].items():
+        if (
+            key.startswith("ExtraInfoKeyValue") and
+            isinstance(value, str) and
+            value.startswith(prefix)
+        ):
+            return value[len(prefix):]
+
+    return None
 
 
 @inject_ayon_settings
 def submitJob(payload, dl_settings):
-    deadline_url = "{}/api/jobs".format(dl_settings["url"])
-    response = requests_post(deadline_url,
-                             json=payload,
-                             timeout=10,
-                             auth=dl_settings["auth"],
-                             verify=dl_settings["verify"])
+    """Submit a job, returning `(jobId, result)` with `jobId` set to None
+    if the job was refused.
+
+    Jobs with a submission token are only submitted once, even when the
+    request has to be retried after the Web Service created the job but
+    the response didn't arrive.
+
+    """
+    token = submissionToken(payload)
+    submittedJobs = []
+
+    def alreadySubmitted(failedAt):
+        dispatchToken, payloadHash = token.split(":", 1)
+        job = findSubmittedJobs(dispatchToken, failedAt).get(payloadHash)
+        if job is not None:
+            submittedJobs.append(job)
+        return job is not None
+
+    response = _request("POST",
+                        "jobs",
+                        dl_settings,
+                        beforeRetry=alreadySubmitted if token else None,
+                        json=payload,
+                        timeout=10)
+
+    if response is None:
+        DispatchTrace.instant("alreadySubmitted", "http", jobId=submittedJobs[0]["_id"])
+        return (submittedJobs[0]["_id"], submittedJobs[0])
 
     if not response.ok:
         return (None, response.json())
@@ -107,13 +459,81 @@ def submitJob(payload, dl_settings):
     return (results["_id"], results)
 
 
+@inject_ayon_settings
+def submitJobs(payloads, dl_settings):
+    """Submit several independent jobs in one request.
+
+    Returns a list of `(jobId, result)` tuples in the same order as
+    `payloads`, with `jobId` set to None for jobs that failed. If the
+    Web Service doesn't accept the batched request, each job is posted
+    on its own instead.
+
+    """
+    if not payloads:
+        return []
+
+    tokens = [submissionToken(p) for p in payloads]
+    submittedJobs = {}
+
+    def anySubmitted(failedAt):
+        # If any of the jobs were created, submitting the batch again would
+        # duplicate them, so the remaining jobs are submitted one at a time.
+        for dispatchToken in set(t.split(":", 1)[0] for t in tokens if t):
+            for payloadHash, job in findSubmittedJobs(dispatchToken, failedAt).items():
+                submittedJobs["{}:{}".format(dispatchToken, payloadHash)] = job
+        return any(t in submittedJobs for t in tokens)
+
+    response = _request("POST",
+                        "jobs",
+                        dl_settings,
+                        beforeRetry=anySubmitted if any(tokens) else None,
+                        json={"Jobs": payloads},
+                        timeout=10)
+
+    if response is None:
+        return [
+            (submittedJobs[t]["_id"], submittedJobs[t]) if t in submittedJobs
+            else submitJob(p)
+            for t, p in zip(tokens, payloads)
+        ]
+
+    results = None
+    if response.ok:
+        try:
+            results = response.json()
+        except ValueError:
+            results = None
+
+    if (
+        not isinstance(results, list) or
+        len(results) != len(payloads) or
+        not all(isinstance(r, dict) for r in results)
+    ):
+        IECore.msg(
+            IECore.Msg.Level.Debug,
+            "DeadlineTools",
+            "Batched submission not accepted, submitting jobs one at a time."
+        )
+        DispatchTrace.instant("batchedSubmissionRefused", "http", jobs=len(payloads))
+        return _submitJobsIndividually(payloads)
+
+    return [(r.get("_id"), r) for r in results]
+
+
+def _submitJobsIndividually(payloads):
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=max(1, min(len(payloads), SUBMISSION_THREADS))
+    ) as executor:
+        return list(executor.map(bindTransport(submitJob), payloads))
+
+
 @inject_ayon_settings
 def getMachineList(dl_settings):
-    deadline_url = "{}/api/slaves".format(dl_settings["url"])
-    response = requests_get(deadline_url,
-                            params={"NamesOnly": True},
-                            auth=dl_settings["auth"],
-                            verify=dl_settings["verify"])
+    response = _request("GET",
+                        "slaves",
+                        dl_settings,
+                        params={"NamesOnly": True},
+                        timeout=10)
     if not response.ok:
         raise RuntimeError(f"Error fetching machine list {response.text}")
     return response.json()
@@ -121,35 +541,164 @@ def getMachineList(dl_settings):
 
 @inject_ayon_settings
 def getLimitGroups(dl_settings):
-    deadline_url = "{}/api/limitgroups".format(dl_settings["url"])
-    response = requests_get(deadline_url,
-                            params={"NamesOnly": True},
-                            auth=dl_settings["auth"],
-                            verify=dl_settings["verify"])
+    response = _request("GET",
+                        "limitgroups",
+                        dl_settings,
+                        params={"NamesOnly": True},
+                        timeout=10)
     if not response.ok:
-        raise RuntimeError(f"Error fetching machine list {response.text}")
+        raise RuntimeError(f"Error fetching limit groups {response.text}")
     return response.json()
 
 
 @inject_ayon_settings
 def getGroups(dl_settings):
-    deadline_url = "{}/api/groups".format(dl_settings["url"])
-    response = requests_get(deadline_url,
-                            params={"NamesOnly": True},
-                            auth=dl_settings["auth"],
-                            verify=dl_settings["verify"])
+    response = _request("GET",
+                        "groups",
+                        dl_settings,
+                        params={"NamesOnly": True},
+                        timeout=10)
     if not response.ok:
-        raise RuntimeError(f"Error fetching machine list {response.text}")
+        raise RuntimeError(f"Error fetching groups {response.text}")
     return response.json()
 
 
 @inject_ayon_settings
 def getPools(dl_settings):
-    deadline_url = "{}/api/pools".format(dl_settings["url"])
-    response = requests_get(deadline_url,
-                            params={"NamesOnly": True},
-                            auth=dl_settings["auth"],
-                            verify=dl_settings["verify"])
+    response = _request("GET",
+                        "pools",
+                        dl_settings,
+                        params={"NamesOnly": True},
+                        timeout=10)
     if not response.ok:
-        raise RuntimeError(f"Error fetching machine list {response.text}")
+        raise RuntimeError(f"Error fetching pools {response.text}")
     return response.json()
+
+
+@inject_ayon_settings
+def getJobs(jobIds, dl_settings):
+    """Return a dictionary of the jobs that still exist in Deadline, keyed
+    by job ID. Deleted jobs are missing from the result.
+
+    """
+    if not jobIds:
+        return {}
+
+    response = _request("GET",
+                        "jobs",
+                        dl_settings,
+                        params={"JobID": ",".join(jobIds)},
+                        timeout=10)
+    if not response.ok:
+        raise RuntimeError(f"Error fetching jobs {response.text}")
+
+    return {job["_id"]: job for job in response.json() or []}
+
+
+@inject_ayon_settings
+def getJobTasks(jobId, dl_settings):
+    """Return the list of task dictionaries for a Deadline job."""
+    response = _request("GET",
+                        "tasks",
+                        dl_settings,
+                        params={"JobID": jobId},
+                        timeout=10)
+    if not response.ok:
+        raise RuntimeError(f"Error fetching tasks {response.text}")
+
+    tasks = response.json() or []
+    # Depending on the Deadline version the tasks are wrapped with the job ID
+    if isinstance(tasks, dict):
+        tasks = tasks.get("Tasks", [])
+
+    return tasks
+
+
+@inject_ayon_settings
+def getSubmittedJobs(dispatchToken, dl_settings, jobIds=None):
+    """Return the jobs submitted with `dispatchToken`, keyed by the hash of
+    their payload. Failed jobs are left out.
+
+    The Web Service can't filter jobs by their ExtraInfo, so without
+    `jobIds` every job that hasn't failed is fetched. When the IDs of the
+    jobs are known, only those are fetched.
+
+    """
+    if jobIds is not None:
+        if not jobIds:
+            return {}
+        params = {"JobID": ",".join(jobIds)}
+    else:
+        params = {"States": "Active,Suspended,Pending,Completed"}
+
+    response = _request("GET",
+                        "jobs",
+                        dl_settings,
+                        params=params,
+                        timeout=30)
+    if not response.ok:
+        raise RuntimeError(f"Error fetching jobs {response.text}")
+
+    prefix = dispatchToken + ":"
+    submittedJobs = {}
+    for job in response.json() or []:
+        extraInfo = job.get("Props", {}).get("ExDic") or {}
+        token = extraInfo.get(SUBMISSION_TOKEN_KEY, "")
+        if token.startswith(prefix) and job.get("Stat") != _failedStatus:
+            submittedJobs[token[len(prefix):]] = job
+
+    return submittedJobs
+
+# The most recent `getSubmittedJobs()` lookup for each dispatch token, see
+# `findSubmittedJobs()`. Finished lookups are dropped after
+# `_submittedJobsLookupLifetime` seconds, long after the retries that could
+# share them have given up.
+_submittedJobsLookups = {}
+_submittedJobsCondition = threading.Condition()
+_submittedJobsLookupLifetime = 60.0
+
+
+def findSubmittedJobs(dispatchToken, since=None):
+    """Return `getSubmittedJobs(dispatchToken)` as it was at some point
+    after `since`, a `time.monotonic()` time, defaulting to now.
+
+    A lookup started after `since` is shared instead of fetching the jobs
+    again, so when the submissions of a wave all fail together, their
+    retries are checked with a single request rather than one per job.
+
+    """
+    if since is None:
+        since = time.monotonic()
+
+    with _submittedJobsCondition:
+        while True:
+            lookup = _submittedJobsLookups.get(dispatchToken)
+            if lookup is None or (lookup["done"] and lookup["started"] < since):
+                break
+            if lookup["done"]:
+                if lookup["error"] is not None:
+                    raise lookup["error"]
+                return lookup["jobs"]
+            # A lookup is in flight. If it started too early for us we
+            # still wait for it, then start our own.
+            _submittedJobsCondition.wait()
+
+        now = time.monotonic()
+        for token, oldLookup in list(_submittedJobsLookups.items()):
+            if oldLookup["done"] and now - oldLookup["started"] > _submittedJobsLookupLifetime:
+                del _submittedJobsLookups[token]
+
+        lookup = {"started": now, "done": False, "jobs": None, "error": None}
+        _submittedJobsLookups[dispatchToken] = lookup
+
+    try:
+        lookup["jobs"] = getSubmittedJobs(dispatchToken)
+    except Exception as e:
+        lookup["error"] = e
+        raise
+    finally:
+        with _submittedJobsCondition:
+            lookup["done"] = True
+            _submittedJobsCondition.notify_all()
+
+    return lookup["jobs"]
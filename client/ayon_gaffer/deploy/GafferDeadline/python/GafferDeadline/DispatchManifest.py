@@ -0,0 +1,98 @@
+##########################################################################
+#
+#  Copyright (c) 2019, Hypothetical Inc. All rights reserved.
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#      * Redistributions of source code must retain the above
+#        copyright notice, this list of conditions and the following
+#        disclaimer.
+#
+#      * Redistributions in binary form must reproduce the above
+#        copyright notice, this list of conditions and the following
+#        disclaimer in the documentation and/or other materials provided with
+#        the distribution.
+#
+#      * Neither the name of Hypothetical Inc. nor the names of
+#        any other contributors to this software may be used to endorse or
+#        promote products derived from this software without specific prior
+#        written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+#  IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+#  THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+#  PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+#  CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+#  EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+#  PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+#  PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+#  LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+#  NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+#  SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+##########################################################################
+
+import os
+import json
+
+import IECore
+
+
+class DispatchManifest(object):
+    """ Records the submission hash and Deadline job ID of each job dispatched from a script,
+    so a later dispatch can reuse jobs that haven't changed instead of submitting them again.
+    The manifest is a JSON file kept alongside the per-dispatch job directories.
+    """
+
+    fileName = "deadlineDispatchManifest.json"
+
+    __version = 1
+
+    def __init__(self, directory):
+        self.__path = os.path.join(directory, self.fileName)
+        self.__jobs = {}
+
+        if os.path.isfile(self.__path):
+            try:
+                with open(self.__path, "r") as f:
+                    data = json.load(f)
+                if data.get("version") == self.__version:
+                    self.__jobs = data.get("jobs", {})
+            except (IOError, ValueError) as e:
+                IECore.msg(
+                    IECore.Msg.Level.Warning,
+                    "DispatchManifest",
+                    "Ignoring unreadable manifest \"{}\" : {}".format(self.__path, e)
+                )
+
+    def path(self):
+        return self.__path
+
+    def jobID(self, key, submissionHash):
+        """ Returns the Deadline job ID recorded for `key`, or None if there isn't one or it was
+        submitted with a different hash.
+        """
+        entry = self.__jobs.get(key)
+        if entry is None or entry["hash"] != submissionHash:
+            return None
+
+        return entry["jobId"]
+
+    def addJob(self, key, submissionHash, jobId):
+        self.__jobs[key] = {"hash": submissionHash, "jobId": jobId}
+
+    def removeJob(self, key):
+        self.__jobs.pop(key, None)
+
+    def save(self):
+        directory = os.path.dirname(self.__path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        # Write to a temporary file first so an interrupted save doesn't lose the manifest
+        tempPath = self.__path + ".tmp"
+        with open(tempPath, "w") as f:
+            json.dump({"version": self.__version, "jobs": self.__jobs}, f, indent=4, sort_keys=True)
+        os.replace(tempPath, self.__path)
@@ -0,0 +1,113 @@
+##########################################################################
+#
+#  Copyright (c) 2019, Hypothetical Inc. All rights reserved.
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#      * Redistributions of source code must retain the above
+#        copyright notice, this list of conditions and the following
+#        disclaimer.
+#
+#      * Redistributions in binary form must reproduce the above
+#        copyright notice, this list of conditions and the following
+#        disclaimer in the documentation and/or other materials provided with
+#        the distribution.
+#
+#      * Neither the name of Hypothetical Inc. nor the names of
+#        any other contributors to this software may be used to endorse or
+#        promote products derived from this software without specific prior
+#        written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+#  IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+#  THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+#  PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+#  CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+#  EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+#  PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+#  PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+#  LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+#  NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+#  SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+##########################################################################
+
+import IECore
+
+from . import DeadlineTools
+
+
+class DispatchSettings(object):
+    """ Snapshot of the AYON settings used by a single dispatch. Settings are resolved once
+    when the snapshot is created and shared by every job in the dispatch rather than being
+    fetched again for each job.
+
+    Outside of AYON, or if the project has no Gaffer Deadline settings, the snapshot falls
+    back to propagating a fixed set of environment variables.
+    """
+
+    __defaultEnvironmentVariables = [
+        "ARNOLD_ROOT",
+        "GAFFER_EXTENSION_PATHS",
+    ]
+
+    def __init__(self):
+        self.__resolve()
+
+    def __resolve(self):
+        self._ayonMode = False
+        self._gafferSettings = {}
+
+        try:
+            ayonSettings = DeadlineTools.getProjectSettings()
+        except Exception as err:
+            IECore.msg(
+                IECore.Msg.Level.Debug,
+                "DispatchSettings",
+                "Could not get AYON settings : {}".format(err)
+            )
+            return
+
+        try:
+            self._gafferSettings = ayonSettings["gaffer"]["deadline"]
+            ayonSettings["deadline"]
+        except KeyError as err:
+            # ok we dont have either of these settings
+            IECore.msg(
+                IECore.Msg.Level.Warning,
+                "DispatchSettings",
+                "Error getting AYON settings {}".format(err)
+            )
+            return
+
+        self._ayonMode = True
+
+    def invalidate(self):
+        """ Drop the cached settings and resolve them again. """
+        DeadlineTools.invalidateSettings()
+        self.__resolve()
+
+    def ayonMode(self):
+        return self._ayonMode
+
+    def gafferSettings(self):
+        return self._gafferSettings
+
+    def environmentVariables(self):
+        """ Returns a tuple of the environment variable names to be propagated from the
+        current environment and a dictionary of extra variables with fixed values.
+        """
+        if not self._ayonMode:
+            return (list(self.__defaultEnvironmentVariables), {})
+
+        varsToSubmit = []
+        extraVars = {}
+        for ev in self._gafferSettings["env_vars"]:
+            if ev["use_env_value"]:
+                varsToSubmit.append(ev["name"])
+            else:
+                extraVars[ev["name"]] = ev["value"]
+
+        return (varsToSubmit, extraVars)
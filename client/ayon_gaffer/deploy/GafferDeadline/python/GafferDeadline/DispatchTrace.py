@@ -0,0 +1,224 @@
+##########################################################################
+#
+#  Copyright (c) 2019, Hypothetical Inc. All rights reserved.
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#      * Redistributions of source code must retain the above
+#        copyright notice, this list of conditions and the following
+#        disclaimer.
+#
+#      * Redistributions in binary form must reproduce the above
+#        copyright notice, this list of conditions and the following
+#        disclaimer in the documentation and/or other materials provided with
+#        the distribution.
+#
+#      * Neither the name of Hypothetical Inc. nor the names of
+#        any other contributors to this software may be used to endorse or
+#        promote products derived from this software without specific prior
+#        written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+#  IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+#  THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+#  PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+#  CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+#  EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+#  PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+#  PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+#  LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+#  NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+#  SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+##########################################################################
+
+import os
+import json
+import time
+import threading
+
+
+class _Scope(object):
+
+    __slots__ = ("__trace", "__event", "__start")
+
+    def __init__(self, trace, name, category, args):
+        self.__trace = trace
+        self.__event = {"name": name, "cat": category, "args": args}
+
+    def setArg(self, name, value):
+        self.__event["args"][name] = value
+
+    def __enter__(self):
+        self.__start = time.perf_counter()
+        return self
+
+    def __exit__(self, exceptionType, exception, traceback):
+        end = time.perf_counter()
+        if exceptionType is not None:
+            self.__event["args"]["error"] = "{}: {}".format(exceptionType.__name__, exception)
+        self.__trace._addEvent(self.__event, self.__start, end)
+
+
+class _NullScope(object):
+
+    __slots__ = ()
+
+    def setArg(self, name, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exceptionType, exception, traceback):
+        pass
+
+
+_nullScope = _NullScope()
+
+
+class DispatchTrace(object):
+    """ Records how long the stages of a dispatch take, including every request sent to the
+    Deadline Web Service. Traces are only made when the `GAFFERDEADLINE_TRACE` environment
+    variable is set to "json" or "chrome", and otherwise `scope()` returns a shared scope that
+    does nothing. The "chrome" format can be loaded into `chrome://tracing` or Perfetto.
+
+    Code being traced doesn't need a reference to the trace, it uses the classmethods which
+    record into the active trace.
+    """
+
+    fileName = "deadlineDispatchTrace.json"
+    formats = ("json", "chrome")
+
+    __active = None
+
+    def __init__(self, name="dispatch"):
+        self.__name = name
+        self.__origin = time.perf_counter()
+        self.__events = []
+        self.__lock = threading.Lock()
+
+    @staticmethod
+    def traceFormat():
+        """ Returns the format traces are saved in, or None if tracing is disabled. """
+        traceFormat = os.environ.get("GAFFERDEADLINE_TRACE", "").lower()
+        return traceFormat if traceFormat in DispatchTrace.formats else None
+
+    @classmethod
+    def active(cls):
+        return cls.__active
+
+    @classmethod
+    def begin(cls, name="dispatch"):
+        """ Starts a new trace and makes it active, or returns None if tracing is disabled. """
+        if cls.traceFormat() is None:
+            return None
+
+        cls.__active = DispatchTrace(name)
+        return cls.__active
+
+    @classmethod
+    def end(cls, trace):
+        """ Stops `trace` being the active trace. """
+        if trace is not None and cls.__active is trace:
+            cls.__active = None
+
+    @classmethod
+    def scope(cls, name, category="dispatch", **args):
+        """ Returns a context manager timing the code it wraps in the active trace. Any
+        keyword arguments are stored with the event, and more can be added to it with
+        `setArg()`.
+        """
+        trace = cls.__active
+        if trace is None:
+            return _nullScope
+
+        return _Scope(trace, name, category, args)
+
+    @classmethod
+    def instant(cls, name, category="dispatch", **args):
+        """ Records an event without a duration in the active trace. """
+        trace = cls.__active
+        if trace is not None:
+            now = time.perf_counter()
+            trace._addEvent(
+                {"name": name, "cat": category, "args": args, "instant": True},
+                now,
+                now
+            )
+
+    def _addEvent(self, event, start, end):
+        event["start"] = start - self.__origin
+        event["duration"] = end - start
+        event["thread"] = threading.get_ident()
+        with self.__lock:
+            self.__events.append(event)
+
+    def events(self):
+        """ Returns the recorded events ordered by start time. Times are in seconds from the
+        start of the trace.
+        """
+        with self.__lock:
+            return sorted(self.__events, key=lambda e: e["start"])
+
+    def summary(self):
+        """ Returns the count, total and maximum duration of the events, keyed by event name. """
+        summary = {}
+        for event in self.events():
+            entry = summary.setdefault(event["name"], {"count": 0, "total": 0.0, "max": 0.0})
+            entry["count"] += 1
+            entry["total"] += event["duration"]
+            entry["max"] = max(entry["max"], event["duration"])
+
+        return summary
+
+    def toJSON(self):
+        return {"name": self.__name, "events": self.events(), "summary": self.summary()}
+
+    def toChromeTrace(self):
+        """ Returns the events in the Trace Event Format used by `chrome://tracing`. """
+        threadIds = {}
+        traceEvents = []
+        for event in self.events():
+            chromeEvent = {
+                "name": event["name"],
+                "cat": event["cat"],
+                "ph": "i" if event.get("instant") else "X",
+                "ts": event["start"] * 1e6,
+                "pid": os.getpid(),
+                "tid": threadIds.setdefault(event["thread"], len(threadIds)),
+                "args": event["args"],
+            }
+            if chromeEvent["ph"] == "X":
+                chromeEvent["dur"] = event["duration"] * 1e6
+            else:
+                chromeEvent["s"] = "t"
+            traceEvents.append(chromeEvent)
+
+        return {
+            "traceEvents": traceEvents,
+            "displayTimeUnit": "ms",
+            "otherData": {"name": self.__name},
+        }
+
+    def save(self, path, traceFormat=None):
+        """ Writes the trace to `path` in `traceFormat`, which defaults to the format from the
+        environment.
+        """
+        traceFormat = traceFormat or self.traceFormat() or "json"
+        if traceFormat not in self.formats:
+            raise ValueError("Unknown trace format \"{}\"".format(traceFormat))
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        with open(path, "w") as f:
+            json.dump(
+                self.toChromeTrace() if traceFormat == "chrome" else self.toJSON(),
+                f,
+                indent=4,
+                default=str
+            )
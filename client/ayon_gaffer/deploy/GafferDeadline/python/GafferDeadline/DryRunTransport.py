@@ -0,0 +1,154 @@
+##########################################################################
+#
+#  Copyright (c) 2019, Hypothetical Inc. All rights reserved.
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#      * Redistributions of source code must retain the above
+#        copyright notice, this list of conditions and the following
+#        disclaimer.
+#
+#      * Redistributions in binary form must reproduce the above
+#        copyright notice, this list of conditions and the following
+#        disclaimer in the documentation and/or other materials provided with
+#        the distribution.
+#
+#      * Neither the name of Hypothetical Inc. nor the names of
+#        any other contributors to this software may be used to endorse or
+#        promote products derived from this software without specific prior
+#        written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+#  IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+#  THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+#  PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+#  CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+#  EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+#  PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+#  PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+#  LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+#  NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+#  SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+##########################################################################
+
+import os
+import json
+import threading
+import urllib.parse
+
+
+class DryRunResponse(object):
+    """ The parts of a `requests.Response` that DeadlineTools uses. """
+
+    def __init__(self, statusCode, data):
+        self.status_code = statusCode
+        self.ok = statusCode < 400
+        self.__data = data
+
+    def json(self):
+        return self.__data
+
+    @property
+    def text(self):
+        return json.dumps(self.__data)
+
+
+class DryRunTransport(object):
+    """ Stands in for the Deadline Web Service so jobs can be dispatched without a farm.
+    Submitted jobs are given synthetic IDs, kept in memory so they can be queried like real
+    jobs, and their payloads are written to `directory` if one is given. Lists of pools,
+    groups, limits and Workers are always empty.
+
+    Use it with `DeadlineTools.setTransport()`, or `DeadlineTools.transportScope()` to only
+    redirect the requests of one thread.
+    """
+
+    isDryRun = True
+    requiresSettings = False
+
+    # Deadline's job status values, by the names used in the `States` parameter
+    jobStatus = {"Active": 1, "Suspended": 2, "Completed": 3, "Failed": 4, "Pending": 6}
+
+    def __init__(self, directory=None):
+        self.__directory = directory
+        self.__jobs = {}
+        self.__jobCounter = 0
+        self.__lock = threading.Lock()
+
+    def directory(self):
+        return self.__directory
+
+    def jobs(self):
+        """ Returns the submitted jobs, in the order they were submitted. """
+        with self.__lock:
+            return list(self.__jobs.values())
+
+    def request(self, method, url, params=None, **kwargs):
+        """ Answer a request for `url` in the same way as the Web Service. """
+        endpoint = urllib.parse.urlparse(url).path.rpartition("/api/")[2].strip("/")
+        statusCode, data = self.handle(method.upper(), endpoint, params or {}, kwargs.get("json"))
+        return DryRunResponse(statusCode, data)
+
+    def handle(self, method, endpoint, params, body):
+        """ Returns the `(statusCode, data)` of the response to a request for the Web
+        Service endpoint `/api/<endpoint>`.
+        """
+        if endpoint == "jobs" and method == "POST":
+            if not isinstance(body, dict):
+                return (400, {"error": "Expected a JSON object"})
+            if "Jobs" in body:
+                return (200, [self.__addJob(payload) for payload in body["Jobs"]])
+            return (200, self.__addJob(body))
+
+        if endpoint == "jobs" and method == "GET":
+            jobs = self.jobs()
+            if params.get("JobID"):
+                jobIds = set(params["JobID"].split(","))
+                jobs = [j for j in jobs if j["_id"] in jobIds]
+            if params.get("States"):
+                states = set(self.jobStatus.get(s) for s in params["States"].split(","))
+                jobs = [j for j in jobs if j["Stat"] in states]
+            return (200, jobs)
+
+        if endpoint == "tasks" and method == "GET":
+            return (200, [])
+
+        if endpoint in ("pools", "groups", "limitgroups", "slaves") and method == "GET":
+            return (200, [])
+
+        return (404, {"error": "Unsupported request {} /api/{}".format(method, endpoint)})
+
+    def __addJob(self, payload):
+        if "JobInfo" not in payload:
+            return {"error": "JobInfo is required"}
+
+        jobInfo = payload["JobInfo"]
+        with self.__lock:
+            self.__jobCounter += 1
+            jobId = "dryrun{:06d}".format(self.__jobCounter)
+            job = {
+                "_id": jobId,
+                "Stat": self.jobStatus[
+                    "Suspended" if jobInfo.get("InitialStatus") == "Suspended" else "Active"
+                ],
+                "Props": dict(
+                    jobInfo,
+                    ExDic=dict(
+                        str(v).split("=", 1) for k, v in jobInfo.items()
+                        if k.startswith("ExtraInfoKeyValue") and "=" in str(v)
+                    ),
+                ),
+                "PluginInfo": payload.get("PluginInfo", {}),
+            }
+            self.__jobs[jobId] = job
+
+        if self.__directory is not None:
+            if not os.path.isdir(self.__directory):
+                os.makedirs(self.__directory, exist_ok=True)
+            with open(os.path.join(self.__directory, jobId + ".json"), "w") as f:
+                json.dump(payload, f, indent=4, sort_keys=True, default=str)
+
+        return job
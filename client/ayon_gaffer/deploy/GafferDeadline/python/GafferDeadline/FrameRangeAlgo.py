@@ -0,0 +1,238 @@
+##########################################################################
+#
+#  Copyright (c) 2019, Hypothetical Inc. All rights reserved.
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#      * Redistributions of source code must retain the above
+#        copyright notice, this list of conditions and the following
+#        disclaimer.
+#
+#      * Redistributions in binary form must reproduce the above
+#        copyright notice, this list of conditions and the following
+#        disclaimer in the documentation and/or other materials provided with
+#        the distribution.
+#
+#      * Neither the name of Hypothetical Inc. nor the names of
+#        any other contributors to this software may be used to endorse or
+#        promote products derived from this software without specific prior
+#        written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+#  IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+#  THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+#  PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+#  CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+#  EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+#  PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+#  PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+#  LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+#  NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+#  SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+##########################################################################
+
+""" Helpers for working with inclusive frame ranges, stored as `(startFrame, endFrame)` tuples,
+and stepped frame runs, stored as `(startFrame, endFrame, step)` tuples.
+
+Frame coverage is computed by merging ranges rather than expanding them into lists of frames,
+so the cost depends on the number of Deadline tasks rather than the number of frames.
+"""
+
+
+def mergeRanges(ranges):
+    """ Returns a sorted list of non-overlapping ranges covering the same frames as `ranges`.
+    Adjacent ranges such as `(1, 5)` and `(6, 10)` are merged into `(1, 10)`.
+    """
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+
+    return merged
+
+
+def containsRanges(ranges, otherRanges):
+    """ Returns True if every frame in `otherRanges` is also in `ranges`. """
+    ranges = mergeRanges(ranges)
+    i = 0
+    for start, end in mergeRanges(otherRanges):
+        # Both lists are sorted, so ranges ending before this one can't cover later ones either
+        while i < len(ranges) and ranges[i][1] < start:
+            i += 1
+        if i == len(ranges) or ranges[i][0] > start or ranges[i][1] < end:
+            return False
+
+    return True
+
+
+def rangeOffset(upstreamRange, currentRange):
+    """ Returns the `(startOffset, endOffset)` needed to shift `currentRange` onto
+    `upstreamRange`.
+    """
+    return (upstreamRange[0] - currentRange[0], upstreamRange[1] - currentRange[1])
+
+
+def hasCommonOffset(rangePairs):
+    """ Returns True if every `(upstreamRange, currentRange)` pair in `rangePairs` has the
+    same offset, meaning Deadline can express the whole dependency as a single frame offset.
+    """
+    offset = None
+    for upstreamRange, currentRange in rangePairs:
+        pairOffset = rangeOffset(upstreamRange, currentRange)
+        if offset is None:
+            offset = pairOffset
+        elif pairOffset != offset:
+            return False
+
+    return True
+
+
+def compactFrames(frames, step=None):
+    """ Compacts a list of frames into `(startFrame, endFrame, step)` runs, keeping the frames
+    in ascending order. If `step` is given, only runs with that step are made and any other
+    frames become single frame runs with a step of 1. Otherwise a stepped run needs at least
+    three frames, so two frames that happen to be a few frames apart don't decide the step.
+    """
+    frames = sorted(set(frames))
+
+    runs = []
+    i = 0
+    while i < len(frames):
+        start = frames[i]
+        runStep = frames[i + 1] - start if i + 1 < len(frames) else None
+        if runStep is None or (step is not None and runStep != step):
+            runs.append((start, start, 1))
+            i += 1
+            continue
+
+        end = i + 1
+        while end + 1 < len(frames) and frames[end + 1] - frames[end] == runStep:
+            end += 1
+
+        if step is None and runStep != 1 and end == i + 1:
+            runs.append((start, start, 1))
+            i += 1
+            continue
+
+        runs.append((start, frames[end], runStep))
+        i = end + 1
+
+    return runs
+
+
+def frameCount(run):
+    """ Returns the number of frames in a `(startFrame, endFrame, step)` run. """
+    start, end, step = run
+    return int((end - start) // step) + 1
+
+
+def mergeRuns(runs, step=None, chunkSize=None):
+    """ Merges consecutive runs that continue each other with the same step, such as
+    `(1, 9, 2)` and `(11, 19, 2)`, which happens when a frame range is split into batches.
+    Runs are expected in ascending order. If `step` is given, runs are only merged with that
+    step, as Deadline renders every task of a job with the same step.
+
+    If `chunkSize` is given, the runs are Deadline tasks and a run is only merged into one
+    whose frame count is a multiple of `chunkSize`. Deadline then splits each merged run
+    back into the same tasks when it makes tasks of `chunkSize` frames.
+    """
+    merged = []
+    for start, end, runStep in runs:
+        if start == end and step is not None:
+            runStep = step
+        if merged:
+            lastStart, lastEnd, lastStep = merged[-1]
+            if lastStart == lastEnd:
+                lastStep = step or runStep
+            if start == end:
+                runStep = lastStep
+            if (
+                runStep == lastStep and start == lastEnd + runStep and
+                (step is None or runStep == step) and
+                (chunkSize is None or frameCount((lastStart, lastEnd, runStep)) % chunkSize == 0)
+            ):
+                merged[-1] = (lastStart, end, runStep)
+                continue
+        merged.append((start, end, runStep))
+
+    return merged
+
+
+def frameString(runs, step=None, chunkSize=None):
+    """ Returns a Deadline frame list string such as `1-10,20-100x2,150` for a list of
+    `(startFrame, endFrame, step)` runs. Runs that continue each other are merged as in
+    `mergeRuns()`.
+    """
+    parts = []
+    for start, end, runStep in mergeRuns(runs, step, chunkSize):
+        start = int(start)
+        end = int(end)
+        if start == end:
+            parts.append("{}".format(start))
+        elif runStep == 1:
+            parts.append("{}-{}".format(start, end))
+        else:
+            parts.append("{}-{}x{}".format(start, end, int(runStep)))
+
+    return ",".join(parts)
+
+
+def encodeTaskDependencies(upstreamTasks):
+    """ Encodes the task dependencies on a single upstream job as compact `(tasks, upstream)`
+    strings for `<tasks>:<jobId>=<upstream>` ExtraInfo entries. `upstreamTasks` maps task
+    numbers to the upstream task numbers they wait for. There are three forms :
+
+    - `t` = `u` : task `t` waits for upstream task `u`, the original one entry per task form.
+      `u` can also be a comma separated list of tasks and `u-v` task ranges.
+    - `a-b` = `u` : tasks `a` to `b` wait for upstream tasks `u` to `u + b - a`, one each,
+      as with frame offset dependencies.
+    - `a-b` = `u-v,...` : tasks `a` to `b` each wait for all of the upstream task ranges.
+      Single upstream tasks are written as `u-u` in this form to tell it apart from offsets.
+    """
+    # Consecutive tasks are grouped into runs of [start, end, kind, upstream], where kind is
+    # None until a second task decides whether the run is an offset or shares its upstream
+    # tasks.
+    runs = []
+    for task in sorted(upstreamTasks):
+        upstream = sorted(set(upstreamTasks[task]))
+        if runs and runs[-1][1] == task - 1:
+            run = runs[-1]
+            if run[2] != "offset" and upstream == run[3]:
+                run[1] = task
+                run[2] = "shared"
+                continue
+            if (
+                run[2] != "shared" and
+                len(upstream) == 1 and len(run[3]) == 1 and
+                upstream[0] - run[3][0] == task - run[0]
+            ):
+                run[1] = task
+                run[2] = "offset"
+                continue
+        runs.append([task, task, None, upstream])
+
+    def rangeString(start, end, forceRange):
+        return "{}-{}".format(start, end) if start != end or forceRange else str(start)
+
+    encoded = []
+    for start, end, kind, upstream in runs:
+        if kind == "offset":
+            encoded.append(("{}-{}".format(start, end), str(upstream[0])))
+            continue
+        encoded.append(
+            (
+                rangeString(start, end, False),
+                ",".join(
+                    rangeString(s, e, kind == "shared")
+                    for s, e in mergeRanges([(u, u) for u in upstream])
+                )
+            )
+        )
+
+    return encoded
@@ -35,15 +35,19 @@
 ##########################################################################
 
 import os
+import re
+import sys
+import json
 import tempfile
 
 import IECore
 
 import Gaffer
 import GafferDispatch
-import GafferScene
 
 from . import DeadlineTools
+from . import FrameRangeAlgo
+from .DispatchTrace import DispatchTrace
 from .GafferDeadlineTask import GafferDeadlineTask
 from .GafferDeadlineDependency import GafferDeadlineDependency
 
@@ -55,6 +59,8 @@ class GafferDeadlineJob(object):
     for Gaffer plugin Deadline jobs for simplicity.
     """
 
+    __extraInfoKeyValue = re.compile(r"^ExtraInfoKeyValue([0-9]+)$")
+
     class DeadlineDependencyType(object):
         _None = 0
         JobToJob = 1
@@ -79,8 +85,13 @@ class GafferDeadlineJob(object):
         self._deadlineSettings = deadlineSettings.copy()
         self._environmentVariables = environmentVariables.copy()
         self._jobId = None
+        self._submissionToken = None
         self._parentJobs = []
+        self._effectiveParentJobs = None
         self._tasks = []
+        self._tasksByBatch = {}
+        self._batchFrames = []
+        self._frameStep = None
         self._outputs = []
 
         self.setJobProperties(jobProperties)
@@ -127,6 +138,49 @@ class GafferDeadlineJob(object):
 
         return hash(h)
 
+    def getSubmissionHash(self):
+        """ Hash of everything that affects what this job does on the farm, used to recognise
+        jobs that haven't changed since an earlier dispatch. Unlike `__hash__()` this leaves out
+        the per-dispatch script location and includes the task hash for every frame, so changes
+        to upstream scenes and images are picked up.
+        """
+        h = IECore.MurmurHash()
+
+        for properties, ignored in [
+            (self.getJobProperties(), ()),
+            (self.getPluginProperties(), ("Script", "ScriptFile", "ScriptHash")),
+            (self._deadlineSettings, ()),
+            (self._environmentVariables, ()),
+        ]:
+            for k, v in sorted(properties.items()):
+                if k in ignored:
+                    continue
+                h.append(k)
+                h.append(str(v) if v is not None else "")
+
+        for o in self.getOutputs():
+            h.append(o)
+
+        gafferNode = self.getGafferNode()
+        if gafferNode is not None:
+            h.append(gafferNode.fullName())
+
+        context = Gaffer.Context(self.getContext())
+        for task in self.getTasks():
+            if task.getStartFrame() is None:
+                continue
+            h.append(task.getStartFrame())
+            h.append(task.getEndFrame())
+            h.append(task.getStep())
+            if gafferNode is None:
+                continue
+            for frame in range(task.getStartFrame(), task.getEndFrame() + 1, task.getStep()):
+                context.setFrame(frame)
+                with context:
+                    h.append(gafferNode["task"].hash())
+
+        return h.toString()
+
     def setJobProperties(self, newProperties):
         """ The only parameter Deadline requires is Plugin and because we are
         focusing on Gaffer plugins, make sure that's always set.
@@ -162,6 +216,10 @@ class GafferDeadlineJob(object):
     def getJobID(self):
         return self._jobId
 
+    def setJobID(self, jobId):
+        """ Use an existing Deadline job instead of submitting this one. """
+        self._jobId = jobId
+
     def setGafferNode(self, newNode):
         if not issubclass(type(newNode), GafferDispatch.TaskNode) and newNode is not None:
             raise ValueError("Gaffer node must be a GafferDispatch.TaskNode or None")
@@ -197,19 +255,24 @@ class GafferDeadlineJob(object):
             raise ValueError("Parent job must be a GafferDeadlineJob")
         if parentJob not in self.getParentJobs():
             self._parentJobs.append(parentJob)
+            self._effectiveParentJobs = None
 
     def getParentJobs(self):
         return self._parentJobs
 
     def getEffectiveParentJobs(self):
-        jobs = []
-        for j in self.getParentJobs():
-            if not GafferDeadlineJob.isControlTask(j.getGafferNode()):
-                jobs.append(j)
-            else:
-                jobs += j.getEffectiveParentJobs()
+        # The job tree is complete by the time dependencies are resolved, so this is
+        # only computed once unless more parents are added.
+        if self._effectiveParentJobs is None:
+            jobs = []
+            for j in self.getParentJobs():
+                if not GafferDeadlineJob.isControlTask(j.getGafferNode()):
+                    jobs.append(j)
+                else:
+                    jobs += j.getEffectiveParentJobs()
+            self._effectiveParentJobs = jobs
 
-        return jobs
+        return list(self._effectiveParentJobs)
 
     def getParentJobByGafferNode(self, gafferNode):
         for job in self.getParentJobs():
@@ -237,59 +300,168 @@ class GafferDeadlineJob(object):
     # _TaskBatch objects
     def addBatch(self, newBatch, batchFrames):
         """ A batch corresponds to one or more Deadline Tasks
-        Deadline Tasks must be sequential frames with only a start and end frame
+        Deadline Tasks must be sequential frames with only a start and end frame. Frames with a
+        regular step, such as every other frame, are kept in one task. Deadline runs a whole job
+        with one step, so a step is only used while every batch of the job has it. As soon as
+        a batch has a different step, the job falls back to a step of 1 and its tasks are made
+        again, with a task for each run of sequential frames.
         """
         assert newBatch is None or type(newBatch) == GafferDispatch.Dispatcher._TaskBatch
+        frames = sorted(set(batchFrames))
+        self._batchFrames.append((newBatch, frames))
+
+        batchStep = self.__batchStep(frames)
+        if batchStep is not None and batchStep != self._frameStep:
+            if self._frameStep is None:
+                self._frameStep = batchStep
+            elif self._frameStep != 1:
+                self._frameStep = 1
+                self._tasks = []
+                self._tasksByBatch = {}
+                for batch, batchFrames in self._batchFrames[:-1]:
+                    self.__addBatchTasks(batch, batchFrames)
+
+        self.__addBatchTasks(newBatch, frames)
+
+    @staticmethod
+    def __batchStep(frames):
+        # The step between all the frames of a batch, 1 if they don't have a regular step or
+        # None if there is only one frame.
+        if len(frames) < 2:
+            return None
+
+        step = frames[1] - frames[0]
+        if any(b - a != step for a, b in zip(frames, frames[1:])):
+            return 1
+
+        return step
+
+    def __addBatchTasks(self, batch, frames):
         # some TaskNodes like TaskList and TaskWedge submit with no frames because they are just
         # hierarchy placeholders they still need to be in for proper dependency handling
-        if len(batchFrames) > 0:
-            currentTask = GafferDeadlineTask(
-                newBatch,
-                len(self.getTasks()),
-                startFrame=batchFrames[0],
-                endFrame=batchFrames[0]
-            )
-            self._tasks.append(currentTask)
-            for i in range(1, len(batchFrames)):
-                if (batchFrames[i] - batchFrames[i-1]) > 1:
-                    currentTask = GafferDeadlineTask(
-                        newBatch,
+        if len(frames) > 0:
+            for startFrame, endFrame, step in FrameRangeAlgo.compactFrames(
+                frames,
+                self._frameStep or 1
+            ):
+                self.__appendTask(
+                    GafferDeadlineTask(
+                        batch,
                         len(self.getTasks()),
-                        startFrame=batchFrames[i],
-                        endFrame=batchFrames[i]
+                        startFrame=startFrame,
+                        endFrame=endFrame,
+                        step=step
                     )
-                    self._tasks.append(currentTask)
-                else:
-                    currentTask.setEndFrame(batchFrames[i])
+                )
         else:
             # Control nodes like TaskList have no frames but do need tasks created to pass
             # through dependencies
-            self._tasks.append(GafferDeadlineTask(newBatch, 0))
+            self.__appendTask(GafferDeadlineTask(batch, 0))
+
+    def getFrameStep(self):
+        """ The step between frames of multi-frame tasks for this job. """
+        return self._frameStep or 1
+
+    def regroupTasks(self, framesPerTask, split=True):
+        """ Regroups the tasks into tasks of up to `framesPerTask` frames, so cheap nodes pay
+        the task startup cost less often and expensive nodes run in parallel. When `split` is
+        True, each run of sequential frames is cut into tasks of exactly `framesPerTask`
+        frames apart from the last, the way Deadline makes tasks from a frame range and chunk
+        size. Otherwise batches are never divided and adjacent tasks are only merged. A task
+        waits for the dependencies of all the batches it has frames of.
+        """
+        if framesPerTask < 1:
+            raise ValueError("Frames per task must be at least 1.")
+
+        tasks = sorted(self.getTasks(), key=lambda t: t.getStartFrame())
+        if not tasks or any(t.getStartFrame() is None for t in tasks):
+            return
+
+        step = self.getFrameStep()
+
+        # Runs of sequential frames, as [startFrame, endFrame, tasks]
+        runs = []
+        for task in tasks:
+            if runs and task.getStartFrame() == runs[-1][1] + step:
+                runs[-1][1] = task.getEndFrame()
+                runs[-1][2].append(task)
+            else:
+                runs.append([task.getStartFrame(), task.getEndFrame(), [task]])
+
+        groups = []
+        for runStart, runEnd, runTasks in runs:
+            if split:
+                i = 0
+                for start in range(runStart, runEnd + 1, framesPerTask * step):
+                    end = min(start + (framesPerTask - 1) * step, runEnd)
+                    # Tasks are sorted, so the ones ending before this group can't overlap
+                    # later groups either
+                    while runTasks[i].getEndFrame() < start:
+                        i += 1
+                    groupTasks = []
+                    j = i
+                    while j < len(runTasks) and runTasks[j].getStartFrame() <= end:
+                        groupTasks.append(runTasks[j])
+                        j += 1
+                    groups.append([start, end, groupTasks])
+                continue
+
+            for task in runTasks:
+                if groups and groups[-1][2][-1] in runTasks:
+                    group = groups[-1]
+                    if (
+                        FrameRangeAlgo.frameCount((group[0], task.getEndFrame(), step)) <=
+                        framesPerTask
+                    ):
+                        group[1] = task.getEndFrame()
+                        group[2].append(task)
+                        continue
+
+                groups.append([task.getStartFrame(), task.getEndFrame(), [task]])
+
+        self._tasks = []
+        self._tasksByBatch = {}
+        for start, end, groupTasks in groups:
+            newTask = GafferDeadlineTask(
+                None,
+                len(self._tasks),
+                startFrame=start,
+                endFrame=end,
+                step=step if start != end else 1
+            )
+            for task in groupTasks:
+                for batch in task.getGafferBatches():
+                    newTask.addGafferBatch(batch)
+            self.__appendTask(newTask)
+
+    def __appendTask(self, task):
+        self._tasks.append(task)
+        for batch in task.getGafferBatches() or [None]:
+            self._tasksByBatch.setdefault(batch, []).append(task)
 
     def getTasksForBatch(self, batch):
-        taskList = [t for t in self.getTasks() if t.getGafferBatch() == batch]
-        return taskList
+        return list(self._tasksByBatch.get(batch, []))
 
     def getTasks(self):
         return self._tasks
 
-    def __getParentBatches(self, batch):
+    def __getParentBatches(self, batch, parentJobsByNode, cache):
         # Return the dependencies from a specific node, passing through the upstream nodes
         # if this is a control node.
-        batches = []
+        if batch in cache:
+            return cache[batch]
 
-        effectiveParentJobs = self.getEffectiveParentJobs()
+        batches = []
 
         for b in batch.preTasks():
             if not GafferDeadlineJob.isControlTask(b.node()):
-                job = None
-                for j in effectiveParentJobs:
-                    if j.getGafferNode() == b.node():
-                        job = j
+                job = parentJobsByNode.get(b.node())
                 if job is not None:
                     batches.append((job, b))
             else:
-                batches += self.__getParentBatches(b)
+                batches += self.__getParentBatches(b, parentJobsByNode, cache)
+
+        cache[batch] = batches
 
         return batches
 
@@ -301,55 +473,64 @@ class GafferDeadlineJob(object):
         will not be submitted to Deadline.
         """
 
-        effectiveParentJobs = []
+        # When more than one effective parent job shares a node, the last one wins.
+        parentJobsByNode = {}
+        for j in self.getEffectiveParentJobs():
+            parentJobsByNode[j.getGafferNode()] = j
+
+        parentBatchCache = {}
+        taskHashes = {}
+        jobHash = hash(self)
 
         deps = {}
         for task in self.getTasks():
-            for parentJob, parentBatch in self.__getParentBatches(task.getGafferBatch()):
-                upstreamTasks = parentJob.getTasksForBatch(parentBatch)
-                for dep in upstreamTasks:
-                    deps[hash(task) + hash(dep) + hash(self)] = GafferDeadlineDependency(
-                        parentJob,
-                        task,
-                        dep
-                    )
+            taskHash = hash(task)
+            for batch in task.getGafferBatches():
+                for parentJob, parentBatch in self.__getParentBatches(
+                    batch,
+                    parentJobsByNode,
+                    parentBatchCache
+                ):
+                    for dep in parentJob.getTasksForBatch(parentBatch):
+                        if id(dep) not in taskHashes:
+                            taskHashes[id(dep)] = hash(dep)
+                        deps[taskHash + taskHashes[id(dep)] + jobHash] = GafferDeadlineDependency(
+                            parentJob,
+                            task,
+                            dep
+                        )
 
         return deps
 
     @staticmethod
     def isControlTask(node):
-        return type(node) in [
+        if type(node) in [
             GafferDispatch.FrameMask,
             GafferDispatch.TaskList,
             GafferDispatch.TaskSwitch,
             GafferDispatch.Wedge,
             GafferDispatch.TaskContextVariables,  # this node is deprecated and will be removed
-            GafferScene.RenderPassWedge,
-        ]
+        ]:
+            return True
 
-    def submitJob(self, jobDirectory):
-        """ Submit the job to Deadline.
-        Returns a tuple of (submittedJobId, deadlineStatusOutput). submittedJobId
-        will be None if submission failed. deadlineStatusOutput can be used to help figure out
-        why it failed.
+        # GafferScene is slow to import and a RenderPassWedge can only exist once it has been
+        # imported, so it is looked up rather than imported with GafferDeadline.
+        GafferScene = sys.modules.get("GafferScene")
+        return GafferScene is not None and type(node) is GafferScene.RenderPassWedge
 
-        Check to make sure that all auxiliary files exist, otherwise submission will fail.
-        Job and plugin information are stored in temporary files that are deleted after submission.
-        Windows has a problem with allowing Python to hide the temp file from the OS,
-        so the delete=False argument must be passed.
+    def getSubmissionPayload(self):
+        """ Build the Web Service payload for this job.
 
-        Job and plugin files are just serializations of their respective dictionaries in the
-        form of key=value separated by newlines.
+        Check to make sure that all auxiliary files exist, otherwise submission will fail.
+        Deadline settings are merged into the job properties and environment variables and
+        outputs are numbered into `EnvironmentKeyValue<n>` and `OutputFilename<n>` entries.
         """
         for auxFile in self._auxFiles:
             if not os.path.isfile(auxFile):
                 raise IOError("{} does not exist".format(auxFile))
 
-
         payload = {"JobInfo": {}, "PluginInfo": {}, "AuxFiles": []}
 
-        #jobFile = tempfile.NamedTemporaryFile(mode="w", suffix=".job", delete=False, dir=jobDirectory)
-
         self._jobProperties.update(self._deadlineSettings)
 
         for k, v in self._jobProperties.items():
@@ -371,9 +552,59 @@ class GafferDeadlineJob(object):
         for k, v in self._pluginProperties.items():
             payload["PluginInfo"][k] = v
 
-        import json
-        print("!!", json.dumps(payload, indent=4))
-        result = DeadlineTools.submitJob(payload)
+        if self._submissionToken is not None:
+            # Tag the job so a retried or resumed submission can find it if the Web Service
+            # created it but the response was lost.
+            extraInfoIndices = [
+                int(m.group(1)) for m in (
+                    self.__extraInfoKeyValue.match(k) for k in payload["JobInfo"].keys()
+                ) if m is not None
+            ]
+            payload["JobInfo"][
+                "ExtraInfoKeyValue{}".format(max(extraInfoIndices, default=-1) + 1)
+            ] = "{}={}:{}".format(
+                DeadlineTools.SUBMISSION_TOKEN_KEY,
+                self._submissionToken,
+                self.__payloadHash(payload)
+            )
+
+        return payload
+
+    def getPayloadHash(self):
+        """ Hash of the submission payload, apart from the submission token. Jobs with the same
+        payload hash do the same thing on the farm.
+        """
+        submissionToken = self._submissionToken
+        self._submissionToken = None
+        try:
+            return self.__payloadHash(self.getSubmissionPayload())
+        finally:
+            self._submissionToken = submissionToken
+
+    @staticmethod
+    def __payloadHash(payload):
+        h = IECore.MurmurHash()
+        h.append(json.dumps(payload, sort_keys=True, default=str))
+        return h.toString()
+
+    def setSubmissionToken(self, token):
+        """ Set the token of the dispatch submitting this job, which is stored in the job's
+        ExtraInfo along with the payload hash. See `DeadlineTools.getSubmittedJobs()`.
+        """
+        self._submissionToken = token
+
+    def getSubmissionToken(self):
+        return self._submissionToken
+
+    def submitJob(self, jobDirectory):
+        """ Submit the job to Deadline.
+        Returns a tuple of (submittedJobId, deadlineStatusOutput). submittedJobId
+        will be None if submission failed. deadlineStatusOutput can be used to help figure out
+        why it failed.
+        """
+        with DispatchTrace.scope("submitJob", job=self._jobProperties.get("Name")) as scope:
+            result = DeadlineTools.submitJob(self.getSubmissionPayload())
+            scope.setArg("jobId", result[0])
 
         IECore.Log.debug("Submission results:", result)
 
@@ -382,3 +613,27 @@ class GafferDeadlineJob(object):
         self._jobId = result[0]
 
         return (self._jobId, result[1])
+
+    @staticmethod
+    def submitJobs(jobs, jobDirectory):
+        """ Submit several jobs that don't depend on each other with a single Web Service
+        request. Returns a list of (submittedJobId, deadlineStatusOutput) tuples in the same
+        order as `jobs`. Jobs that were accepted keep their ID even if another job in the
+        batch failed.
+        """
+        with DispatchTrace.scope("submitJobs", jobs=len(jobs)):
+            results = DeadlineTools.submitJobs([j.getSubmissionPayload() for j in jobs])
+
+        IECore.Log.debug("Submission results:", results)
+
+        failures = []
+        for job, result in zip(jobs, results):
+            if result[0] is None:
+                failures.append(result[1])
+            else:
+                job._jobId = result[0]
+
+        if failures:
+            raise RuntimeError("Deadline submission failed: \n{}".format(failures[0]))
+
+        return [(job.getJobID(), result[1]) for job, result in zip(jobs, results)]
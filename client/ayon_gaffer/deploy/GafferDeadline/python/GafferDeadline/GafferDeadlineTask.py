@@ -42,16 +42,19 @@ import GafferDispatch
 
 class GafferDeadlineTask(object):
     """ Mimic the Deadline representation of a task:
-    - tasks are a sequential range of frames indicated by the start frame and end frame
-    - tasks can only be associated with one job and therefore one batch / Gaffer Task Node
+    - tasks are a sequential range of frames indicated by the start frame and end frame,
+      optionally with a step between frames
+    - tasks can only be associated with one job and therefore one Gaffer Task Node, but may
+      cover several batches of that node when adjacent tasks are merged
     """
-    def __init__(self, gafferBatch, taskNumber, startFrame=None, endFrame=None):
+    def __init__(self, gafferBatch, taskNumber, startFrame=None, endFrame=None, step=1):
         self._startFrame = None
         self._endFrame = None
 
         self.setGafferBatch(gafferBatch)
         self.setStartFrame(startFrame)
         self.setEndFrame(endFrame)
+        self.setStep(step)
         self.setTaskNumber(taskNumber)
 
         if self.getStartFrame() is None and self.getGafferBatch() is not None and len(
@@ -75,6 +78,7 @@ class GafferDeadlineTask(object):
 
         h.append(self.getStartFrame() if self.getStartFrame() is not None else 1)
         h.append(self.getEndFrame() if self.getEndFrame() is not None else 1)
+        h.append(self.getStep())
         h.append(self.getTaskNumber())
 
         return hash(h)
@@ -89,10 +93,22 @@ class GafferDeadlineTask(object):
     def setGafferBatch(self, gafferBatch):
         assert gafferBatch is None or type(gafferBatch) == GafferDispatch.Dispatcher._TaskBatch
         self._gafferBatch = gafferBatch
+        self._gafferBatches = [gafferBatch] if gafferBatch is not None else []
 
     def getGafferBatch(self):
         return self._gafferBatch
 
+    def addGafferBatch(self, gafferBatch):
+        """ Adds another batch executed by this task, used when tasks are merged. """
+        assert type(gafferBatch) == GafferDispatch.Dispatcher._TaskBatch
+        if self._gafferBatch is None:
+            self._gafferBatch = gafferBatch
+        if gafferBatch not in self._gafferBatches:
+            self._gafferBatches.append(gafferBatch)
+
+    def getGafferBatches(self):
+        return list(self._gafferBatches)
+
     def setFrameRange(self, startFrame, endFrame):
         if endFrame < startFrame:
             raise ValueError("End frame must be greater than start frame.")
@@ -153,3 +169,16 @@ class GafferDeadlineTask(object):
 
     def getEndFrame(self):
         return self._endFrame
+
+    def setStep(self, step):
+        if int(step) != step or step < 1:
+            raise ValueError("Frame step must be a positive integer.")
+        self._step = int(step)
+
+    def getStep(self):
+        return self._step
+
+    def getFrameCount(self):
+        if self.getStartFrame() is None or self.getEndFrame() is None:
+            return 0
+        return (self.getEndFrame() - self.getStartFrame()) // self.getStep() + 1
@@ -0,0 +1,91 @@
+##########################################################################
+#
+#  Copyright (c) 2019, Hypothetical Inc. All rights reserved.
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#      * Redistributions of source code must retain the above
+#        copyright notice, this list of conditions and the following
+#        disclaimer.
+#
+#      * Redistributions in binary form must reproduce the above
+#        copyright notice, this list of conditions and the following
+#        disclaimer in the documentation and/or other materials provided with
+#        the distribution.
+#
+#      * Neither the name of Hypothetical Inc. nor the names of
+#        any other contributors to this software may be used to endorse or
+#        promote products derived from this software without specific prior
+#        written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+#  IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+#  THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+#  PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+#  CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+#  EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+#  PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+#  PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+#  LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+#  NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+#  SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+##########################################################################
+
+import os
+
+import IECore
+
+
+class ScriptStore(object):
+    """ Content-addressed store for serialised scripts. Each script is written to a directory
+    named after the hash of its serialisation, so dispatching an unchanged script again reuses
+    the existing file instead of writing a new copy for every dispatch. Workers see the same
+    path for the same script, which lets the Deadline plugin reuse its path-mapped copy.
+
+    The store directory can be shared between artists and is set with the
+    `GAFFERDEADLINE_SCRIPT_STORE` environment variable, defaulting to a `scripts` directory
+    in the dispatcher's jobs directory. Scripts are never removed from the store.
+    """
+
+    def __init__(self, directory):
+        self.__directory = directory
+
+    @staticmethod
+    def defaultDirectory(jobsDirectory):
+        return os.environ.get("GAFFERDEADLINE_SCRIPT_STORE") or os.path.join(
+            jobsDirectory,
+            "scripts"
+        )
+
+    @staticmethod
+    def hash(serialisation):
+        h = IECore.MurmurHash()
+        h.append(serialisation)
+        return h.toString()
+
+    def directory(self):
+        return self.__directory
+
+    def path(self, scriptHash, fileName):
+        return os.path.join(self.__directory, scriptHash, fileName)
+
+    def addScript(self, serialisation, fileName):
+        """ Stores `serialisation` as `fileName`, writing it only if the store doesn't
+        already have it. Returns a tuple of (path, scriptHash).
+        """
+        scriptHash = self.hash(serialisation)
+        path = self.path(scriptHash, fileName)
+        if os.path.isfile(path):
+            return path, scriptHash
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write under a temporary name first so other dispatches never see a partial script
+        tempPath = "{}.{}.tmp".format(path, os.getpid())
+        with open(tempPath, "w") as f:
+            f.write(serialisation)
+        os.replace(tempPath, path)
+
+        return path, scriptHash
@@ -0,0 +1,109 @@
+##########################################################################
+#
+#  Copyright (c) 2019, Hypothetical Inc. All rights reserved.
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#      * Redistributions of source code must retain the above
+#        copyright notice, this list of conditions and the following
+#        disclaimer.
+#
+#      * Redistributions in binary form must reproduce the above
+#        copyright notice, this list of conditions and the following
+#        disclaimer in the documentation and/or other materials provided with
+#        the distribution.
+#
+#      * Neither the name of Hypothetical Inc. nor the names of
+#        any other contributors to this software may be used to endorse or
+#        promote products derived from this software without specific prior
+#        written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+#  IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+#  THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+#  PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+#  CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+#  EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+#  PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+#  PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+#  LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+#  NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+#  SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+##########################################################################
+
+
+class SubmissionOverrides(object):
+    """ Values used in place of the `dispatcher.deadline` plugs of task nodes for a single
+    dispatch, so a submission can be customised without editing the script. Pass an instance
+    to `DeadlineDispatcher.setSubmissionOverrides()` before dispatching.
+
+    Overrides given without a node apply to every job, and overrides for a specific node take
+    precedence over them. Context variables are set in the context the nodes are dispatched
+    in, replacing script variables of the same name, so they are used when the tasks are
+    batched, when the jobs are built and when they are executed on the farm.
+    """
+
+    def __init__(self):
+        self.__deadlineSettings = {}
+        self.__environmentVariables = {}
+        self.__contextVariables = {}
+        self.__limitGroups = {}
+
+    def setDeadlineSetting(self, name, value, node=None):
+        """ Uses `value` in place of the value of `dispatcher.deadline.<name>`. """
+        self.__deadlineSettings.setdefault(node, {})[name] = value
+
+    def deadlineSettings(self, node):
+        """ Returns a dictionary of the deadline settings overridden for `node`. """
+        return self.__merged(self.__deadlineSettings, node)
+
+    def addEnvironmentVariable(self, name, value, node=None):
+        """ Adds an environment variable to the job, as if it were in the node's
+        `dispatcher.deadline.environmentVariables` plug.
+        """
+        self.__environmentVariables.setdefault(node, {})[name] = value
+
+    def environmentVariables(self, node):
+        """ Returns a dictionary of the environment variables added for `node`. """
+        return self.__merged(self.__environmentVariables, node)
+
+    def setContextVariable(self, name, value):
+        self.__contextVariables[name] = value
+
+    def contextVariables(self):
+        return dict(self.__contextVariables)
+
+    def setLimitGroup(self, name, typeNames):
+        """ Adds the Deadline limit `name` to every job evaluating an enabled node with one of
+        the type names in `typeNames`, either the job's task node itself or any node upstream
+        of it.
+        """
+        self.__limitGroups[name] = list(typeNames)
+
+    def limitGroups(self):
+        return dict(self.__limitGroups)
+
+    def update(self, other):
+        """ Adds the overrides from the SubmissionOverrides `other`, replacing any that are
+        already set.
+        """
+        for mine, theirs in [
+            (self.__deadlineSettings, other.__deadlineSettings),
+            (self.__environmentVariables, other.__environmentVariables),
+        ]:
+            for node, values in theirs.items():
+                mine.setdefault(node, {}).update(values)
+
+        self.__contextVariables.update(other.__contextVariables)
+        self.__limitGroups.update(other.__limitGroups)
+
+    @staticmethod
+    def __merged(overrides, node):
+        result = dict(overrides.get(None, {}))
+        if node is not None:
+            result.update(overrides.get(node, {}))
+
+        return result
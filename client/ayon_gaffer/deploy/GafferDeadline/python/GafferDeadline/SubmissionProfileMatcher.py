@@ -0,0 +1,92 @@
+##########################################################################
+#
+#  Copyright (c) 2019, Hypothetical Inc. All rights reserved.
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#      * Redistributions of source code must retain the above
+#        copyright notice, this list of conditions and the following
+#        disclaimer.
+#
+#      * Redistributions in binary form must reproduce the above
+#        copyright notice, this list of conditions and the following
+#        disclaimer in the documentation and/or other materials provided with
+#        the distribution.
+#
+#      * Neither the name of Hypothetical Inc. nor the names of
+#        any other contributors to this software may be used to endorse or
+#        promote products derived from this software without specific prior
+#        written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+#  IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+#  THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+#  PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+#  CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+#  EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+#  PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+#  PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+#  LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+#  NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+#  SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+##########################################################################
+
+_missing = object()
+
+
+class SubmissionProfileMatcher(object):
+    """ Finds the Deadline settings for task nodes from a list of profiles, each made of the
+    task node type names it applies to, the values some of the node's plugs must have and the
+    settings to use. Profiles are tried in the order they were added and the first one
+    matching a node wins. Plugs a node doesn't have don't prevent a profile from matching.
+
+    The profiles are indexed by type name when they are added, so matching a node only looks
+    at the profiles for its type, and each plug filtered on is only evaluated once per node.
+    """
+
+    def __init__(self):
+        self.__profiles = {}
+        self.__numProfiles = 0
+
+    def addProfile(self, typeNames, settings, plugValues=None):
+        """ Adds a profile using the dictionary `settings` for nodes with one of the type names
+        in `typeNames` whose plugs have the values in the dictionary `plugValues`.
+        """
+        profile = (tuple((plugValues or {}).items()), settings)
+        for typeName in dict.fromkeys(typeNames):
+            self.__profiles.setdefault(typeName, []).append(profile)
+
+        self.__numProfiles += 1
+
+    def numProfiles(self):
+        return self.__numProfiles
+
+    def typeNames(self):
+        """ Returns the type names with at least one profile. """
+        return set(self.__profiles)
+
+    def match(self, node):
+        """ Returns the settings of the first profile matching `node`, or None if no profile
+        matches it.
+        """
+        profiles = self.__profiles.get(node.typeName())
+        if profiles is None:
+            return None
+
+        values = {}
+        for plugValues, settings in profiles:
+            for name, value in plugValues:
+                nodeValue = values.get(name, _missing)
+                if nodeValue is _missing:
+                    plug = node.getChild(name)
+                    nodeValue = plug.getValue() if plug is not None else None
+                    values[name] = nodeValue
+                if nodeValue is not None and nodeValue != value:
+                    break
+            else:
+                return settings
+
+        return None
@@ -0,0 +1,206 @@
+##########################################################################
+#
+#  Copyright (c) 2019, Hypothetical Inc. All rights reserved.
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#      * Redistributions of source code must retain the above
+#        copyright notice, this list of conditions and the following
+#        disclaimer.
+#
+#      * Redistributions in binary form must reproduce the above
+#        copyright notice, this list of conditions and the following
+#        disclaimer in the documentation and/or other materials provided with
+#        the distribution.
+#
+#      * Neither the name of Hypothetical Inc. nor the names of
+#        any other contributors to this software may be used to endorse or
+#        promote products derived from this software without specific prior
+#        written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+#  IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+#  THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+#  PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+#  CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+#  EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+#  PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+#  PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+#  LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+#  NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+#  SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+##########################################################################
+
+import os
+import json
+import datetime
+
+import IECore
+
+from . import FrameRangeAlgo
+
+
+class TaskTimingHistory(object):
+    """ Records how long each task node takes to execute a frame on the farm, so later
+    dispatches can choose how many frames to put in each Deadline task. Timings are learnt
+    from the Deadline task reports of earlier jobs : submitted jobs are remembered as pending
+    and their completed tasks are read back the next time the history is updated. Each task is
+    only measured once, even if its job stays pending for several updates. The history is a
+    JSON file kept alongside the per-dispatch job directories.
+    """
+
+    fileName = "deadlineTaskTimings.json"
+
+    # Deadline's task status for completed tasks
+    completedTaskStatus = 5
+
+    # Weight of the newest timing in the running average
+    smoothing = 0.5
+
+    __version = 2
+
+    def __init__(self, directory):
+        self.__path = os.path.join(directory, self.fileName)
+        self.__nodes = {}
+        self.__pending = {}
+
+        if os.path.isfile(self.__path):
+            try:
+                with open(self.__path, "r") as f:
+                    data = json.load(f)
+                if data.get("version") in (1, self.__version):
+                    self.__nodes = data.get("nodes", {})
+                    self.__pending = data.get("pending", {})
+                if data.get("version") == 1:
+                    # Pending jobs were lists of job IDs, without their measured tasks
+                    self.__pending = {
+                        nodeName: {jobId: [] for jobId in jobIds}
+                        for nodeName, jobIds in self.__pending.items()
+                    }
+            except (IOError, ValueError) as e:
+                IECore.msg(
+                    IECore.Msg.Level.Warning,
+                    "TaskTimingHistory",
+                    "Ignoring unreadable history \"{}\" : {}".format(self.__path, e)
+                )
+
+    def path(self):
+        return self.__path
+
+    def secondsPerFrame(self, nodeName):
+        """ Returns the average execution time of one frame of `nodeName`, or None if it
+        hasn't been measured yet.
+        """
+        entry = self.__nodes.get(nodeName)
+        return entry["secondsPerFrame"] if entry is not None else None
+
+    def addTiming(self, nodeName, seconds, frameCount):
+        if frameCount < 1 or seconds < 0:
+            return
+        secondsPerFrame = float(seconds) / frameCount
+        entry = self.__nodes.get(nodeName)
+        if entry is None:
+            self.__nodes[nodeName] = {"secondsPerFrame": secondsPerFrame, "samples": 1}
+        else:
+            entry["secondsPerFrame"] += self.smoothing * (
+                secondsPerFrame - entry["secondsPerFrame"]
+            )
+            entry["samples"] += 1
+
+    def addPendingJob(self, nodeName, jobId):
+        """ Remembers a submitted job so its timings can be read once it has run. """
+        self.__pending.setdefault(nodeName, {}).setdefault(jobId, [])
+
+    def pendingJobs(self):
+        """ Returns a dictionary of pending job IDs keyed by node name. """
+        return {k: list(v) for k, v in self.__pending.items()}
+
+    def addJobTasks(self, nodeName, jobId, tasks):
+        """ Adds the timings of the completed tasks in `tasks`, a list of Deadline task
+        dictionaries for `jobId`, that haven't been added already. The job stays pending until
+        all of its tasks have completed.
+        """
+        measuredTasks = self.__pending.get(nodeName, {}).get(jobId, [])
+        measured = set(measuredTasks)
+        complete = True
+        for task in tasks:
+            if task.get("Stat") != self.completedTaskStatus:
+                complete = False
+                continue
+            taskKey = str(task.get("TaskID", task.get("Frames", "")))
+            if taskKey in measured:
+                continue
+            measured.add(taskKey)
+            measuredTasks.append(taskKey)
+            seconds = self.__taskSeconds(task)
+            frameCount = sum(
+                FrameRangeAlgo.frameCount(r) for r in self.__parseFrames(task.get("Frames", ""))
+            )
+            if seconds is not None:
+                self.addTiming(nodeName, seconds, frameCount)
+
+        if complete:
+            self.removePendingJob(nodeName, jobId)
+
+    def removePendingJob(self, nodeName, jobId):
+        jobIds = self.__pending.get(nodeName, {})
+        jobIds.pop(jobId, None)
+        if not jobIds:
+            self.__pending.pop(nodeName, None)
+
+    def save(self):
+        directory = os.path.dirname(self.__path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        # Write to a temporary file first so an interrupted save can't corrupt the history
+        tempPath = self.__path + ".tmp"
+        with open(tempPath, "w") as f:
+            json.dump(
+                {"version": self.__version, "nodes": self.__nodes, "pending": self.__pending},
+                f,
+                indent=4,
+                sort_keys=True
+            )
+        os.replace(tempPath, self.__path)
+
+    @staticmethod
+    def __taskSeconds(task):
+        start = TaskTimingHistory.__parseDate(task.get("StartRen") or task.get("Start"))
+        end = TaskTimingHistory.__parseDate(task.get("Comp"))
+        if start is None or end is None or end < start:
+            return None
+        return (end - start).total_seconds()
+
+    @staticmethod
+    def __parseDate(value):
+        # Deadline reports dates as UTC ISO strings, using year 1 for dates that aren't set
+        if not value or value.startswith("0001"):
+            return None
+        value = value.rstrip("Z")
+        if "." in value:
+            value, _, fraction = value.partition(".")
+            value += "." + fraction[:6].ljust(6, "0")
+        try:
+            return datetime.datetime.fromisoformat(value)
+        except ValueError:
+            return None
+
+    @staticmethod
+    def __parseFrames(frames):
+        runs = []
+        for part in frames.split(","):
+            part = part.strip()
+            if not part:
+                continue
+            frameRange, _, step = part.partition("x")
+            start, _, end = frameRange.partition("-")
+            try:
+                runs.append((int(start), int(end or start), int(step or 1)))
+            except ValueError:
+                continue
+
+        return runs
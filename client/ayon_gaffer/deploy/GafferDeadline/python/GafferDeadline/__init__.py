@@ -40,5 +40,16 @@ from .GafferDeadlineTask import GafferDeadlineTask
 from .GafferDeadlineDependency import GafferDeadlineDependency
 from .DeadlineTools import *
 from .DeadlineTask import DeadlineTask
+from .DispatchSettings import DispatchSettings
+from .SubmissionOverrides import SubmissionOverrides
+from .SubmissionProfileMatcher import SubmissionProfileMatcher
+from . import FrameRangeAlgo
+from .DispatchManifest import DispatchManifest
+from .ScriptStore import ScriptStore
+from .TaskTimingHistory import TaskTimingHistory
+from .BackgroundDispatch import BackgroundDispatch
+from .DispatchTrace import DispatchTrace
+from .DryRunTransport import DryRunTransport
+from .DeadlineListCache import DeadlineListCache
 
 __import__("IECore").loadConfig("GAFFER_STARTUP_PATHS", {}, subdirectory="GafferDeadline")
@@ -0,0 +1,234 @@
+##########################################################################
+#
+#  Copyright (c) 2019, Hypothetical Inc. All rights reserved.
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#      * Redistributions of source code must retain the above
+#        copyright notice, this list of conditions and the following
+#        disclaimer.
+#
+#      * Redistributions in binary form must reproduce the above
+#        copyright notice, this list of conditions and the following
+#        disclaimer in the documentation and/or other materials provided with
+#        the distribution.
+#
+#      * Neither the name of Hypothetical Inc. nor the names of
+#        any other contributors to this software may be used to endorse or
+#        promote products derived from this software without specific prior
+#        written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+#  IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+#  THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+#  PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+#  CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+#  EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+#  PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+#  PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+#  LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+#  NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+#  SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+##########################################################################
+
+import os
+import importlib.util
+import unittest
+from unittest import mock
+
+import GafferTest
+
+import GafferDeadline
+
+
+def _loadDependencyScript():
+    # The dependency script is run by Deadline rather than imported as part of a package
+    path = os.path.join(
+        os.path.dirname(__file__), "..", "..", "gaffer_batch_dependency.py"
+    )
+    spec = importlib.util.spec_from_file_location("gaffer_batch_dependency", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class _FakeTask(object):
+    def __init__(self, taskId, status):
+        self.TaskId = str(taskId)
+        self.TaskStatus = status
+
+
+class _FakeTaskCollection(object):
+    def __init__(self, tasks):
+        self.TaskCollectionTasks = tasks
+
+
+class _FakeJob(object):
+    def __init__(self, jobId, extraInfo={}, completedTasks=(), taskCount=0):
+        self.JobId = jobId
+        self.JobName = jobId
+        self.extraInfo = dict(extraInfo)
+        self.tasks = [
+            _FakeTask(i, "Completed" if i in completedTasks else "Pending")
+            for i in range(taskCount)
+        ]
+
+    def GetJobExtraInfoKeys(self):
+        return list(self.extraInfo.keys())
+
+    def GetJobExtraInfoKeyValue(self, key):
+        return self.extraInfo[key]
+
+
+class _FakeRepositoryUtils(object):
+    """ Stands in for Deadline's RepositoryUtils, counting the repository queries. """
+
+    def __init__(self, jobs):
+        self.jobs = {j.JobId: j for j in jobs}
+        self.getJobCalls = []
+        self.getJobTasksCalls = []
+
+    def GetJob(self, jobId, invalidate):
+        self.getJobCalls.append(jobId)
+        return self.jobs.get(jobId)
+
+    def GetJobTasks(self, job, invalidate):
+        self.getJobTasksCalls.append(job.JobId)
+        return _FakeTaskCollection(job.tasks)
+
+
+class BatchDependencyTest(GafferTest.TestCase):
+
+    def setUp(self):
+        GafferTest.TestCase.setUp(self)
+        self.dependencyScript = _loadDependencyScript()
+
+    def __run(self, jobs, jobId, taskIds):
+        repository = _FakeRepositoryUtils(jobs)
+        with mock.patch.object(self.dependencyScript, "RepositoryUtils", repository):
+            return self.dependencyScript.__main__(jobId, taskIds), repository
+
+    def testRelease(self):
+        jobs = [
+            _FakeJob("upstreamA", completedTasks={0, 1}, taskCount=3),
+            _FakeJob("upstreamB", completedTasks={0}, taskCount=2),
+            _FakeJob(
+                "job",
+                {
+                    "0:upstreamA": "0",
+                    "0:upstreamB": "0",
+                    "1:upstreamA": "1",
+                    "1:upstreamB": "1",
+                    "2:upstreamA": "2",
+                }
+            ),
+        ]
+
+        released, repository = self.__run(jobs, "job", ["0", "1", "2"])
+        self.assertEqual(released, ["0"])
+
+        # Each upstream job's tasks are fetched once, not once per dependency
+        self.assertEqual(sorted(repository.getJobTasksCalls), ["upstreamA", "upstreamB"])
+
+        # Only the requested tasks are considered
+        released, repository = self.__run(jobs, "job", ["1", "2"])
+        self.assertEqual(released, [])
+
+    def testMissingUpstreamJob(self):
+        jobs = [
+            _FakeJob("upstreamA", completedTasks={0}, taskCount=2),
+            _FakeJob("job", {"0:deletedJob": "0", "1:deletedJob": "0", "1:upstreamA": "1"}),
+        ]
+
+        released, repository = self.__run(jobs, "job", ["0", "1"])
+        self.assertEqual(released, ["0"])
+        self.assertEqual(repository.getJobTasksCalls, ["upstreamA"])
+
+    def testInvalidExtraInfo(self):
+        jobs = [
+            _FakeJob("upstreamA", completedTasks={0}, taskCount=1),
+            _FakeJob(
+                "job",
+                {
+                    "0:upstreamA": "0",
+                    "comment": "not a dependency",
+                    "1:upstreamA": "notATask",
+                }
+            ),
+        ]
+
+        # Tasks without dependencies have nothing to wait for
+        released, repository = self.__run(jobs, "job", ["0", "1"])
+        self.assertEqual(released, ["0", "1"])
+
+    def testCompactEncoding(self):
+        upstreamTasks = {t: {t + 2} for t in range(0, 100)}
+        upstreamTasks.update({t: {0, 1, 2, 5} for t in range(100, 110)})
+        upstreamTasks[110] = {7}
+        extraInfo = {
+            "{}:upstream".format(tasks): upstream
+            for tasks, upstream in GafferDeadline.FrameRangeAlgo.encodeTaskDependencies(
+                upstreamTasks
+            )
+        }
+        self.assertEqual(len(extraInfo), 3)
+
+        dependencies = self.dependencyScript.parseDependencies(
+            _FakeJob("job", extraInfo),
+            list(range(0, 111))
+        )
+        self.assertEqual(
+            dependencies,
+            {t: {("upstream", u) for u in upstream} for t, upstream in upstreamTasks.items()}
+        )
+
+        jobs = [
+            _FakeJob("upstream", completedTasks={0, 1, 2, 3, 4, 5}, taskCount=120),
+            _FakeJob("job", extraInfo),
+        ]
+        released, repository = self.__run(jobs, "job", [str(t) for t in range(0, 111)])
+        self.assertEqual(released, ["0", "1", "2", "3"] + [str(t) for t in range(100, 110)])
+
+    def testLargeRanges(self):
+        # Only the tasks being checked are decoded from entries covering many tasks
+        job = _FakeJob("job", {"0-999999:upstream": "5", "1000000-1999999:upstream": "0-3"})
+        with mock.patch.object(
+            self.dependencyScript,
+            "parseUpstreamTasks",
+            wraps=self.dependencyScript.parseUpstreamTasks
+        ) as parseUpstreamTasks:
+            dependencies = self.dependencyScript.parseDependencies(job, [3, 500000, 3000000])
+
+        self.assertEqual(
+            dependencies,
+            {3: {("upstream", 8)}, 500000: {("upstream", 500005)}, 3000000: set()}
+        )
+        self.assertEqual(parseUpstreamTasks.call_count, 1)
+        self.assertEqual(parseUpstreamTasks.call_args[0][3], [3, 500000])
+
+    def testNoTasks(self):
+        released, repository = self.__run([_FakeJob("job")], "job", [])
+        self.assertEqual(released, False)
+        self.assertEqual(repository.getJobCalls, [])
+
+    def testReleasedTasks(self):
+        dependencies = {
+            0: {("a", 0), ("b", 0)},
+            1: {("a", 1)},
+            2: {("c", 5)},
+            3: set(),
+        }
+        self.assertEqual(
+            self.dependencyScript.releasedTasks(
+                dependencies,
+                {"a": {0, 1}, "b": set(), "c": None}
+            ),
+            [1, 2, 3]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -34,6 +34,10 @@
 #
 ##########################################################################
 
+import os
+import json
+import time
+import socket
 import unittest
 from unittest import mock
 
@@ -56,6 +60,10 @@ class DeadlineDispatcherTest(GafferTest.TestCase):
 
         return dispatcher
 
+    @staticmethod
+    def __existingJobs(jobIds):
+        return {jobId: {"_id": jobId, "Stat": 1} for jobId in jobIds}
+
     def __job(self, nodes, dispatcher=None):
         jobs = []
 
@@ -71,6 +79,22 @@ class DeadlineDispatcherTest(GafferTest.TestCase):
 
         return jobs
 
+    @staticmethod
+    def __deadlineTaskFrames(job):
+        # Makes tasks from the job's Frames and ChunkSize the way Deadline does, cutting each
+        # frame range of the list into tasks of ChunkSize frames.
+        chunkSize = job.getJobProperties()["ChunkSize"]
+        tasks = []
+        for frameRange in job.getJobProperties()["Frames"].split(","):
+            frameRange, _, step = frameRange.partition("x")
+            start, _, end = frameRange.partition("-")
+            frames = list(range(int(start), int(end or start) + 1, int(step or 1)))
+            for i in range(0, len(frames), chunkSize):
+                chunk = frames[i:i + chunkSize]
+                tasks.append((chunk[0], chunk[-1]))
+
+        return tasks
+
     def __debugPrintDependencies(self, dependencies):
         for d in dependencies.values():
             print(
@@ -250,6 +274,969 @@ class DeadlineDispatcherTest(GafferTest.TestCase):
         self.assertEqual(len(jobs[-1].getParentJobs()[0].getParentJobs()), 1)
         self.assertEqual(len(jobs[-1].getParentJobs()[0].getParentJobs()[0].getParentJobs()), 0)
 
+    def testSubmissionWaves(self):
+        #   n1
+        #  / \
+        # i1 i2
+        #  \ /
+        #   n2
+
+        s = Gaffer.ScriptNode()
+
+        s["n1"] = GafferDispatchTest.LoggingTaskNode()
+        s["i1"] = GafferDispatchTest.LoggingTaskNode()
+        s["i1"]["preTasks"][0].setInput(s["n1"]["task"])
+        s["i2"] = GafferDispatchTest.LoggingTaskNode()
+        s["i2"]["preTasks"][0].setInput(s["n1"]["task"])
+        s["n2"] = GafferDispatchTest.LoggingTaskNode()
+        s["n2"]["preTasks"][0].setInput(s["i1"]["task"])
+        s["n2"]["preTasks"][1].setInput(s["i2"]["task"])
+        s["n2"]["dispatcher"]["deadline"]["dependencyMode"].setValue("Job")
+
+        submitted = []
+
+        def submitJob(payload):
+            submitted.append(payload["JobInfo"]["Name"])
+            return ("{}ID".format(payload["JobInfo"]["Name"]), "testMessage")
+
+        with mock.patch(
+            "GafferDeadline.DeadlineTools.submitJob",
+            side_effect=submitJob
+        ):
+            jobs = self.__job([s["n2"]])
+
+        self.assertEqual(len(jobs), 4)
+        self.assertEqual(submitted[0], "n1")
+        self.assertEqual(set(submitted[1:3]), {"i1", "i2"})
+        self.assertEqual(submitted[3], "n2")
+
+        self.assertEqual(jobs[-1].getJobID(), "n2ID")
+        self.assertEqual(
+            set(jobs[-1].getJobProperties()["JobDependencies"].split(",")),
+            {"i1ID", "i2ID"}
+        )
+
+    def testIncrementalDispatch(self):
+        # n1
+        # |
+        # n2
+        s = Gaffer.ScriptNode()
+
+        s["n1"] = GafferDispatchTest.LoggingTaskNode()
+        s["n2"] = GafferDispatchTest.LoggingTaskNode()
+        s["n2"]["preTasks"][0].setInput(s["n1"]["task"])
+        s["n2"]["dispatcher"]["deadline"]["dependencyMode"].setValue("Job")
+
+        dispatcher = self.__dispatcher()
+        dispatcher["incremental"].setValue(True)
+
+        submitted = []
+
+        def submitJob(payload):
+            submitted.append(payload["JobInfo"]["Name"])
+            return ("{}ID{}".format(payload["JobInfo"]["Name"], len(submitted)), "testMessage")
+
+        def getJobs(jobIds):
+            return {i: {"_id": i, "Stat": 1} for i in jobIds}
+
+        def dispatch():
+            del submitted[:]
+            with mock.patch(
+                "GafferDeadline.DeadlineTools.submitJob",
+                side_effect=submitJob
+            ), mock.patch(
+                "GafferDeadline.DeadlineTools.getJobs",
+                side_effect=getJobs
+            ):
+                return self.__job([s["n2"]], dispatcher)
+
+        dispatch()
+        self.assertEqual(submitted, ["n1", "n2"])
+        self.assertTrue(
+            os.path.isfile(
+                os.path.join(
+                    os.path.dirname(os.path.normpath(str(dispatcher.jobDirectory()))),
+                    GafferDeadline.DispatchManifest.fileName
+                )
+            )
+        )
+
+        # Nothing changed, so nothing is submitted
+        jobs = dispatch()
+        self.assertEqual(submitted, [])
+        self.assertEqual([j.getJobID() for j in jobs], ["n1ID1", "n2ID2"])
+
+        # Only the changed job is submitted, still depending on the reused upstream job
+        s["n2"]["dispatcher"]["deadline"]["comment"].setValue("changed")
+        jobs = dispatch()
+        self.assertEqual(submitted, ["n2"])
+        self.assertEqual(jobs[-1].getJobProperties()["JobDependencies"], "n1ID1")
+
+        # Failed jobs are submitted again
+        with mock.patch(
+            "GafferDeadline.DeadlineTools.submitJob",
+            side_effect=submitJob
+        ), mock.patch(
+            "GafferDeadline.DeadlineTools.getJobs",
+            return_value={"n1ID1": {"_id": "n1ID1", "Stat": 4}}
+        ):
+            del submitted[:]
+            self.__job([s["n2"]], dispatcher)
+        self.assertEqual(submitted, ["n1", "n2"])
+
+    def testBackgroundDispatch(self):
+        # n1
+        # |
+        # n2
+        s = Gaffer.ScriptNode()
+
+        s["n1"] = GafferDispatchTest.LoggingTaskNode()
+        s["n2"] = GafferDispatchTest.LoggingTaskNode()
+        s["n2"]["preTasks"][0].setInput(s["n1"]["task"])
+
+        dispatcher = self.__dispatcher()
+
+        progress = []
+        finished = []
+        submitted = []
+        postDispatched = []
+
+        c1 = GafferDeadline.DeadlineDispatcher.submittedSignal().connect(
+            lambda d, j, status: submitted.append((d, j, status)),
+            scoped=True
+        )
+        c2 = GafferDispatch.Dispatcher.postDispatchSignal().connect(
+            lambda d, nodes, success: postDispatched.append(list(submitted)),
+            scoped=True
+        )
+
+        with mock.patch(
+            "GafferDeadline.DeadlineTools.submitJob",
+            return_value=("testID", "testMessage")
+        ):
+            backgroundDispatch = dispatcher.dispatchInBackground(
+                [s["n2"]],
+                resultCallback=finished.append
+            )
+            c = backgroundDispatch.progressSignal().connect(
+                lambda d, p, m: progress.append(p),
+                scoped=True
+            )
+            jobs = backgroundDispatch.result(timeout=10)
+
+        # Gaffer's postDispatchSignal is emitted when `dispatch()` returns, while the
+        # submittedSignal waits for the jobs to be submitted.
+        self.assertEqual(len(postDispatched), 1)
+        self.assertEqual(submitted, [(dispatcher, jobs, "submitted")])
+        self.assertEqual(backgroundDispatch.status(), "submitted")
+        self.assertIs(backgroundDispatch.jobs(), jobs)
+
+        self.assertTrue(backgroundDispatch.done())
+        self.assertFalse(backgroundDispatch.cancelled())
+        self.assertIs(dispatcher.backgroundDispatch(), backgroundDispatch)
+        self.assertEqual(finished, [backgroundDispatch])
+        self.assertEqual(
+            [j.getGafferNode() for j in jobs if j.getJobID() is not None],
+            [s["n2"], s["n1"]]
+        )
+        self.assertTrue(os.path.isfile(jobs[-1].getPluginProperties()["ScriptFile"]))
+        if progress:
+            self.assertEqual(progress[-1], 1.0)
+
+        # Callbacks added after the dispatch finished are called straight away
+        backgroundDispatch.addDoneCallback(finished.append)
+        self.assertEqual(len(finished), 2)
+
+    def testSubmittedSignal(self):
+        s = Gaffer.ScriptNode()
+        s["n"] = GafferDispatchTest.LoggingTaskNode()
+
+        submitted = []
+        c = GafferDeadline.DeadlineDispatcher.submittedSignal().connect(
+            lambda d, j, status: submitted.append((j, status)),
+            scoped=True
+        )
+
+        dispatcher = self.__dispatcher()
+        with mock.patch(
+            "GafferDeadline.DeadlineTools.submitJob",
+            return_value=("testID", "testMessage")
+        ):
+            dispatcher.dispatch([s["n"]])
+
+        self.assertEqual(len(submitted), 1)
+        self.assertEqual(submitted[0][1], "submitted")
+        self.assertIn("testID", [j.getJobID() for j in submitted[0][0]])
+
+        # Failed background submissions are reported with their status
+        del submitted[:]
+        with mock.patch(
+            "GafferDeadline.DeadlineTools.submitJob",
+            return_value=(None, "testError")
+        ):
+            backgroundDispatch = dispatcher.dispatchInBackground([s["n"]])
+            self.assertRaises(RuntimeError, backgroundDispatch.result, 10)
+
+        self.assertEqual(submitted, [(None, "failed")])
+        self.assertEqual(backgroundDispatch.status(), "failed")
+        self.assertIsNone(backgroundDispatch.jobs())
+
+    def testResumeDispatch(self):
+        # n1
+        # |
+        # n2
+        s = Gaffer.ScriptNode()
+
+        s["n1"] = GafferDispatchTest.LoggingTaskNode()
+        s["n2"] = GafferDispatchTest.LoggingTaskNode()
+        s["n2"]["preTasks"][0].setInput(s["n1"]["task"])
+        s["n2"]["dispatcher"]["deadline"]["dependencyMode"].setValue("Job")
+
+        dispatcher = self.__dispatcher()
+        resumePath = os.path.join(
+            os.path.dirname(os.path.normpath(str(dispatcher.jobDirectory()))),
+            "deadlineDispatchResume.json"
+        )
+
+        tokens = {}
+        submitted = []
+        failures = ["n2"]
+
+        def submitJob(payload):
+            name = payload["JobInfo"]["Name"]
+            tokens[name] = GafferDeadline.DeadlineTools.submissionToken(payload)
+            if name in failures:
+                failures.remove(name)
+                raise RuntimeError("Web Service unavailable")
+            submitted.append(name)
+            return ("{}ID{}".format(name, len(submitted)), "testMessage")
+
+        # The downstream job fails to submit, leaving the upstream job on the farm
+        with mock.patch(
+            "GafferDeadline.DeadlineTools.submitJob",
+            side_effect=submitJob
+        ):
+            self.assertRaises(RuntimeError, dispatcher.dispatch, [s["n2"]])
+
+        self.assertEqual(submitted, ["n1"])
+        self.assertTrue(os.path.isfile(resumePath))
+        self.assertFalse(os.path.exists(resumePath + ".lock"))
+        dispatchToken, n1Hash = tokens["n1"].split(":")
+
+        # The upstream job's ID is recorded, and the downstream job may or may not exist
+        with open(resumePath) as f:
+            resume = json.load(f)
+        self.assertEqual(resume["submissionToken"], dispatchToken)
+        self.assertEqual(resume["submittedJobs"], {n1Hash: "n1ID1"})
+        self.assertEqual(resume["pendingJobs"], [tokens["n2"].split(":")[1]])
+
+        # Dispatching again picks up the upstream job instead of submitting it twice
+        del submitted[:]
+
+        def getSubmittedJobs(token):
+            self.assertEqual(token, dispatchToken)
+            return {n1Hash: {"_id": "n1ID1"}}
+
+        with mock.patch(
+            "GafferDeadline.DeadlineTools.submitJob",
+            side_effect=submitJob
+        ), mock.patch(
+            "GafferDeadline.DeadlineTools.getSubmittedJobs",
+            side_effect=getSubmittedJobs
+        ) as getSubmittedJobsMock:
+            jobs = self.__job([s["n2"]], dispatcher)
+
+        self.assertEqual(getSubmittedJobsMock.call_count, 1)
+        self.assertEqual(submitted, ["n2"])
+        self.assertEqual(tokens["n2"].split(":")[0], dispatchToken)
+        self.assertEqual([j.getJobID() for j in jobs], ["n1ID1", "n2ID1"])
+        self.assertEqual(jobs[-1].getJobProperties()["JobDependencies"], "n1ID1")
+        self.assertFalse(os.path.exists(resumePath))
+
+        # A finished dispatch isn't resumed, and gets a new token
+        del submitted[:]
+        with mock.patch(
+            "GafferDeadline.DeadlineTools.submitJob",
+            side_effect=submitJob
+        ), mock.patch(
+            "GafferDeadline.DeadlineTools.getSubmittedJobs"
+        ) as getSubmittedJobsMock:
+            self.__job([s["n2"]], dispatcher)
+
+        self.assertEqual(getSubmittedJobsMock.call_count, 0)
+        self.assertEqual(submitted, ["n1", "n2"])
+        self.assertNotEqual(tokens["n1"].split(":")[0], dispatchToken)
+
+    def testResumeKnownJobs(self):
+        # n1
+        # |
+        # n2
+        s = Gaffer.ScriptNode()
+
+        s["n1"] = GafferDispatchTest.LoggingTaskNode()
+        s["n2"] = GafferDispatchTest.LoggingTaskNode()
+        s["n2"]["preTasks"][0].setInput(s["n1"]["task"])
+        s["n2"]["dispatcher"]["deadline"]["dependencyMode"].setValue("Job")
+
+        dispatcher = self.__dispatcher()
+        resumePath = os.path.join(
+            os.path.dirname(os.path.normpath(str(dispatcher.jobDirectory()))),
+            "deadlineDispatchResume.json"
+        )
+
+        tokens = {}
+        submitted = []
+        failures = ["n2"]
+
+        def submitJob(payload):
+            name = payload["JobInfo"]["Name"]
+            tokens[name] = GafferDeadline.DeadlineTools.submissionToken(payload)
+            if name in failures:
+                failures.remove(name)
+                raise RuntimeError("Web Service unavailable")
+            submitted.append(name)
+            return ("{}ID{}".format(name, len(submitted)), "testMessage")
+
+        with mock.patch(
+            "GafferDeadline.DeadlineTools.submitJob",
+            side_effect=submitJob
+        ):
+            self.assertRaises(RuntimeError, dispatcher.dispatch, [s["n2"]])
+
+        # Interrupted between the waves, so every submitted job has a known ID
+        with open(resumePath) as f:
+            resume = json.load(f)
+        resume["pendingJobs"] = []
+        with open(resumePath, "w") as f:
+            json.dump(resume, f)
+
+        dispatchToken, n1Hash = tokens["n1"].split(":")
+
+        def getSubmittedJobs(token, jobIds=None):
+            self.assertEqual(token, dispatchToken)
+            # Only the recorded jobs are fetched instead of searching the whole farm
+            self.assertEqual(jobIds, ["n1ID1"])
+            return {n1Hash: {"_id": "n1ID1"}}
+
+        with mock.patch(
+            "GafferDeadline.DeadlineTools.submitJob",
+            side_effect=submitJob
+        ), mock.patch(
+            "GafferDeadline.DeadlineTools.getSubmittedJobs",
+            side_effect=getSubmittedJobs
+        ) as getSubmittedJobsMock:
+            jobs = self.__job([s["n2"]], dispatcher)
+
+        self.assertEqual(getSubmittedJobsMock.call_count, 1)
+        self.assertEqual(submitted, ["n1", "n2"])
+        self.assertEqual([j.getJobID() for j in jobs], ["n1ID1", "n2ID2"])
+        self.assertFalse(os.path.exists(resumePath))
+
+    def testResumeFileLocked(self):
+        s = Gaffer.ScriptNode()
+        s["n"] = GafferDispatchTest.LoggingTaskNode()
+
+        dispatcher = self.__dispatcher()
+        resumePath = os.path.join(
+            os.path.dirname(os.path.normpath(str(dispatcher.jobDirectory()))),
+            "deadlineDispatchResume.json"
+        )
+        os.makedirs(os.path.dirname(resumePath))
+        resume = {"submissionToken": "running", "submittedJobs": {}, "pendingJobs": ["a"]}
+        with open(resumePath, "w") as f:
+            json.dump(resume, f)
+        # Held by a dispatch that is still running
+        with open(resumePath + ".lock", "w") as f:
+            json.dump({"host": socket.gethostname(), "pid": os.getpid()}, f)
+
+        tokens = []
+
+        def submitJob(payload):
+            tokens.append(GafferDeadline.DeadlineTools.submissionToken(payload))
+            return ("testID", "testMessage")
+
+        with mock.patch(
+            "GafferDeadline.DeadlineTools.submitJob",
+            side_effect=submitJob
+        ), mock.patch(
+            "GafferDeadline.DeadlineTools.getSubmittedJobs"
+        ) as getSubmittedJobsMock:
+            self.__job([s["n"]], dispatcher)
+
+        # The running dispatch's token and resume file are left alone
+        self.assertEqual(getSubmittedJobsMock.call_count, 0)
+        self.assertNotEqual(tokens[0].split(":")[0], "running")
+        with open(resumePath) as f:
+            self.assertEqual(json.load(f), resume)
+        self.assertTrue(os.path.exists(resumePath + ".lock"))
+
+    def testStaleResumeFile(self):
+        s = Gaffer.ScriptNode()
+        s["n"] = GafferDispatchTest.LoggingTaskNode()
+
+        dispatcher = self.__dispatcher()
+        resumePath = os.path.join(
+            os.path.dirname(os.path.normpath(str(dispatcher.jobDirectory()))),
+            "deadlineDispatchResume.json"
+        )
+        os.makedirs(os.path.dirname(resumePath))
+        with open(resumePath, "w") as f:
+            json.dump({"submissionToken": "old", "submittedJobs": {}, "pendingJobs": None}, f)
+        # Left by a dispatch on another machine that died two days ago
+        with open(resumePath + ".lock", "w") as f:
+            json.dump({"host": "elsewhere", "pid": 1}, f)
+        twoDaysAgo = time.time() - 2 * 24 * 60 * 60
+        for path in (resumePath, resumePath + ".lock"):
+            os.utime(path, (twoDaysAgo, twoDaysAgo))
+
+        tokens = []
+
+        def submitJob(payload):
+            tokens.append(GafferDeadline.DeadlineTools.submissionToken(payload))
+            return ("testID", "testMessage")
+
+        with mock.patch(
+            "GafferDeadline.DeadlineTools.submitJob",
+            side_effect=submitJob
+        ), mock.patch(
+            "GafferDeadline.DeadlineTools.getSubmittedJobs"
+        ) as getSubmittedJobsMock:
+            self.__job([s["n"]], dispatcher)
+
+        # The farm isn't searched for the old dispatch's jobs
+        self.assertEqual(getSubmittedJobsMock.call_count, 0)
+        self.assertNotEqual(tokens[0].split(":")[0], "old")
+        self.assertFalse(os.path.exists(resumePath))
+        self.assertFalse(os.path.exists(resumePath + ".lock"))
+
+    def testDryRun(self):
+        # n1
+        # |
+        # n2
+        s = Gaffer.ScriptNode()
+
+        s["n1"] = GafferDispatchTest.LoggingTaskNode()
+        s["n1"]["frame"] = Gaffer.StringPlug(
+            defaultValue="${frame}",
+            flags=Gaffer.Plug.Flags.Default | Gaffer.Plug.Flags.Dynamic
+        )
+        s["n1"]["dispatcher"]["batchSize"].setValue(5)
+        s["n2"] = GafferDispatchTest.LoggingTaskNode()
+        s["n2"]["frame"] = Gaffer.StringPlug(
+            defaultValue="${frame}",
+            flags=Gaffer.Plug.Flags.Default | Gaffer.Plug.Flags.Dynamic
+        )
+        s["n2"]["dispatcher"]["batchSize"].setValue(10)
+        s["n2"]["preTasks"][0].setInput(s["n1"]["task"])
+        s["n2"]["dispatcher"]["deadline"]["dependencyMode"].setValue("Job")
+
+        dispatcher = self.__dispatcher()
+        dispatcher["framesMode"].setValue(dispatcher.FramesMode.CustomRange)
+        dispatcher["frameRange"].setValue("1-10")
+        dispatcher["incremental"].setValue(True)
+        dispatcher["dryRun"].setValue(True)
+
+        with mock.patch(
+            "GafferDeadline.DeadlineTools.getWebServiceSettings",
+            side_effect=RuntimeError("Dry runs don't need the Web Service")
+        ):
+            jobs = self.__job([s["n2"]], dispatcher)
+
+        self.assertEqual([j.getJobID() for j in jobs], ["dryrun000001", "dryrun000002"])
+        self.assertFalse(GafferDeadline.DeadlineTools.getTransport().isDryRun)
+
+        dryRunDirectory = dispatcher.jobDirectory() / "dryRun"
+        with open(dryRunDirectory / "dryrun000002.json") as f:
+            self.assertEqual(json.load(f)["JobInfo"]["JobDependencies"], "dryrun000001")
+
+        with open(dryRunDirectory / "dispatchPlan.json") as f:
+            plan = json.load(f)
+
+        self.assertEqual(plan["jobCount"], 2)
+        self.assertEqual(plan["taskCount"], 3)
+        self.assertEqual(plan["frameCount"], 20)
+        self.assertEqual(
+            [(j["node"], j["taskCount"], j["upstreamJobIds"]) for j in plan["jobs"]],
+            [("n1", 2, []), ("n2", 1, ["dryrun000001"])]
+        )
+        self.assertEqual(plan["jobs"][1]["dependencyType"], "JobToJob")
+
+        # Nothing is recorded for later dispatches
+        jobsDirectory = os.path.dirname(os.path.normpath(str(dispatcher.jobDirectory())))
+        self.assertFalse(
+            os.path.exists(os.path.join(jobsDirectory, GafferDeadline.DispatchManifest.fileName))
+        )
+        self.assertFalse(
+            os.path.exists(os.path.join(jobsDirectory, "deadlineDispatchResume.json"))
+        )
+
+    def testBackgroundDispatchCancellation(self):
+        # n1
+        # |
+        # n2
+        s = Gaffer.ScriptNode()
+
+        s["n1"] = GafferDispatchTest.LoggingTaskNode()
+        s["n2"] = GafferDispatchTest.LoggingTaskNode()
+        s["n2"]["preTasks"][0].setInput(s["n1"]["task"])
+
+        dispatcher = self.__dispatcher()
+
+        # Cancel as soon as the first job is spooled, so the downstream job is never submitted
+        def cancel(dispatcher, job):
+            dispatcher.backgroundDispatch().cancel()
+
+        c = GafferDeadline.DeadlineDispatcher.preSpoolSignal().connect(cancel, scoped=True)
+
+        with mock.patch(
+            "GafferDeadline.DeadlineTools.submitJob",
+            return_value=("testID", "testMessage")
+        ) as submitJob:
+            backgroundDispatch = dispatcher.dispatchInBackground([s["n2"]])
+            self.assertRaises(IECore.Cancelled, backgroundDispatch.result, 10)
+
+        self.assertTrue(backgroundDispatch.cancelled())
+        self.assertEqual(submitJob.call_count, 0)
+
+    def testDispatchTrace(self):
+        # n1
+        # |
+        # n2
+        s = Gaffer.ScriptNode()
+
+        s["n1"] = GafferDispatchTest.LoggingTaskNode()
+        s["n2"] = GafferDispatchTest.LoggingTaskNode()
+        s["n2"]["preTasks"][0].setInput(s["n1"]["task"])
+
+        dispatcher = self.__dispatcher()
+
+        with mock.patch.dict(os.environ, {"GAFFERDEADLINE_TRACE": ""}), mock.patch(
+            "GafferDeadline.DeadlineTools.submitJob",
+            return_value=("testID", "testMessage")
+        ):
+            dispatcher.dispatch([s["n2"]])
+        self.assertFalse(
+            os.path.exists(dispatcher.jobDirectory() / GafferDeadline.DispatchTrace.fileName)
+        )
+
+        with mock.patch.dict(os.environ, {"GAFFERDEADLINE_TRACE": "chrome"}), mock.patch(
+            "GafferDeadline.DeadlineTools.submitJob",
+            return_value=("testID", "testMessage")
+        ):
+            dispatcher.dispatch([s["n2"]])
+
+        self.assertIsNone(GafferDeadline.DispatchTrace.active())
+
+        with open(dispatcher.jobDirectory() / GafferDeadline.DispatchTrace.fileName) as f:
+            trace = json.load(f)
+
+        names = [e["name"] for e in trace["traceEvents"]]
+        for name in ["serialiseScript", "buildJobTree", "prepareJob", "dependencies", "submitWave"]:
+            self.assertIn(name, names)
+        self.assertEqual(names.count("submitJob"), 2)
+
+    def testScriptStore(self):
+        s = Gaffer.ScriptNode()
+        s["n"] = GafferDispatchTest.LoggingTaskNode()
+
+        dispatcher = self.__dispatcher()
+
+        def scriptFile():
+            with mock.patch(
+                "GafferDeadline.DeadlineTools.submitJob",
+                return_value=("testID", "testMessage")
+            ):
+                jobs = self.__job([s["n"]], dispatcher)
+            return jobs[0].getPluginProperties()["ScriptFile"]
+
+        # An unchanged script is shared between dispatches
+        first = scriptFile()
+        self.assertTrue(os.path.isfile(first))
+        self.assertEqual(os.path.basename(first), "untitled.gfr")
+        modified = os.path.getmtime(first)
+        self.assertEqual(scriptFile(), first)
+        self.assertEqual(os.path.getmtime(first), modified)
+
+        # Changes to the script are stored separately
+        s["n"]["dispatcher"]["deadline"]["comment"].setValue("changed")
+        second = scriptFile()
+        self.assertNotEqual(second, first)
+        self.assertTrue(os.path.isfile(first))
+        self.assertTrue(os.path.isfile(second))
+
+        with mock.patch.dict(
+            os.environ,
+            {"GAFFERDEADLINE_SCRIPT_STORE": str(self.temporaryDirectory() / "scriptStore")}
+        ):
+            self.assertTrue(scriptFile().startswith(str(self.temporaryDirectory() / "scriptStore")))
+
+    def testReuseScript(self):
+        s = Gaffer.ScriptNode()
+        s["n1"] = GafferDispatchTest.LoggingTaskNode()
+        s["n2"] = GafferDispatchTest.LoggingTaskNode()
+
+        dispatcher = self.__dispatcher()
+        self.assertFalse(dispatcher.getReuseScript())
+        dispatcher.setReuseScript(True)
+
+        addScript = GafferDeadline.ScriptStore.addScript
+        with mock.patch.object(
+            GafferDeadline.ScriptStore, "addScript", autospec=True, side_effect=addScript
+        ) as addScriptMock, mock.patch(
+            "GafferDeadline.DeadlineTools.submitJob",
+            return_value=("testID", "testMessage")
+        ):
+            jobs1 = self.__job([s["n1"]], dispatcher)
+            jobs2 = self.__job([s["n2"]], dispatcher)
+            self.assertEqual(addScriptMock.call_count, 1)
+            self.assertEqual(
+                jobs1[0].getPluginProperties()["ScriptFile"],
+                jobs2[0].getPluginProperties()["ScriptFile"]
+            )
+
+            # Other scripts are serialised as usual
+            s2 = Gaffer.ScriptNode()
+            s2["n"] = GafferDispatchTest.LoggingTaskNode()
+            self.__job([s2["n"]], dispatcher)
+            self.assertEqual(addScriptMock.call_count, 2)
+
+            dispatcher.setReuseScript(False)
+            self.__job([s["n1"]], dispatcher)
+            self.assertEqual(addScriptMock.call_count, 3)
+
+    def testPersistentWorker(self):
+        s = Gaffer.ScriptNode()
+        s["n"] = GafferDispatchTest.LoggingTaskNode()
+
+        with mock.patch(
+            "GafferDeadline.DeadlineTools.submitJob",
+            return_value=("testID", "testMessage")
+        ):
+            jobs = self.__job([s["n"]])
+        self.assertEqual(jobs[0].getPluginProperties()["PersistentWorker"], False)
+
+        s["n"]["dispatcher"]["deadline"]["persistentWorker"].setValue(True)
+        with mock.patch(
+            "GafferDeadline.DeadlineTools.submitJob",
+            return_value=("testID", "testMessage")
+        ):
+            jobs = self.__job([s["n"]])
+        self.assertEqual(jobs[0].getPluginProperties()["PersistentWorker"], True)
+
+    def testSubmissionOverrides(self):
+        s = Gaffer.ScriptNode()
+        s["n1"] = GafferDispatchTest.LoggingTaskNode()
+        s["n2"] = GafferDispatchTest.LoggingTaskNode()
+        s["n2"]["preTasks"][0].setInput(s["n1"]["task"])
+        s["n2"]["dispatcher"]["deadline"]["pool"].setValue("pool")
+        s["n2"]["dispatcher"]["deadline"]["limits"].setValue("limitA")
+
+        overrides = GafferDeadline.SubmissionOverrides()
+        overrides.setDeadlineSetting("priority", 80)
+        overrides.setDeadlineSetting("pool", "${render:shot}", s["n1"])
+        overrides.setDeadlineSetting("limits", "limitB", s["n2"])
+        overrides.addEnvironmentVariable("TEST_VARIABLE", "test", s["n1"])
+        overrides.setContextVariable("render:shot", "sh010")
+
+        dispatcher = self.__dispatcher()
+        dispatcher.setSubmissionOverrides(overrides)
+        self.assertIs(dispatcher.getSubmissionOverrides(), overrides)
+
+        with mock.patch(
+            "GafferDeadline.DeadlineTools.submitJob",
+            return_value=("testID", "testMessage")
+        ):
+            jobs = {j.getGafferNode().getName(): j for j in self.__job([s["n2"]], dispatcher)}
+
+        self.assertEqual(jobs["n1"].getJobProperties()["Priority"], 80)
+        self.assertEqual(jobs["n2"].getJobProperties()["Priority"], 80)
+        self.assertEqual(jobs["n1"].getJobProperties()["Pool"], "sh010")
+        self.assertEqual(jobs["n2"].getJobProperties()["Pool"], "pool")
+        self.assertEqual(jobs["n1"].getJobProperties()["LimitGroups"], "")
+        self.assertEqual(jobs["n2"].getJobProperties()["LimitGroups"], "limitB")
+        self.assertEqual(jobs["n1"].getEnvironmentVariables()["TEST_VARIABLE"], "test")
+        self.assertNotIn("TEST_VARIABLE", jobs["n2"].getEnvironmentVariables())
+
+        for job in jobs.values():
+            self.assertEqual(job.getContext()["render:shot"], "sh010")
+            self.assertIn("\"-render:shot\"", job.getPluginProperties()["Context"])
+
+        # The script is left untouched
+        self.assertEqual(s["n1"]["dispatcher"]["deadline"]["priority"].getValue(), 50)
+        self.assertEqual(s["n2"]["dispatcher"]["deadline"]["limits"].getValue(), "limitA")
+        self.assertEqual(len(s["n1"]["dispatcher"]["deadline"]["environmentVariables"]), 0)
+        self.assertFalse(s.undoAvailable())
+
+    def testContextVariableOverridesScriptVariable(self):
+        s = Gaffer.ScriptNode()
+        s["variables"].addChild(
+            Gaffer.NameValuePlug(
+                "render:shot",
+                Gaffer.StringPlug(
+                    "value",
+                    defaultValue="",
+                    flags=Gaffer.Plug.Flags.Default | Gaffer.Plug.Flags.Dynamic
+                ),
+                True,
+                "renderShot",
+                Gaffer.Plug.Flags.Default | Gaffer.Plug.Flags.Dynamic
+            )
+        )
+        self.assertEqual(s.context()["render:shot"], "")
+
+        s["n"] = GafferDispatchTest.LoggingTaskNode()
+        s["n"]["frame"] = Gaffer.StringPlug(
+            defaultValue="${frame}",
+            flags=Gaffer.Plug.Flags.Default | Gaffer.Plug.Flags.Dynamic
+        )
+        # The batch size is evaluated while batching, so it only sees the shot if the
+        # variable is set before then.
+        s["e"] = Gaffer.Expression()
+        s["e"].setExpression(
+            'parent["n"]["dispatcher"]["batchSize"] = '
+            '5 if context.get("render:shot", "") == "sh010" else 1'
+        )
+
+        overrides = GafferDeadline.SubmissionOverrides()
+        overrides.setContextVariable("render:shot", "sh010")
+
+        dispatcher = self.__dispatcher()
+        dispatcher["framesMode"].setValue(dispatcher.FramesMode.CustomRange)
+        dispatcher["frameRange"].setValue("1-10")
+        dispatcher.setSubmissionOverrides(overrides)
+
+        with s.context(), mock.patch(
+            "GafferDeadline.DeadlineTools.submitJob",
+            return_value=("testID", "testMessage")
+        ):
+            jobs = self.__job([s["n"]], dispatcher)
+
+        self.assertEqual(len(jobs), 1)
+        self.assertEqual(len(jobs[0].getTasks()), 2)
+        self.assertEqual(jobs[0].getContext()["render:shot"], "sh010")
+        self.assertIn("\"-render:shot\" \"'sh010'\"", jobs[0].getPluginProperties()["Context"])
+
+        # The script variable is left untouched
+        self.assertEqual(s.context()["render:shot"], "")
+        self.assertTrue(s["variables"]["renderShot"]["enabled"].getValue())
+
+    def testLimitGroups(self):
+        s = Gaffer.ScriptNode()
+        s["a"] = GafferTest.AddNode()
+        s["n1"] = GafferDispatchTest.LoggingTaskNode()
+        s["n1"]["user"]["x"] = Gaffer.IntPlug(flags=Gaffer.Plug.Flags.Default | Gaffer.Plug.Flags.Dynamic)
+        s["n1"]["user"]["x"].setInput(s["a"]["sum"])
+        s["n1"]["dispatcher"]["deadline"]["limits"].setValue("limitA")
+        s["n2"] = GafferDispatchTest.LoggingTaskNode()
+        s["n2"]["preTasks"][0].setInput(s["n1"]["task"])
+
+        overrides = GafferDeadline.SubmissionOverrides()
+        overrides.setLimitGroup("add", ["GafferTest::AddNode"])
+        overrides.setLimitGroup("unused", ["GafferTest::MultiplyNode"])
+
+        dispatcher = self.__dispatcher()
+        dispatcher.setSubmissionOverrides(overrides)
+
+        def limitGroups():
+            with mock.patch(
+                "GafferDeadline.DeadlineTools.submitJob",
+                return_value=("testID", "testMessage")
+            ):
+                jobs = self.__job([s["n2"]], dispatcher)
+            return {j.getGafferNode().getName(): j.getJobProperties()["LimitGroups"] for j in jobs}
+
+        # Only the job evaluating the AddNode gets the limit, not the jobs downstream of it.
+        self.assertEqual(limitGroups(), {"n1": "limitA,add", "n2": ""})
+
+        s["a"]["enabled"].setValue(False)
+        self.assertEqual(limitGroups(), {"n1": "limitA", "n2": ""})
+
+    def testLimitGroupsInJobContext(self):
+        s = Gaffer.ScriptNode()
+        s["a"] = GafferTest.AddNode()
+        s["e"] = Gaffer.Expression()
+        s["e"].setExpression(
+            'parent["a"]["enabled"] = context.get("wedge:value", "") == "on"'
+        )
+        s["n"] = GafferDispatchTest.LoggingTaskNode()
+        s["n"]["user"]["x"] = Gaffer.IntPlug(flags=Gaffer.Plug.Flags.Default | Gaffer.Plug.Flags.Dynamic)
+        s["n"]["user"]["x"].setInput(s["a"]["sum"])
+        s["n"]["dispatcher"]["deadline"]["comment"].setValue("${wedge:value}")
+
+        s["w"] = GafferDispatch.Wedge()
+        s["w"]["preTasks"][0].setInput(s["n"]["task"])
+        s["w"]["mode"].setValue(GafferDispatch.Wedge.Mode.StringList)
+        s["w"]["strings"].setValue(IECore.StringVectorData(["on", "off"]))
+
+        overrides = GafferDeadline.SubmissionOverrides()
+        overrides.setLimitGroup("add", ["GafferTest::AddNode"])
+
+        dispatcher = self.__dispatcher()
+        dispatcher.setSubmissionOverrides(overrides)
+
+        with mock.patch(
+            "GafferDeadline.DeadlineTools.submitJob",
+            return_value=("testID", "testMessage")
+        ):
+            jobs = self.__job([s["w"]], dispatcher)
+
+        # The AddNode is only enabled in the context of one of the wedged jobs
+        limitGroups = {
+            j.getJobProperties()["Comment"]: j.getJobProperties()["LimitGroups"]
+            for j in jobs if j.getGafferNode() == s["n"]
+        }
+        self.assertEqual(limitGroups, {"on": "add", "off": ""})
+
+    def testAdaptiveBatching(self):
+        s = Gaffer.ScriptNode()
+        s["n"] = GafferDispatchTest.LoggingTaskNode()
+        s["n"]["frame"] = Gaffer.StringPlug(
+            defaultValue="${frame}",
+            flags=Gaffer.Plug.Flags.Default | Gaffer.Plug.Flags.Dynamic
+        )
+        s["n"]["dispatcher"]["batchSize"].setValue(1)
+
+        dispatcher = self.__dispatcher()
+        dispatcher["framesMode"].setValue(dispatcher.FramesMode.CustomRange)
+        dispatcher["frameRange"].setValue("1-16")
+        dispatcher["adaptiveBatching"].setValue(True)
+        dispatcher["targetTaskDuration"].setValue(40.0)
+
+        def dispatch(tasks):
+            with mock.patch(
+                "GafferDeadline.DeadlineTools.submitJob",
+                return_value=("testID", "testMessage")
+            ), mock.patch(
+                "GafferDeadline.DeadlineTools.getJobs",
+                side_effect=self.__existingJobs
+            ), mock.patch(
+                "GafferDeadline.DeadlineTools.getJobTasks",
+                return_value=tasks
+            ):
+                return self.__job([s["n"]], dispatcher)
+
+        # Nothing is known about the node yet, so its batches are kept
+        jobs = dispatch([])
+        self.assertEqual(len(jobs[0].getTasks()), 16)
+
+        # The first job took 10s per frame
+        jobs = dispatch(
+            [
+                {
+                    "Frames": str(f),
+                    "Stat": 5,
+                    "StartRen": "2024-05-01T10:00:00Z",
+                    "Comp": "2024-05-01T10:00:10Z"
+                } for f in range(1, 17)
+            ]
+        )
+        self.assertEqual(
+            [(t.getStartFrame(), t.getEndFrame()) for t in jobs[0].getTasks()],
+            [(1, 4), (5, 8), (9, 12), (13, 16)]
+        )
+        self.assertEqual(jobs[0].getJobProperties()["ChunkSize"], 4)
+
+    def testTimingHistoryForgetsMissingJobs(self):
+        s = Gaffer.ScriptNode()
+        s["n"] = GafferDispatchTest.LoggingTaskNode()
+
+        dispatcher = self.__dispatcher()
+        dispatcher["adaptiveBatching"].setValue(True)
+
+        history = GafferDeadline.TaskTimingHistory(
+            os.path.dirname(os.path.normpath(str(dispatcher.jobDirectory())))
+        )
+        for jobId in ["deleted", "failed", "running"]:
+            history.addPendingJob("n", jobId)
+        history.save()
+
+        with mock.patch(
+            "GafferDeadline.DeadlineTools.submitJob",
+            return_value=("submitted", "testMessage")
+        ), mock.patch(
+            "GafferDeadline.DeadlineTools.getJobs",
+            return_value={
+                "failed": {"_id": "failed", "Stat": 4},
+                "running": {"_id": "running", "Stat": 1},
+            }
+        ), mock.patch(
+            "GafferDeadline.DeadlineTools.getJobTasks",
+            return_value=[{"Frames": "1", "Stat": 2}]
+        ) as getJobTasks:
+            self.__job([s["n"]], dispatcher)
+
+        # Only the job that can still report its timings is queried, and kept
+        self.assertEqual(getJobTasks.call_args_list, [mock.call("running")])
+        history = GafferDeadline.TaskTimingHistory(
+            os.path.dirname(os.path.normpath(str(dispatcher.jobDirectory())))
+        )
+        self.assertEqual(history.pendingJobs(), {"n": ["running", "submitted"]})
+
+    def testDeadlineTasksMatchFrames(self):
+        s = Gaffer.ScriptNode()
+        s["n"] = GafferDispatchTest.LoggingTaskNode()
+        s["n"]["frame"] = Gaffer.StringPlug(
+            defaultValue="${frame}",
+            flags=Gaffer.Plug.Flags.Default | Gaffer.Plug.Flags.Dynamic
+        )
+
+        dispatcher = self.__dispatcher()
+        dispatcher["framesMode"].setValue(dispatcher.FramesMode.CustomRange)
+
+        def dispatch(tasks=[]):
+            with mock.patch(
+                "GafferDeadline.DeadlineTools.submitJob",
+                return_value=("testID", "testMessage")
+            ), mock.patch(
+                "GafferDeadline.DeadlineTools.getJobs",
+                side_effect=self.__existingJobs
+            ), mock.patch(
+                "GafferDeadline.DeadlineTools.getJobTasks",
+                return_value=tasks
+            ):
+                jobs = self.__job([s["n"]], dispatcher)
+
+            job = [j for j in jobs if j.getGafferNode() == s["n"]][0]
+            self.assertEqual(
+                self.__deadlineTaskFrames(job),
+                [(t.getStartFrame(), t.getEndFrame()) for t in job.getTasks()]
+            )
+            return job
+
+        # Batches with different steps
+        dispatcher["frameRange"].setValue("1-9x2,10-12")
+        s["n"]["dispatcher"]["batchSize"].setValue(5)
+        job = dispatch()
+        self.assertEqual(len(job.getTasks()), 6)
+
+        # Batches regrouped into smaller tasks, once the frame times are known
+        dispatcher["frameRange"].setValue("1-20")
+        s["n"]["dispatcher"]["batchSize"].setValue(10)
+        dispatcher["adaptiveBatching"].setValue(True)
+        dispatcher["targetTaskDuration"].setValue(40.0)
+        dispatch()
+        job = dispatch(
+            [
+                {
+                    "Frames": str(f),
+                    "Stat": 5,
+                    "StartRen": "2024-05-01T10:00:00Z",
+                    "Comp": "2024-05-01T10:00:10Z"
+                } for f in range(1, 21)
+            ]
+        )
+        self.assertEqual(len(job.getTasks()), 5)
+        self.assertEqual(job.getJobProperties()["ChunkSize"], 4)
+
+        # Batches that don't divide into the task size
+        dispatcher["frameRange"].setValue("1-12")
+        s["n"]["dispatcher"]["batchSize"].setValue(5)
+        job = dispatch()
+        self.assertEqual(
+            [(t.getStartFrame(), t.getEndFrame()) for t in job.getTasks()],
+            [(1, 4), (5, 8), (9, 12)]
+        )
+
     def testOverrideNone(self):
         #   n1
         #   |
@@ -1218,6 +2205,94 @@ class DeadlineDispatcherTest(GafferTest.TestCase):
 
         self.assertEqual(jobs[0].getJobProperties()["Name"], "LittleDebbie")
 
+    def __wedgeScript(self, numJobs):
+        # One LoggingTaskNode job per wedge value, all feeding a shared downstream job.
+        s = Gaffer.ScriptNode()
+
+        s["n"] = GafferDispatchTest.LoggingTaskNode()
+        s["n"]["wedge"] = Gaffer.StringPlug(
+            defaultValue="${wedge:value}",
+            flags=Gaffer.Plug.Flags.Default | Gaffer.Plug.Flags.Dynamic
+        )
+
+        s["w"] = GafferDispatch.Wedge()
+        s["w"]["preTasks"][0].setInput(s["n"]["task"])
+        s["w"]["mode"].setValue(int(GafferDispatch.Wedge.Mode.IntRange))
+        s["w"]["intMin"].setValue(1)
+        s["w"]["intMax"].setValue(numJobs)
+        s["w"]["intStep"].setValue(1)
+
+        s["n2"] = GafferDispatchTest.LoggingTaskNode()
+        s["n2"]["preTasks"][0].setInput(s["w"]["task"])
+
+        return s
+
+    def testJobRegistry(self):
+        # Timings for large scripts are checked in PerformanceTest
+        s = self.__wedgeScript(100)
+        dispatcher = self.__dispatcher()
+
+        with mock.patch(
+            "GafferDeadline.DeadlineTools.submitJob",
+            return_value=("testID", "testMessage")
+        ):
+            jobs = self.__job([s["n2"]], dispatcher)
+
+        self.assertEqual(len(jobs), 101)
+        self.assertEqual(
+            len({j.getContext()["wedge:value"] for j in jobs if j.getGafferNode() == s["n"]}),
+            100
+        )
+
+        downstreamJob = [j for j in jobs if j.getGafferNode() == s["n2"]][0]
+        self.assertEqual(len(downstreamJob.getEffectiveParentJobs()), 100)
+
+    def testDependenciesThroughControlTask(self):
+        #   n1
+        #   |
+        #   t1 (TaskList)
+        #   |
+        #   n2
+        s = Gaffer.ScriptNode()
+
+        s["n1"] = GafferDispatchTest.LoggingTaskNode()
+        s["n1"]["frame"] = Gaffer.StringPlug(
+            defaultValue="${frame}",
+            flags=Gaffer.Plug.Flags.Default | Gaffer.Plug.Flags.Dynamic
+        )
+        s["n1"]["dispatcher"]["batchSize"].setValue(1)
+
+        s["t1"] = GafferDispatch.TaskList()
+        s["t1"]["preTasks"][0].setInput(s["n1"]["task"])
+
+        s["n2"] = GafferDispatchTest.LoggingTaskNode()
+        s["n2"]["frame"] = Gaffer.StringPlug(
+            defaultValue="${frame}",
+            flags=Gaffer.Plug.Flags.Default | Gaffer.Plug.Flags.Dynamic
+        )
+        s["n2"]["dispatcher"]["batchSize"].setValue(1)
+        s["n2"]["preTasks"][0].setInput(s["t1"]["task"])
+
+        dispatcher = self.__dispatcher()
+        dispatcher["framesMode"].setValue(dispatcher.FramesMode.CustomRange)
+        dispatcher["frameRange"].setValue("1-100")
+
+        with mock.patch(
+            "GafferDeadline.DeadlineTools.submitJob",
+            return_value=("testID", "testMessage")
+        ):
+            jobs = self.__job([s["n2"]], dispatcher)
+
+        job = [j for j in jobs if j.getGafferNode() == s["n2"]][0]
+        dependencies = job.getDependencies()
+
+        self.assertEqual(len(dependencies), 100)
+        for d in dependencies.values():
+            self.assertEqual(d.getDeadlineJob().getGafferNode(), s["n1"])
+            self.assertEqual(
+                d.getDeadlineTask().getStartFrame(),
+                d.getUpstreamDeadlineTask().getStartFrame()
+            )
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,191 @@
+##########################################################################
+#
+#  Copyright (c) 2019, Hypothetical Inc. All rights reserved.
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#      * Redistributions of source code must retain the above
+#        copyright notice, this list of conditions and the following
+#        disclaimer.
+#
+#      * Redistributions in binary form must reproduce the above
+#        copyright notice, this list of conditions and the following
+#        disclaimer in the documentation and/or other materials provided with
+#        the distribution.
+#
+#      * Neither the name of Hypothetical Inc. nor the names of
+#        any other contributors to this software may be used to endorse or
+#        promote products derived from this software without specific prior
+#        written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+#  IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+#  THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+#  PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+#  CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+#  EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+#  PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+#  PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+#  LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+#  NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+#  SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+##########################################################################
+
+import os
+import json
+import threading
+import unittest
+from unittest import mock
+
+import IECore
+
+import GafferTest
+
+import GafferDeadline
+
+
+class DeadlineListCacheTest(GafferTest.TestCase):
+
+    def setUp(self):
+        GafferTest.TestCase.setUp(self)
+
+        patcher = mock.patch(
+            "GafferDeadline.DeadlineTools.getWebServiceUrl",
+            return_value="http://deadlineA:8081"
+        )
+        self.__webServiceUrl = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def __path(self):
+        return os.path.join(self.temporaryDirectory(), "cache", "deadlineLists.json")
+
+    def testBackgroundRefresh(self):
+        cache = GafferDeadline.DeadlineListCache(self.__path(), ttl=60)
+
+        refreshed = threading.Event()
+        results = []
+
+        def callback(name, values):
+            results.append((name, values))
+            refreshed.set()
+
+        with mock.patch(
+            "GafferDeadline.DeadlineTools.getPools",
+            return_value=["poolA", "poolB"]
+        ) as getPools:
+            # Nothing is cached yet, so the first call returns straight away with no values
+            self.assertEqual(cache.values("pools", callback=callback), [])
+            self.assertTrue(refreshed.wait(10))
+
+            self.assertEqual(results, [("pools", ["poolA", "poolB"])])
+            self.assertEqual(cache.values("pools"), ["poolA", "poolB"])
+            self.assertFalse(cache.isStale("pools"))
+            self.assertEqual(getPools.call_count, 1)
+
+        # Other sessions share the cached lists
+        otherCache = GafferDeadline.DeadlineListCache(self.__path(), ttl=60)
+        with mock.patch("GafferDeadline.DeadlineTools.getPools") as getPools:
+            self.assertEqual(otherCache.values("pools"), ["poolA", "poolB"])
+        self.assertEqual(getPools.call_count, 0)
+
+    def testStaleValues(self):
+        cache = GafferDeadline.DeadlineListCache(self.__path(), ttl=60)
+        with mock.patch("GafferDeadline.DeadlineTools.getGroups", return_value=["groupA"]):
+            self.assertEqual(cache.fetch("groups"), ["groupA"])
+
+        cache.invalidate()
+        self.assertTrue(cache.isStale("groups"))
+
+        with mock.patch(
+            "GafferDeadline.DeadlineTools.getGroups",
+            return_value=["groupA", "groupB"]
+        ):
+            # Stale values are returned while the new ones are fetched
+            self.assertEqual(cache.values("groups"), ["groupA"])
+            cache.refresh("groups").join()
+
+        self.assertEqual(cache.values("groups"), ["groupA", "groupB"])
+
+        # A failed refresh keeps the old values
+        cache.invalidate()
+        # Message handlers are scoped per thread, so the warning from the refresh thread is
+        # checked by patching `IECore.msg` instead.
+        with mock.patch("IECore.msg") as msg, mock.patch(
+            "GafferDeadline.DeadlineTools.getGroups",
+            side_effect=RuntimeError("Web Service unavailable")
+        ):
+            cache.refresh("groups").join()
+
+        self.assertEqual(msg.call_count, 1)
+        self.assertEqual(msg.call_args[0][0], IECore.Msg.Level.Warning)
+        self.assertEqual(cache.values("groups", refresh=False), ["groupA", "groupB"])
+
+    def testSharedRefresh(self):
+        cache = GafferDeadline.DeadlineListCache(self.__path(), ttl=60)
+
+        release = threading.Event()
+
+        def getMachineList():
+            release.wait(10)
+            return ["machineA"]
+
+        with mock.patch(
+            "GafferDeadline.DeadlineTools.getMachineList",
+            side_effect=getMachineList
+        ) as getMachineListMock:
+            threads = [cache.refresh("slaves") for i in range(0, 5)]
+            release.set()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(len(set(threads)), 1)
+        self.assertEqual(getMachineListMock.call_count, 1)
+        self.assertEqual(cache.values("slaves", refresh=False), ["machineA"])
+
+    def testSaveKeepsOtherLists(self):
+        cacheA = GafferDeadline.DeadlineListCache(self.__path(), ttl=60)
+        cacheB = GafferDeadline.DeadlineListCache(self.__path(), ttl=60)
+
+        with mock.patch("GafferDeadline.DeadlineTools.getPools", return_value=["poolA"]):
+            cacheA.fetch("pools")
+        with mock.patch("GafferDeadline.DeadlineTools.getLimitGroups", return_value=["limitA"]):
+            cacheB.fetch("limits")
+
+        with open(self.__path()) as f:
+            lists = json.load(f)
+        self.assertEqual(lists["http://deadlineA:8081"]["pools"]["values"], ["poolA"])
+        self.assertEqual(lists["http://deadlineA:8081"]["limits"]["values"], ["limitA"])
+
+    def testSeparateWebServices(self):
+        cache = GafferDeadline.DeadlineListCache(self.__path(), ttl=60)
+        with mock.patch("GafferDeadline.DeadlineTools.getPools", return_value=["poolA"]):
+            cache.fetch("pools")
+
+        # Another farm doesn't get the lists of the first one
+        self.__webServiceUrl.return_value = "http://deadlineB:8081"
+        self.assertTrue(cache.isStale("pools"))
+        self.assertEqual(cache.values("pools", refresh=False), [])
+        with mock.patch("GafferDeadline.DeadlineTools.getPools", return_value=["poolB"]):
+            cache.fetch("pools")
+        self.assertEqual(cache.values("pools", refresh=False), ["poolB"])
+
+        self.__webServiceUrl.return_value = "http://deadlineA:8081"
+        self.assertEqual(cache.values("pools", refresh=False), ["poolA"])
+
+        with open(self.__path()) as f:
+            lists = json.load(f)
+        self.assertEqual(lists["http://deadlineA:8081"]["pools"]["values"], ["poolA"])
+        self.assertEqual(lists["http://deadlineB:8081"]["pools"]["values"], ["poolB"])
+
+        # Lists cached before they were kept per Web Service are dropped
+        with open(self.__path(), "w") as f:
+            json.dump({"pools": {"time": 0, "values": ["oldPool"]}}, f)
+        cache = GafferDeadline.DeadlineListCache(self.__path(), ttl=60)
+        self.assertEqual(cache.values("pools", refresh=False), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,411 @@
+##########################################################################
+#
+#  Copyright (c) 2019, Hypothetical Inc. All rights reserved.
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#      * Redistributions of source code must retain the above
+#        copyright notice, this list of conditions and the following
+#        disclaimer.
+#
+#      * Redistributions in binary form must reproduce the above
+#        copyright notice, this list of conditions and the following
+#        disclaimer in the documentation and/or other materials provided with
+#        the distribution.
+#
+#      * Neither the name of Hypothetical Inc. nor the names of
+#        any other contributors to this software may be used to endorse or
+#        promote products derived from this software without specific prior
+#        written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+#  IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+#  THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+#  PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+#  CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+#  EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+#  PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+#  PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+#  LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+#  NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+#  SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+##########################################################################
+
+import os
+import json
+import time
+import unittest
+import threading
+import concurrent.futures
+from unittest import mock
+
+import IECore
+
+import Gaffer
+import GafferTest
+import GafferDispatchTest
+
+import GafferDeadline
+import GafferDeadlineTest
+
+
+class DeadlineToolsTest(GafferTest.TestCase):
+    def __payload(self, name):
+        return {"JobInfo": {"Name": name, "Plugin": "Gaffer"}, "PluginInfo": {}, "AuxFiles": []}
+
+    def testSubmitJob(self):
+        with GafferDeadlineTest.FakeWebService() as ws, mock.patch.object(
+            GafferDeadline.DeadlineTools, "DEADLINE_SETTINGS", ws.settings()
+        ):
+            jobId, result = GafferDeadline.DeadlineTools.submitJob(self.__payload("a"))
+
+        self.assertEqual(jobId, "dryrun000001")
+        self.assertEqual(result["Props"]["Name"], "a")
+        self.assertEqual(len(ws.requests), 1)
+
+    def testSubmitJobs(self):
+        payloads = [self.__payload(n) for n in ["a", "b", "c"]]
+        with GafferDeadlineTest.FakeWebService() as ws, mock.patch.object(
+            GafferDeadline.DeadlineTools, "DEADLINE_SETTINGS", ws.settings()
+        ):
+            results = GafferDeadline.DeadlineTools.submitJobs(payloads)
+
+        self.assertEqual(len(ws.requests), 1)
+        self.assertEqual(
+            [r[0] for r in results],
+            ["dryrun000001", "dryrun000002", "dryrun000003"]
+        )
+        self.assertEqual([r[1]["Props"]["Name"] for r in results], ["a", "b", "c"])
+
+    def testSubmitJobsFallback(self):
+        payloads = [self.__payload(n) for n in ["a", "b", "c"]]
+        with GafferDeadlineTest.FakeWebService(acceptBatches=False) as ws, mock.patch.object(
+            GafferDeadline.DeadlineTools, "DEADLINE_SETTINGS", ws.settings()
+        ):
+            results = GafferDeadline.DeadlineTools.submitJobs(payloads)
+
+        # One refused batch, then one request per job
+        self.assertEqual(len(ws.requests), 4)
+        self.assertEqual(len(set(r[0] for r in results)), 3)
+        self.assertEqual([r[1]["Props"]["Name"] for r in results], ["a", "b", "c"])
+
+    def testRetry(self):
+        with GafferDeadlineTest.FakeWebService(unavailable=2) as ws, mock.patch.object(
+            GafferDeadline.DeadlineTools, "DEADLINE_SETTINGS", ws.settings()
+        ), mock.patch.object(GafferDeadline.DeadlineTools, "RETRY_DELAY", 0):
+            jobId, result = GafferDeadline.DeadlineTools.submitJob(self.__payload("a"))
+
+        self.assertEqual(jobId, "dryrun000001")
+        self.assertEqual(len(ws.requests), 3)
+
+        with GafferDeadlineTest.FakeWebService(unavailable=5) as ws, mock.patch.object(
+            GafferDeadline.DeadlineTools, "DEADLINE_SETTINGS", ws.settings()
+        ), mock.patch.object(
+            GafferDeadline.DeadlineTools, "RETRY_DELAY", 0
+        ), mock.patch.object(
+            GafferDeadline.DeadlineTools, "REQUEST_RETRIES", 2
+        ):
+            jobId, result = GafferDeadline.DeadlineTools.submitJob(self.__payload("a"))
+
+        self.assertIsNone(jobId)
+        self.assertEqual(result, {"error": "Service Unavailable"})
+        self.assertEqual(len(ws.requests), 3)
+
+    def testIdempotentRetry(self):
+        payload = self.__payload("a")
+        payload["JobInfo"]["ExtraInfoKeyValue0"] = "0:upstreamJob=0"
+        payload["JobInfo"]["ExtraInfoKeyValue1"] = "{}=dispatch1:hashA".format(
+            GafferDeadline.DeadlineTools.SUBMISSION_TOKEN_KEY
+        )
+        self.assertEqual(GafferDeadline.DeadlineTools.submissionToken(payload), "dispatch1:hashA")
+        self.assertIsNone(GafferDeadline.DeadlineTools.submissionToken(self.__payload("b")))
+
+        # The job is created but the response is lost, so the retry finds the job instead of
+        # submitting it again.
+        with GafferDeadlineTest.FakeWebService(lostResponses=1) as ws, mock.patch.object(
+            GafferDeadline.DeadlineTools, "DEADLINE_SETTINGS", ws.settings()
+        ), mock.patch.object(GafferDeadline.DeadlineTools, "RETRY_DELAY", 0):
+            jobId, result = GafferDeadline.DeadlineTools.submitJob(payload)
+
+            self.assertEqual(jobId, "dryrun000001")
+            self.assertEqual(len(ws.jobs()), 1)
+            self.assertEqual(len(ws.requests), 2)
+
+            self.assertEqual(
+                list(GafferDeadline.DeadlineTools.getSubmittedJobs("dispatch1").keys()),
+                ["hashA"]
+            )
+            self.assertEqual(GafferDeadline.DeadlineTools.getSubmittedJobs("dispatch2"), {})
+
+        # Without a token the job can't be found, so it is submitted again
+        with GafferDeadlineTest.FakeWebService(lostResponses=1) as ws, mock.patch.object(
+            GafferDeadline.DeadlineTools, "DEADLINE_SETTINGS", ws.settings()
+        ), mock.patch.object(GafferDeadline.DeadlineTools, "RETRY_DELAY", 0):
+            jobId, result = GafferDeadline.DeadlineTools.submitJob(self.__payload("b"))
+
+        self.assertEqual(jobId, "dryrun000002")
+        self.assertEqual(len(ws.jobs()), 2)
+
+    def testRetryLookupErrors(self):
+        payload = self.__payload("a")
+        payload["JobInfo"]["ExtraInfoKeyValue0"] = "{}=dispatch1:hashA".format(
+            GafferDeadline.DeadlineTools.SUBMISSION_TOKEN_KEY
+        )
+
+        # Failing to look for the job doesn't stop the request being retried
+        with GafferDeadlineTest.FakeWebService(unavailable=1) as ws, mock.patch.object(
+            GafferDeadline.DeadlineTools, "DEADLINE_SETTINGS", ws.settings()
+        ), mock.patch.object(
+            GafferDeadline.DeadlineTools, "RETRY_DELAY", 0
+        ), mock.patch.object(
+            GafferDeadline.DeadlineTools, "getSubmittedJobs",
+            side_effect=RuntimeError("Lookup failed")
+        ), IECore.CapturingMessageHandler() as mh:
+            jobId, result = GafferDeadline.DeadlineTools.submitJob(payload)
+
+        self.assertEqual(jobId, "dryrun000001")
+        self.assertEqual(len(ws.jobs()), 1)
+        warnings = [m for m in mh.messages if m.level == IECore.Msg.Level.Warning]
+        self.assertEqual(len(warnings), 1)
+        self.assertIn("Lookup failed", warnings[0].message)
+
+    def testSharedSubmittedJobsLookup(self):
+        with mock.patch.object(
+            GafferDeadline.DeadlineTools, "getSubmittedJobs",
+            return_value={"hashA": {"_id": "a"}}
+        ) as getSubmittedJobs:
+            since = time.monotonic()
+            jobs = GafferDeadline.DeadlineTools.findSubmittedJobs("sharedDispatch", since)
+            self.assertEqual(jobs, {"hashA": {"_id": "a"}})
+
+            # Retries that failed before the lookup started share it
+            for i in range(10):
+                GafferDeadline.DeadlineTools.findSubmittedJobs("sharedDispatch", since)
+            self.assertEqual(getSubmittedJobs.call_count, 1)
+
+            # Later failures need a new lookup
+            GafferDeadline.DeadlineTools.findSubmittedJobs("sharedDispatch")
+            self.assertEqual(getSubmittedJobs.call_count, 2)
+
+            GafferDeadline.DeadlineTools.findSubmittedJobs("otherDispatch", since)
+            self.assertEqual(getSubmittedJobs.call_count, 3)
+
+            # Old lookups are forgotten rather than kept for every dispatch
+            with mock.patch.object(
+                GafferDeadline.DeadlineTools, "_submittedJobsLookupLifetime", -1
+            ):
+                GafferDeadline.DeadlineTools.findSubmittedJobs("lastDispatch")
+            self.assertEqual(
+                list(GafferDeadline.DeadlineTools._submittedJobsLookups.keys()),
+                ["lastDispatch"]
+            )
+
+        # Known job IDs are fetched directly
+        with GafferDeadlineTest.FakeWebService() as ws, mock.patch.object(
+            GafferDeadline.DeadlineTools, "DEADLINE_SETTINGS", ws.settings()
+        ):
+            for name in ["a", "b"]:
+                payload = self.__payload(name)
+                payload["JobInfo"]["ExtraInfoKeyValue0"] = "{}=dispatch1:hash{}".format(
+                    GafferDeadline.DeadlineTools.SUBMISSION_TOKEN_KEY,
+                    name
+                )
+                GafferDeadline.DeadlineTools.submitJob(payload)
+
+            self.assertEqual(
+                list(
+                    GafferDeadline.DeadlineTools.getSubmittedJobs(
+                        "dispatch1", jobIds=["dryrun000002"]
+                    ).keys()
+                ),
+                ["hashb"]
+            )
+            self.assertEqual(ws.requests[-1]["params"], {"JobID": "dryrun000002"})
+            self.assertEqual(
+                GafferDeadline.DeadlineTools.getSubmittedJobs("dispatch1", jobIds=[]), {}
+            )
+
+    def testIdempotentBatchRetry(self):
+        payloads = [self.__payload(n) for n in ["a", "b"]]
+        for i, payload in enumerate(payloads):
+            payload["JobInfo"]["ExtraInfoKeyValue0"] = "{}=dispatch1:hash{}".format(
+                GafferDeadline.DeadlineTools.SUBMISSION_TOKEN_KEY,
+                i
+            )
+
+        with GafferDeadlineTest.FakeWebService(lostResponses=1) as ws, mock.patch.object(
+            GafferDeadline.DeadlineTools, "DEADLINE_SETTINGS", ws.settings()
+        ), mock.patch.object(GafferDeadline.DeadlineTools, "RETRY_DELAY", 0):
+            results = GafferDeadline.DeadlineTools.submitJobs(payloads)
+
+        self.assertEqual([r[0] for r in results], ["dryrun000001", "dryrun000002"])
+        self.assertEqual(len(ws.jobs()), 2)
+
+    def testDryRunTransport(self):
+        transport = GafferDeadline.DryRunTransport(
+            os.path.join(self.temporaryDirectory(), "dryRun")
+        )
+        previous = GafferDeadline.DeadlineTools.setTransport(transport)
+        self.addCleanup(GafferDeadline.DeadlineTools.setTransport, previous)
+        self.assertIs(GafferDeadline.DeadlineTools.getTransport(), transport)
+
+        # No settings are needed since nothing is sent to Deadline
+        with mock.patch.object(
+            GafferDeadline.DeadlineTools, "getWebServiceSettings"
+        ) as settings:
+            jobId, result = GafferDeadline.DeadlineTools.submitJob(self.__payload("a"))
+            results = GafferDeadline.DeadlineTools.submitJobs(
+                [self.__payload("b"), self.__payload("c")]
+            )
+            self.assertEqual(GafferDeadline.DeadlineTools.getPools(), [])
+            self.assertEqual(GafferDeadline.DeadlineTools.getJobTasks(jobId), [])
+            jobs = GafferDeadline.DeadlineTools.getJobs([jobId, "missing"])
+            self.assertEqual(settings.call_count, 0)
+
+        self.assertEqual(jobId, "dryrun000001")
+        self.assertEqual([r[0] for r in results], ["dryrun000002", "dryrun000003"])
+        self.assertEqual(list(jobs.keys()), [jobId])
+        self.assertEqual(len(transport.jobs()), 3)
+
+        with open(os.path.join(transport.directory(), jobId + ".json")) as f:
+            self.assertEqual(json.load(f), self.__payload("a"))
+
+        GafferDeadline.DeadlineTools.setTransport(None)
+        self.assertFalse(GafferDeadline.DeadlineTools.getTransport().isDryRun)
+
+    def testTransportScope(self):
+        transport = GafferDeadline.DryRunTransport(
+            os.path.join(self.temporaryDirectory(), "dryRun")
+        )
+
+        def otherThreadTransport():
+            result = []
+            thread = threading.Thread(
+                target=lambda: result.append(GafferDeadline.DeadlineTools.getTransport())
+            )
+            thread.start()
+            thread.join()
+            return result[0]
+
+        with GafferDeadline.DeadlineTools.transportScope(transport):
+            self.assertIs(GafferDeadline.DeadlineTools.getTransport(), transport)
+            # Other threads keep sending their requests to the farm
+            self.assertFalse(otherThreadTransport().isDryRun)
+
+            bound = GafferDeadline.DeadlineTools.bindTransport(
+                GafferDeadline.DeadlineTools.getTransport
+            )
+            with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+                self.assertIs(executor.submit(bound).result(), transport)
+
+        self.assertFalse(GafferDeadline.DeadlineTools.getTransport().isDryRun)
+
+    def testProjectSettingsCache(self):
+        GafferDeadline.DeadlineTools.invalidateSettings()
+        self.addCleanup(GafferDeadline.DeadlineTools.invalidateSettings)
+
+        settings = {"deadline": {}, "gaffer": {"deadline": {"env_vars": []}}}
+        with mock.patch(
+            "GafferDeadline.DeadlineTools.get_project_settings",
+            return_value=settings
+        ) as getProjectSettings:
+            for i in range(0, 10):
+                self.assertIs(
+                    GafferDeadline.DeadlineTools.getProjectSettings("testProject"),
+                    settings
+                )
+            self.assertEqual(getProjectSettings.call_count, 1)
+
+            GafferDeadline.DeadlineTools.invalidateSettings()
+            GafferDeadline.DeadlineTools.getProjectSettings("testProject")
+            self.assertEqual(getProjectSettings.call_count, 2)
+
+            with mock.patch.object(GafferDeadline.DeadlineTools, "SETTINGS_TTL", -1):
+                GafferDeadline.DeadlineTools.invalidateSettings()
+                GafferDeadline.DeadlineTools.getProjectSettings("testProject")
+                GafferDeadline.DeadlineTools.getProjectSettings("testProject")
+            self.assertEqual(getProjectSettings.call_count, 4)
+
+    def testWebServiceSettingsCache(self):
+        with GafferDeadlineTest.FakeWebService() as ws, mock.patch.object(
+            GafferDeadline.DeadlineTools, "DEADLINE_SETTINGS", ws.settings()
+        ):
+            settings = GafferDeadline.DeadlineTools.getWebServiceSettings()
+            self.assertEqual(settings["url"], ws.url())
+            self.assertIs(GafferDeadline.DeadlineTools.getWebServiceSettings(), settings)
+
+    def testDispatchSettings(self):
+        settings = {
+            "deadline": {},
+            "gaffer": {
+                "deadline": {
+                    "env_vars": [
+                        {"name": "ARNOLD_ROOT", "use_env_value": True, "value": ""},
+                        {"name": "AYON_RENDER_JOB", "use_env_value": False, "value": "1"},
+                    ]
+                }
+            }
+        }
+        with mock.patch(
+            "GafferDeadline.DeadlineTools.getProjectSettings",
+            return_value=settings
+        ):
+            dispatchSettings = GafferDeadline.DispatchSettings()
+
+        self.assertTrue(dispatchSettings.ayonMode())
+        self.assertEqual(
+            dispatchSettings.environmentVariables(),
+            (["ARNOLD_ROOT"], {"AYON_RENDER_JOB": "1"})
+        )
+
+        with mock.patch(
+            "GafferDeadline.DeadlineTools.getProjectSettings",
+            side_effect=RuntimeError("No AYON")
+        ):
+            dispatchSettings.invalidate()
+
+        self.assertFalse(dispatchSettings.ayonMode())
+        self.assertEqual(
+            dispatchSettings.environmentVariables(),
+            (["ARNOLD_ROOT", "GAFFER_EXTENSION_PATHS"], {})
+        )
+
+    def testBatchedDispatch(self):
+        #   n1
+        #  / \
+        # i1 i2
+        #  \ /
+        #   n2
+
+        s = Gaffer.ScriptNode()
+
+        s["n1"] = GafferDispatchTest.LoggingTaskNode()
+        s["i1"] = GafferDispatchTest.LoggingTaskNode()
+        s["i1"]["preTasks"][0].setInput(s["n1"]["task"])
+        s["i2"] = GafferDispatchTest.LoggingTaskNode()
+        s["i2"]["preTasks"][0].setInput(s["n1"]["task"])
+        s["n2"] = GafferDispatchTest.LoggingTaskNode()
+        s["n2"]["preTasks"][0].setInput(s["i1"]["task"])
+        s["n2"]["preTasks"][1].setInput(s["i2"]["task"])
+
+        dispatcher = GafferDeadline.DeadlineDispatcher()
+        dispatcher["jobsDirectory"].setValue(self.temporaryDirectory() / "testJobDirectory")
+
+        with GafferDeadlineTest.FakeWebService() as ws, mock.patch.object(
+            GafferDeadline.DeadlineTools, "DEADLINE_SETTINGS", ws.settings()
+        ), mock.patch.object(
+            GafferDeadline.DeadlineTools, "BATCH_SUBMISSION", True
+        ):
+            dispatcher.dispatch([s["n2"]])
+
+        # n1 on its own, i1 and i2 batched together, then n2
+        self.assertEqual(len(ws.requests), 3)
+        self.assertEqual(len(ws.requests[1]["body"]["Jobs"]), 2)
+        self.assertTrue(all(j.getJobID() is not None for j in dispatcher._deadlineJobs[1:]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,135 @@
+##########################################################################
+#
+#  Copyright (c) 2019, Hypothetical Inc. All rights reserved.
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#      * Redistributions of source code must retain the above
+#        copyright notice, this list of conditions and the following
+#        disclaimer.
+#
+#      * Redistributions in binary form must reproduce the above
+#        copyright notice, this list of conditions and the following
+#        disclaimer in the documentation and/or other materials provided with
+#        the distribution.
+#
+#      * Neither the name of Hypothetical Inc. nor the names of
+#        any other contributors to this software may be used to endorse or
+#        promote products derived from this software without specific prior
+#        written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+#  IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+#  THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+#  PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+#  CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+#  EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+#  PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+#  PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+#  LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+#  NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+#  SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+##########################################################################
+
+import os
+import json
+import threading
+import unittest
+from unittest import mock
+
+import GafferTest
+
+import GafferDeadline
+
+
+class DispatchTraceTest(GafferTest.TestCase):
+
+    def testDisabled(self):
+        with mock.patch.dict(os.environ, {"GAFFERDEADLINE_TRACE": ""}):
+            self.assertIsNone(GafferDeadline.DispatchTrace.traceFormat())
+            self.assertIsNone(GafferDeadline.DispatchTrace.begin())
+
+        self.assertIsNone(GafferDeadline.DispatchTrace.active())
+
+        # Scopes are shared and record nothing
+        with GafferDeadline.DispatchTrace.scope("a") as scope:
+            scope.setArg("b", 1)
+        self.assertIs(GafferDeadline.DispatchTrace.scope("c"), scope)
+        GafferDeadline.DispatchTrace.instant("d")
+
+    def testScopes(self):
+        with mock.patch.dict(os.environ, {"GAFFERDEADLINE_TRACE": "json"}):
+            trace = GafferDeadline.DispatchTrace.begin("test")
+        self.addCleanup(GafferDeadline.DispatchTrace.end, trace)
+        self.assertIs(GafferDeadline.DispatchTrace.active(), trace)
+
+        with GafferDeadline.DispatchTrace.scope("outer", "test", a=1):
+            with GafferDeadline.DispatchTrace.scope("inner") as scope:
+                scope.setArg("b", 2)
+            GafferDeadline.DispatchTrace.instant("retry")
+
+        # Events from other threads go to the active trace too
+        def f():
+            with GafferDeadline.DispatchTrace.scope("thread"):
+                pass
+
+        thread = threading.Thread(target=f)
+        thread.start()
+        thread.join()
+
+        with self.assertRaises(ValueError):
+            with GafferDeadline.DispatchTrace.scope("failed"):
+                raise ValueError("Oops")
+
+        GafferDeadline.DispatchTrace.end(trace)
+        self.assertIsNone(GafferDeadline.DispatchTrace.active())
+        with GafferDeadline.DispatchTrace.scope("ignored"):
+            pass
+
+        events = {e["name"]: e for e in trace.events()}
+        self.assertEqual(set(events.keys()), {"outer", "inner", "retry", "thread", "failed"})
+        self.assertEqual(events["outer"]["cat"], "test")
+        self.assertEqual(events["outer"]["args"], {"a": 1})
+        self.assertEqual(events["inner"]["args"], {"b": 2})
+        self.assertEqual(events["retry"]["duration"], 0)
+        self.assertEqual(events["failed"]["args"]["error"], "ValueError: Oops")
+        self.assertNotEqual(events["thread"]["thread"], events["outer"]["thread"])
+        self.assertGreaterEqual(events["outer"]["duration"], events["inner"]["duration"])
+        self.assertLessEqual(events["outer"]["start"], events["inner"]["start"])
+
+        self.assertEqual(trace.summary()["inner"]["count"], 1)
+
+    def testSave(self):
+        with mock.patch.dict(os.environ, {"GAFFERDEADLINE_TRACE": "chrome"}):
+            trace = GafferDeadline.DispatchTrace.begin("test")
+            with GafferDeadline.DispatchTrace.scope("a", jobId="job1"):
+                pass
+            GafferDeadline.DispatchTrace.instant("b")
+            GafferDeadline.DispatchTrace.end(trace)
+
+            chromePath = os.path.join(self.temporaryDirectory(), "chrome.json")
+            trace.save(chromePath)
+
+        with open(chromePath) as f:
+            chromeTrace = json.load(f)
+        self.assertEqual([e["ph"] for e in chromeTrace["traceEvents"]], ["X", "i"])
+        self.assertEqual(chromeTrace["traceEvents"][0]["args"], {"jobId": "job1"})
+        self.assertIn("dur", chromeTrace["traceEvents"][0])
+
+        jsonPath = os.path.join(self.temporaryDirectory(), "trace.json")
+        trace.save(jsonPath, "json")
+        with open(jsonPath) as f:
+            data = json.load(f)
+        self.assertEqual(data["name"], "test")
+        self.assertEqual([e["name"] for e in data["events"]], ["a", "b"])
+        self.assertEqual(data["summary"]["a"]["count"], 1)
+
+        with self.assertRaises(ValueError):
+            trace.save(jsonPath, "xml")
+
+
+if __name__ == "__main__":
+    unittest.main()
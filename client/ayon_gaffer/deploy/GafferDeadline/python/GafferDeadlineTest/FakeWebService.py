@@ -0,0 +1,151 @@
+##########################################################################
+#
+#  Copyright (c) 2019, Hypothetical Inc. All rights reserved.
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#      * Redistributions of source code must retain the above
+#        copyright notice, this list of conditions and the following
+#        disclaimer.
+#
+#      * Redistributions in binary form must reproduce the above
+#        copyright notice, this list of conditions and the following
+#        disclaimer in the documentation and/or other materials provided with
+#        the distribution.
+#
+#      * Neither the name of Hypothetical Inc. nor the names of
+#        any other contributors to this software may be used to endorse or
+#        promote products derived from this software without specific prior
+#        written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+#  IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+#  THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+#  PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+#  CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+#  EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+#  PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+#  PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+#  LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+#  NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+#  SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+##########################################################################
+
+import json
+import threading
+import http.server
+import urllib.parse
+
+import GafferDeadline
+
+
+class FakeWebService(object):
+    """ A local stand-in for the Deadline Web Service, answering requests like a
+    `GafferDeadline.DryRunTransport` over HTTP. Failures can be injected to test how
+    requests are retried. Use it as a context manager, and point DeadlineTools at it by
+    patching `DeadlineTools.DEADLINE_SETTINGS` with `settings()`.
+    """
+
+    def __init__(self, acceptBatches=True, unavailable=0, lostResponses=0):
+        # Whether several jobs can be submitted in one request
+        self.acceptBatches = acceptBatches
+        # Number of requests answered with "503 Service Unavailable"
+        self.unavailable = unavailable
+        # Number of job submissions that create the jobs but close the connection without
+        # sending a response
+        self.lostResponses = lostResponses
+        # Every request received, as dictionaries with "method", "endpoint", "params" and
+        # "body" items
+        self.requests = []
+
+        self.__transport = GafferDeadline.DryRunTransport()
+        self.__lock = threading.Lock()
+
+        webService = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                webService._handle(self, "GET")
+
+            def do_POST(self):
+                webService._handle(self, "POST")
+
+            def reply(self, code, data):
+                encoded = json.dumps(data).encode()
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(encoded)))
+                self.end_headers()
+                self.wfile.write(encoded)
+
+            def log_message(self, *args):
+                pass
+
+        self.__server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.__thread = threading.Thread(target=self.__server.serve_forever, daemon=True)
+
+    def jobs(self):
+        """ Returns the submitted jobs, in the order they were submitted. """
+        return self.__transport.jobs()
+
+    def url(self):
+        return "http://127.0.0.1:{}".format(self.__server.server_address[1])
+
+    def settings(self):
+        """ Returns Deadline settings in the form AYON provides, pointing at this server. """
+        return {
+            "deadline_urls": [
+                {
+                    "default_username": "",
+                    "default_password": "",
+                    "not_verify_ssl": False,
+                    "value": self.url(),
+                }
+            ]
+        }
+
+    def _handle(self, handler, method):
+        url = urllib.parse.urlparse(handler.path)
+        endpoint = url.path.rpartition("/api/")[2].strip("/")
+        params = {k: v[-1] for k, v in urllib.parse.parse_qs(url.query).items()}
+        body = None
+        if handler.headers.get("Content-Length"):
+            body = json.loads(handler.rfile.read(int(handler.headers["Content-Length"])))
+
+        with self.__lock:
+            self.requests.append(
+                {"method": method, "endpoint": endpoint, "params": params, "body": body}
+            )
+
+            if self.unavailable:
+                self.unavailable -= 1
+                handler.reply(503, {"error": "Service Unavailable"})
+                return
+
+            if (
+                method == "POST" and endpoint == "jobs" and
+                isinstance(body, dict) and "Jobs" in body and not self.acceptBatches
+            ):
+                handler.reply(400, {"error": "JobInfo is required"})
+                return
+
+            statusCode, data = self.__transport.handle(method, endpoint, params, body)
+
+            if method == "POST" and self.lostResponses:
+                self.lostResponses -= 1
+                handler.close_connection = True
+                return
+
+        handler.reply(statusCode, data)
+
+    def __enter__(self):
+        self.__thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.__server.shutdown()
+        self.__server.server_close()
@@ -0,0 +1,214 @@
+##########################################################################
+#
+#  Copyright (c) 2019, Hypothetical Inc. All rights reserved.
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#      * Redistributions of source code must retain the above
+#        copyright notice, this list of conditions and the following
+#        disclaimer.
+#
+#      * Redistributions in binary form must reproduce the above
+#        copyright notice, this list of conditions and the following
+#        disclaimer in the documentation and/or other materials provided with
+#        the distribution.
+#
+#      * Neither the name of Hypothetical Inc. nor the names of
+#        any other contributors to this software may be used to endorse or
+#        promote products derived from this software without specific prior
+#        written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+#  IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+#  THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+#  PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+#  CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+#  EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+#  PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+#  PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+#  LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+#  NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+#  SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+##########################################################################
+
+import random
+import unittest
+
+import GafferTest
+
+import GafferDeadline
+
+
+class FrameRangeAlgoTest(GafferTest.TestCase):
+    def testMergeRanges(self):
+        self.assertEqual(GafferDeadline.FrameRangeAlgo.mergeRanges([]), [])
+        self.assertEqual(
+            GafferDeadline.FrameRangeAlgo.mergeRanges([(6, 10), (1, 5), (20, 20), (8, 12)]),
+            [(1, 12), (20, 20)]
+        )
+        self.assertEqual(
+            GafferDeadline.FrameRangeAlgo.mergeRanges([(1, 100), (5, 6), (101, 101)]),
+            [(1, 101)]
+        )
+        self.assertEqual(
+            GafferDeadline.FrameRangeAlgo.mergeRanges([(-5, -1), (1, 3)]),
+            [(-5, -1), (1, 3)]
+        )
+
+    def testContainsRanges(self):
+        self.assertTrue(GafferDeadline.FrameRangeAlgo.containsRanges([(1, 10)], [(1, 10)]))
+        self.assertTrue(
+            GafferDeadline.FrameRangeAlgo.containsRanges([(1, 5), (6, 10)], [(2, 9)])
+        )
+        self.assertTrue(GafferDeadline.FrameRangeAlgo.containsRanges([(1, 10)], []))
+        self.assertFalse(GafferDeadline.FrameRangeAlgo.containsRanges([], [(1, 1)]))
+        self.assertFalse(
+            GafferDeadline.FrameRangeAlgo.containsRanges([(1, 5), (7, 10)], [(2, 9)])
+        )
+        self.assertFalse(
+            GafferDeadline.FrameRangeAlgo.containsRanges([(1, 10)], [(5, 5), (11, 11)])
+        )
+
+    def testOffsetFrameDependency(self):
+        # Mirrors DeadlineDispatcherTest.testOffsetFrameDependency : each task depends on
+        # the upstream task 100 frames later, which Deadline can handle as a frame offset.
+        rangePairs = [((f + 100, f + 100), (f, f)) for f in range(1, 51)]
+
+        self.assertEqual(
+            GafferDeadline.FrameRangeAlgo.rangeOffset(*rangePairs[0]),
+            (100, 100)
+        )
+        self.assertTrue(GafferDeadline.FrameRangeAlgo.hasCommonOffset(rangePairs))
+
+    def testScriptFrameDependency(self):
+        # Mirrors DeadlineDispatcherTest.testScriptFrameDependency : each task depends on
+        # a random upstream frame, which needs the dependency script.
+        r = random.Random(0)
+        upstreamFrames = r.sample(range(1, 100000), 50)
+        rangePairs = [((u, u), (f, f)) for f, u in zip(range(1, 51), upstreamFrames)]
+
+        self.assertFalse(GafferDeadline.FrameRangeAlgo.hasCommonOffset(rangePairs))
+        self.assertFalse(
+            GafferDeadline.FrameRangeAlgo.containsRanges(
+                [p[0] for p in rangePairs],
+                [p[1] for p in rangePairs]
+            )
+        )
+
+    def testFrameDependencyWithDifferentTaskLengths(self):
+        # Upstream tasks of 10 frames feeding single frame tasks have no common offset
+        # but still cover every frame, so frame dependency can be used.
+        rangePairs = []
+        for f in range(1, 5001):
+            upstreamStart = ((f - 1) // 10) * 10 + 1
+            rangePairs.append(((upstreamStart, upstreamStart + 9), (f, f)))
+
+        self.assertFalse(GafferDeadline.FrameRangeAlgo.hasCommonOffset(rangePairs))
+        self.assertTrue(
+            GafferDeadline.FrameRangeAlgo.containsRanges(
+                [p[0] for p in rangePairs],
+                [p[1] for p in rangePairs]
+            )
+        )
+
+
+    def testCompactFrames(self):
+        self.assertEqual(GafferDeadline.FrameRangeAlgo.compactFrames([]), [])
+        self.assertEqual(GafferDeadline.FrameRangeAlgo.compactFrames([5]), [(5, 5, 1)])
+        self.assertEqual(
+            GafferDeadline.FrameRangeAlgo.compactFrames([1, 2, 3, 7, 8, 9, 100.0, 101.0, 102.0]),
+            [(1, 3, 1), (7, 9, 1), (100.0, 102.0, 1)]
+        )
+        self.assertEqual(
+            GafferDeadline.FrameRangeAlgo.compactFrames(list(range(1, 101, 2))),
+            [(1, 99, 2)]
+        )
+        self.assertEqual(
+            GafferDeadline.FrameRangeAlgo.compactFrames([1, 2, 3, 5, 7, 9, 20]),
+            [(1, 3, 1), (5, 9, 2), (20, 20, 1)]
+        )
+        # Two frames aren't enough to decide on a step
+        self.assertEqual(
+            GafferDeadline.FrameRangeAlgo.compactFrames([1, 5, 6, 7]),
+            [(1, 1, 1), (5, 7, 1)]
+        )
+        self.assertEqual(
+            GafferDeadline.FrameRangeAlgo.compactFrames([1, 3, 4, 5], step=2),
+            [(1, 3, 2), (4, 4, 1), (5, 5, 1)]
+        )
+
+    def testFrameString(self):
+        self.assertEqual(GafferDeadline.FrameRangeAlgo.frameString([]), "")
+        self.assertEqual(
+            GafferDeadline.FrameRangeAlgo.frameString([(1, 5, 1), (6, 10, 1), (1001, 1001, 1)]),
+            "1-10,1001"
+        )
+        self.assertEqual(
+            GafferDeadline.FrameRangeAlgo.frameString(
+                [(1, 9, 2), (11, 19, 2), (21, 21, 1), (23, 23, 1), (30, 30, 1)]
+            ),
+            "1-23x2,30"
+        )
+        self.assertEqual(
+            GafferDeadline.FrameRangeAlgo.frameString([(11, 20, 1), (1, 10, 1)]),
+            "11-20,1-10"
+        )
+        # With the job's step, single frames are only merged into runs of that step
+        self.assertEqual(
+            GafferDeadline.FrameRangeAlgo.frameString([(1, 5, 2), (10, 10, 1), (11, 11, 1)], 2),
+            "1-5x2,10,11"
+        )
+        self.assertEqual(
+            GafferDeadline.FrameRangeAlgo.frameString([(1, 9, 2), (11, 11, 1), (13, 17, 2)], 2),
+            "1-17x2"
+        )
+        # With a chunk size, tasks are only merged where Deadline splits them back up the same
+        self.assertEqual(
+            GafferDeadline.FrameRangeAlgo.frameString(
+                [(1, 4, 1), (5, 8, 1), (9, 10, 1), (11, 14, 1), (15, 18, 1), (19, 20, 1)],
+                chunkSize=4
+            ),
+            "1-10,11-20"
+        )
+        self.assertEqual(
+            GafferDeadline.FrameRangeAlgo.frameString([(1, 5, 1), (6, 12, 1)], chunkSize=7),
+            "1-5,6-12"
+        )
+        self.assertEqual(GafferDeadline.FrameRangeAlgo.frameCount((1, 99, 2)), 50)
+
+    def testEncodeTaskDependencies(self):
+        encode = GafferDeadline.FrameRangeAlgo.encodeTaskDependencies
+
+        # Offset dependencies collapse to a single entry
+        self.assertEqual(encode({t: {t + 3} for t in range(2000)}), [("0-1999", "3")])
+
+        # Single tasks keep the original format
+        self.assertEqual(encode({5: {2}}), [("5", "2")])
+        self.assertEqual(encode({5: {2, 3, 4, 8}}), [("5", "2-4,8")])
+
+        # Tasks sharing upstream tasks are grouped, with single tasks written as ranges
+        self.assertEqual(
+            encode({0: {0}, 1: {0}, 2: {0}, 3: {1, 2, 3}, 4: {1, 2, 3}, 6: {9}}),
+            [("0-2", "0-0"), ("3-4", "1-3"), ("6", "9")]
+        )
+
+    def testCompactionOfSeparatedRuns(self):
+        # 10k frames made of stepped runs separated by gaps
+        frames = []
+        for block in range(0, 100):
+            start = block * 250
+            frames.extend(range(start, start + 200, 2))
+        self.assertEqual(len(frames), 10000)
+
+        runs = GafferDeadline.FrameRangeAlgo.compactFrames(frames)
+        frameString = GafferDeadline.FrameRangeAlgo.frameString(runs)
+
+        self.assertEqual(len(runs), 100)
+        self.assertEqual(sum(GafferDeadline.FrameRangeAlgo.frameCount(r) for r in runs), 10000)
+        self.assertEqual(frameString.split(",")[0], "0-198x2")
+
+if __name__ == "__main__":
+    unittest.main()
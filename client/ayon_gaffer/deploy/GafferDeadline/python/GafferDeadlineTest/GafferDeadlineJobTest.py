@@ -118,6 +118,119 @@ class GafferDeadlineJobTest(GafferTest.TestCase):
         self.assertEqual(dj._tasks[2].getStartFrame(), 100)
         self.assertEqual(dj._tasks[2].getEndFrame(), 102)
 
+    def testAddSteppedBatch(self):
+        dj = GafferDeadline.GafferDeadlineJob(GafferDispatchTest.LoggingTaskNode())
+        dj.addBatch(None, [1, 3, 5, 7, 9])
+        dj.addBatch(None, [11, 13, 15, 17, 19])
+        self.assertEqual(len(dj._tasks), 2)
+        self.assertEqual(dj.getFrameStep(), 2)
+        self.assertEqual(dj._tasks[0].getStartFrame(), 1)
+        self.assertEqual(dj._tasks[0].getEndFrame(), 9)
+        self.assertEqual(dj._tasks[0].getStep(), 2)
+        self.assertEqual(dj._tasks[0].getFrameCount(), 5)
+        self.assertEqual(dj._tasks[1].getTaskNumber(), 1)
+        self.assertEqual(dj._tasks[1].getStartFrame(), 11)
+
+        # Single frames fit any step
+        dj.addBatch(None, [21])
+        self.assertEqual(dj.getFrameStep(), 2)
+        self.assertEqual(len(dj._tasks), 3)
+
+    def testAddMixedStepBatches(self):
+        dj = GafferDeadline.GafferDeadlineJob(GafferDispatchTest.LoggingTaskNode())
+        dj.addBatch(None, [1, 3, 5, 7, 9])
+        dj.addBatch(None, [10, 11, 12])
+
+        # Deadline renders every task of a job with the same step, so the job falls back to a
+        # step of 1 and the stepped batch gets a task for each frame.
+        self.assertEqual(dj.getFrameStep(), 1)
+        self.assertEqual(
+            [(t.getStartFrame(), t.getEndFrame(), t.getStep()) for t in dj.getTasks()],
+            [(1, 1, 1), (3, 3, 1), (5, 5, 1), (7, 7, 1), (9, 9, 1), (10, 12, 1)]
+        )
+        self.assertEqual([t.getTaskNumber() for t in dj.getTasks()], list(range(6)))
+        self.assertEqual(len(dj.getTasksForBatch(None)), 6)
+        self.assertEqual(
+            GafferDeadline.FrameRangeAlgo.frameString(
+                [(t.getStartFrame(), t.getEndFrame(), t.getStep()) for t in dj.getTasks()],
+                dj.getFrameStep(),
+                max(t.getFrameCount() for t in dj.getTasks())
+            ),
+            "1,3,5,7,9,10-12"
+        )
+
+        # Once the job has fallen back, later stepped batches stay at a step of 1
+        dj.addBatch(None, [20, 22])
+        self.assertEqual(dj.getFrameStep(), 1)
+        self.assertEqual([t.getStartFrame() for t in dj.getTasks()[6:]], [20, 22])
+
+    def testRegroupTasks(self):
+        dj = GafferDeadline.GafferDeadlineJob(GafferDispatchTest.LoggingTaskNode())
+        for frame in range(1, 11):
+            dj.addBatch(None, [frame])
+        dj.addBatch(None, [20, 21, 22, 23, 24, 25])
+
+        # Adjacent tasks are merged up to the frame count
+        dj.regroupTasks(4, split=False)
+        self.assertEqual(
+            [(t.getStartFrame(), t.getEndFrame()) for t in dj.getTasks()],
+            [(1, 4), (5, 8), (9, 10), (20, 25)]
+        )
+        self.assertEqual([t.getTaskNumber() for t in dj.getTasks()], [0, 1, 2, 3])
+
+        # Larger tasks are split when allowed
+        dj.regroupTasks(4)
+        self.assertEqual(
+            [(t.getStartFrame(), t.getEndFrame()) for t in dj.getTasks()],
+            [(1, 4), (5, 8), (9, 10), (20, 23), (24, 25)]
+        )
+
+        self.assertRaises(ValueError, dj.regroupTasks, 0)
+
+    def testRegroupTasksLikeDeadline(self):
+        # Split tasks are cut across batches so every task but the last of a run has the
+        # same number of frames, as Deadline does with a frame range and chunk size.
+        dj = GafferDeadline.GafferDeadlineJob(GafferDispatchTest.LoggingTaskNode())
+        dj.addBatch(None, list(range(1, 11)))
+        dj.addBatch(None, list(range(11, 21)))
+        dj.regroupTasks(4)
+        self.assertEqual(
+            [(t.getStartFrame(), t.getEndFrame()) for t in dj.getTasks()],
+            [(1, 4), (5, 8), (9, 12), (13, 16), (17, 20)]
+        )
+
+        # Batches that can't be divided are merged whole, and the frame string keeps the
+        # merged tasks apart so Deadline doesn't chunk across them.
+        dj = GafferDeadline.GafferDeadlineJob(GafferDispatchTest.LoggingTaskNode())
+        dj.addBatch(None, [1, 2, 3, 4, 5])
+        dj.addBatch(None, [6, 7, 8, 9, 10])
+        dj.addBatch(None, [11, 12])
+        dj.regroupTasks(7, split=False)
+        self.assertEqual(
+            [(t.getStartFrame(), t.getEndFrame()) for t in dj.getTasks()],
+            [(1, 5), (6, 12)]
+        )
+        self.assertEqual(
+            GafferDeadline.FrameRangeAlgo.frameString(
+                [(t.getStartFrame(), t.getEndFrame(), t.getStep()) for t in dj.getTasks()],
+                dj.getFrameStep(),
+                7
+            ),
+            "1-5,6-12"
+        )
+
+    def testRegroupSteppedTasks(self):
+        dj = GafferDeadline.GafferDeadlineJob(GafferDispatchTest.LoggingTaskNode())
+        dj.addBatch(None, [1, 3, 5])
+        dj.addBatch(None, [7, 9, 11])
+        dj.addBatch(None, [13, 15, 17])
+
+        dj.regroupTasks(6)
+        self.assertEqual(
+            [(t.getStartFrame(), t.getEndFrame(), t.getStep()) for t in dj.getTasks()],
+            [(1, 11, 2), (13, 17, 2)]
+        )
+
     def testContext(self):
         dj = GafferDeadline.GafferDeadlineJob(GafferDispatchTest.LoggingTaskNode())
         self.assertEqual(dj.getContext(), Gaffer.Context())
@@ -78,5 +78,15 @@ class GafferDeadlineTaskTest(GafferTest.TestCase):
         self.assertEqual(type(dt.getEndFrame()), int)
 
 
+    def testStep(self):
+        dt = GafferDeadline.GafferDeadlineTask(None, 1, startFrame=1, endFrame=9)
+        self.assertEqual(dt.getStep(), 1)
+        self.assertEqual(dt.getFrameCount(), 9)
+        dt.setStep(2)
+        self.assertEqual(dt.getFrameCount(), 5)
+        self.assertRaises(ValueError, dt.setStep, 0)
+        self.assertRaises(ValueError, dt.setStep, 1.5)
+        self.assertEqual(GafferDeadline.GafferDeadlineTask(None, 0).getFrameCount(), 0)
+
 if __name__ == "__main__":
     unittest.main()
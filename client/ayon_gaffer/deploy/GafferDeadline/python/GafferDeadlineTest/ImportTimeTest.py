@@ -0,0 +1,128 @@
+##########################################################################
+#
+#  Copyright (c) 2019, Hypothetical Inc. All rights reserved.
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#      * Redistributions of source code must retain the above
+#        copyright notice, this list of conditions and the following
+#        disclaimer.
+#
+#      * Redistributions in binary form must reproduce the above
+#        copyright notice, this list of conditions and the following
+#        disclaimer in the documentation and/or other materials provided with
+#        the distribution.
+#
+#      * Neither the name of Hypothetical Inc. nor the names of
+#        any other contributors to this software may be used to endorse or
+#        promote products derived from this software without specific prior
+#        written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+#  IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+#  THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+#  PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+#  CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+#  EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+#  PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+#  PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+#  LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+#  NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+#  SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+##########################################################################
+
+import os
+import re
+import sys
+import collections
+import subprocess
+import unittest
+
+import GafferTest
+
+
+def importTimes(statement):
+    """ Runs `statement` in a new Python interpreter with `-X importtime` and returns a
+    dictionary mapping each module imported to its `(self, cumulative)` import time in
+    seconds.
+    """
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        env=os.environ.copy(),
+    )
+    if process.returncode:
+        raise RuntimeError(
+            "\"{}\" failed :\n{}".format(statement, process.stderr)
+        )
+
+    times = collections.OrderedDict()
+    for line in process.stderr.splitlines():
+        match = re.match(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)", line)
+        if match is not None:
+            times[match.group(4)] = (
+                int(match.group(1)) / 1000000.0,
+                int(match.group(2)) / 1000000.0
+            )
+
+    return times
+
+
+class ImportTimeTest(GafferTest.TestCase):
+
+    # Gaffer itself is imported first, so only the time GafferDeadline adds is measured
+    __statement = "import Gaffer, GafferDispatch; import GafferDeadline"
+
+    def __slowest(self, times, count=10):
+        # Modules are listed in the order they finished importing, so everything after
+        # GafferDispatch was imported by GafferDeadline.
+        names = list(times.keys())
+        names = names[names.index("GafferDispatch") + 1:]
+
+        return "\n".join(
+            "{:>8.1f}ms {:>8.1f}ms  {}".format(
+                times[name][0] * 1000, times[name][1] * 1000, name
+            )
+            for name in sorted(names, key=lambda n: times[n][0], reverse=True)[:count]
+        )
+
+    def testLazyImports(self):
+        times = importTimes(self.__statement)
+
+        self.assertIn("GafferDeadline", times)
+        for module in ["ayon_core", "requests", "GafferScene"]:
+            self.assertFalse(
+                module in times,
+                "{} was imported with GafferDeadline. Slowest imports :\n{}".format(
+                    module,
+                    self.__slowest(times)
+                )
+            )
+
+    def testImportTime(self):
+        # Best of several runs, so a busy machine doesn't fail the test
+        duration = None
+        for i in range(0, 3):
+            times = importTimes(self.__statement)
+            cumulative = times["GafferDeadline"][1]
+            if duration is None or cumulative < duration:
+                duration = cumulative
+                slowestTimes = times
+
+        self.assertLess(
+            duration,
+            0.25,
+            "Importing GafferDeadline took {:.1f}ms. Slowest imports :\n{}".format(
+                duration * 1000,
+                self.__slowest(slowestTimes)
+            )
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
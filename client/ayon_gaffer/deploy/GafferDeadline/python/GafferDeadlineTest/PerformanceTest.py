@@ -0,0 +1,213 @@
+##########################################################################
+#
+#  Copyright (c) 2019, Hypothetical Inc. All rights reserved.
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#      * Redistributions of source code must retain the above
+#        copyright notice, this list of conditions and the following
+#        disclaimer.
+#
+#      * Redistributions in binary form must reproduce the above
+#        copyright notice, this list of conditions and the following
+#        disclaimer in the documentation and/or other materials provided with
+#        the distribution.
+#
+#      * Neither the name of Hypothetical Inc. nor the names of
+#        any other contributors to this software may be used to endorse or
+#        promote products derived from this software without specific prior
+#        written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+#  IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+#  THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+#  PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+#  CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+#  EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+#  PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+#  PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+#  LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+#  NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+#  SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+##########################################################################
+
+import os
+import time
+import unittest
+from unittest import mock
+
+import Gaffer
+import GafferTest
+import GafferDispatch
+import GafferDispatchTest
+
+import GafferDeadline
+
+
+@unittest.skipUnless(
+    os.environ.get("GAFFERDEADLINE_PERFORMANCE_TESTS") == "1",
+    "Set GAFFERDEADLINE_PERFORMANCE_TESTS=1 to run the performance tests."
+)
+class PerformanceTest(GafferTest.TestCase):
+    """ Benchmarks comparing how long things take at different sizes. They dispatch thousands
+    of jobs and are sensitive to the load on the machine, so they are only run when the
+    `GAFFERDEADLINE_PERFORMANCE_TESTS` environment variable is set to 1.
+    """
+
+    def __dispatch(self, nodes, dispatcher=None):
+        jobs = []
+
+        def f(dispatcher, job):
+            jobs.append(job)
+
+        c = GafferDeadline.DeadlineDispatcher.preSpoolSignal().connect(f, scoped=True)
+
+        if dispatcher is None:
+            dispatcher = GafferDeadline.DeadlineDispatcher()
+            dispatcher["jobsDirectory"].setValue(self.temporaryDirectory() / "testJobDirectory")
+
+        with mock.patch(
+            "GafferDeadline.DeadlineTools.submitJob",
+            return_value=("testID", "testMessage")
+        ):
+            dispatcher.dispatch(nodes)
+
+        return jobs
+
+    def testJobRegistryScaling(self):
+        timings = {}
+        for numJobs in [10, 100, 1000, 5000]:
+            # One LoggingTaskNode job per wedge value, all feeding a shared downstream job.
+            s = Gaffer.ScriptNode()
+            s["n"] = GafferDispatchTest.LoggingTaskNode()
+            s["n"]["wedge"] = Gaffer.StringPlug(
+                defaultValue="${wedge:value}",
+                flags=Gaffer.Plug.Flags.Default | Gaffer.Plug.Flags.Dynamic
+            )
+            s["w"] = GafferDispatch.Wedge()
+            s["w"]["preTasks"][0].setInput(s["n"]["task"])
+            s["w"]["mode"].setValue(int(GafferDispatch.Wedge.Mode.IntRange))
+            s["w"]["intMin"].setValue(1)
+            s["w"]["intMax"].setValue(numJobs)
+            s["n2"] = GafferDispatchTest.LoggingTaskNode()
+            s["n2"]["preTasks"][0].setInput(s["w"]["task"])
+
+            startTime = time.perf_counter()
+            jobs = self.__dispatch([s["n2"]])
+            timings[numJobs] = time.perf_counter() - startTime
+
+            self.assertEqual(len(jobs), numJobs + 1)
+
+        # The job registry lookup is constant time, so a 5x increase in jobs
+        # should be nowhere near the 25x increase quadratic lookups would give.
+        self.assertLess(timings[5000] / timings[1000], 12.0)
+
+    def testDependencyScaling(self):
+        #   n1
+        #   |
+        #   t1 (TaskList)
+        #   |
+        #   n2
+        timings = {}
+        for numFrames in [100, 1000, 2000]:
+            s = Gaffer.ScriptNode()
+
+            s["n1"] = GafferDispatchTest.LoggingTaskNode()
+            s["n1"]["frame"] = Gaffer.StringPlug(
+                defaultValue="${frame}",
+                flags=Gaffer.Plug.Flags.Default | Gaffer.Plug.Flags.Dynamic
+            )
+            s["n1"]["dispatcher"]["batchSize"].setValue(1)
+
+            s["t1"] = GafferDispatch.TaskList()
+            s["t1"]["preTasks"][0].setInput(s["n1"]["task"])
+
+            s["n2"] = GafferDispatchTest.LoggingTaskNode()
+            s["n2"]["frame"] = Gaffer.StringPlug(
+                defaultValue="${frame}",
+                flags=Gaffer.Plug.Flags.Default | Gaffer.Plug.Flags.Dynamic
+            )
+            s["n2"]["dispatcher"]["batchSize"].setValue(1)
+            s["n2"]["preTasks"][0].setInput(s["t1"]["task"])
+
+            dispatcher = GafferDeadline.DeadlineDispatcher()
+            dispatcher["jobsDirectory"].setValue(self.temporaryDirectory() / "testJobDirectory")
+            dispatcher["framesMode"].setValue(dispatcher.FramesMode.CustomRange)
+            dispatcher["frameRange"].setValue("1-{}".format(numFrames))
+
+            jobs = self.__dispatch([s["n2"]], dispatcher)
+            job = [j for j in jobs if j.getGafferNode() == s["n2"]][0]
+
+            startTime = time.perf_counter()
+            dependencies = job.getDependencies()
+            timings[numFrames] = time.perf_counter() - startTime
+
+            self.assertEqual(len(dependencies), numFrames)
+
+        # Resolving dependencies is linear in the number of tasks
+        self.assertLess(timings[2000] / timings[1000], 5.0)
+
+    def testFrameCompaction(self):
+        # 10k frames made of stepped runs separated by gaps
+        frames = []
+        for block in range(0, 100):
+            start = block * 250
+            frames.extend(range(start, start + 200, 2))
+
+        startTime = time.perf_counter()
+        runs = GafferDeadline.FrameRangeAlgo.compactFrames(frames)
+        GafferDeadline.FrameRangeAlgo.frameString(runs)
+        duration = time.perf_counter() - startTime
+
+        self.assertEqual(len(runs), 100)
+        self.assertLess(duration, 1.0)
+
+    def testSubmissionProfileMatcher(self):
+        # Hundreds of task nodes matched against dozens of profiles, compared with searching
+        # every profile for every node.
+        s = Gaffer.ScriptNode()
+        for i in range(500):
+            s["c{}".format(i)] = GafferDispatch.SystemCommand()
+            s["c{}".format(i)]["command"].setValue("command{}".format(i % 50))
+            s["l{}".format(i)] = GafferDispatchTest.LoggingTaskNode()
+
+        profiles = []
+        for i in range(50):
+            profiles.append(
+                (["GafferDispatch::SystemCommand"], {"pool": i}, {"command": "command{}".format(i)})
+            )
+            profiles.append((["GafferTest::Fake{}".format(i)], {"pool": -1}, {}))
+
+        def linearMatch(node):
+            for typeNames, settings, plugValues in profiles:
+                if node.typeName() not in typeNames:
+                    continue
+                if all(
+                    name not in node.keys() or node[name].getValue() == value
+                    for name, value in plugValues.items()
+                ):
+                    return settings
+            return None
+
+        nodes = s.children(GafferDispatch.TaskNode)
+
+        startTime = time.perf_counter()
+        expected = [linearMatch(n) for n in nodes]
+        linearTime = time.perf_counter() - startTime
+
+        startTime = time.perf_counter()
+        matcher = GafferDeadline.SubmissionProfileMatcher()
+        for profile in profiles:
+            matcher.addProfile(*profile)
+        result = [matcher.match(n) for n in nodes]
+        matcherTime = time.perf_counter() - startTime
+
+        self.assertEqual(result, expected)
+        self.assertLess(matcherTime, linearTime)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+##########################################################################
+#
+#  Copyright (c) 2019, Hypothetical Inc. All rights reserved.
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#      * Redistributions of source code must retain the above
+#        copyright notice, this list of conditions and the following
+#        disclaimer.
+#
+#      * Redistributions in binary form must reproduce the above
+#        copyright notice, this list of conditions and the following
+#        disclaimer in the documentation and/or other materials provided with
+#        the distribution.
+#
+#      * Neither the name of Hypothetical Inc. nor the names of
+#        any other contributors to this software may be used to endorse or
+#        promote products derived from this software without specific prior
+#        written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+#  IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+#  THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+#  PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+#  CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+#  EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+#  PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+#  PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+#  LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+#  NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+#  SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+##########################################################################
+
+import unittest
+
+import Gaffer
+import GafferTest
+import GafferDispatch
+import GafferDispatchTest
+
+import GafferDeadline
+
+
+class SubmissionProfileMatcherTest(GafferTest.TestCase):
+
+    def testMatch(self):
+        s = Gaffer.ScriptNode()
+        s["c1"] = GafferDispatch.SystemCommand()
+        s["c1"]["command"].setValue("render")
+        s["c2"] = GafferDispatch.SystemCommand()
+        s["c2"]["command"].setValue("denoise")
+        s["p"] = GafferDispatch.PythonCommand()
+        s["l"] = GafferDispatchTest.LoggingTaskNode()
+
+        matcher = GafferDeadline.SubmissionProfileMatcher()
+        matcher.addProfile(["GafferDispatch::SystemCommand"], {"pool": "a"}, {"command": "render"})
+        matcher.addProfile(
+            ["GafferDispatch::SystemCommand", "GafferDispatch::PythonCommand"],
+            {"pool": "b"},
+            {"missingPlug": 1}
+        )
+        matcher.addProfile(["GafferDispatch::SystemCommand"], {"pool": "c"})
+
+        self.assertEqual(matcher.numProfiles(), 3)
+        self.assertEqual(
+            matcher.typeNames(),
+            {"GafferDispatch::SystemCommand", "GafferDispatch::PythonCommand"}
+        )
+
+        # The first matching profile wins, and missing plugs don't prevent a match
+        self.assertEqual(matcher.match(s["c1"]), {"pool": "a"})
+        self.assertEqual(matcher.match(s["c2"]), {"pool": "b"})
+        self.assertEqual(matcher.match(s["p"]), {"pool": "b"})
+        self.assertIsNone(matcher.match(s["l"]))
+
+        # Plug values aren't kept between matches
+        s["c2"]["command"].setValue("render")
+        self.assertEqual(matcher.match(s["c2"]), {"pool": "a"})
+
+    def testMatchesLinearSearch(self):
+        # Many task nodes matched against many profiles give the same results as searching
+        # every profile for every node. How long that takes is checked in PerformanceTest.
+        s = Gaffer.ScriptNode()
+        for i in range(100):
+            s["c{}".format(i)] = GafferDispatch.SystemCommand()
+            s["c{}".format(i)]["command"].setValue("command{}".format(i % 50))
+            s["l{}".format(i)] = GafferDispatchTest.LoggingTaskNode()
+
+        profiles = []
+        for i in range(50):
+            profiles.append(
+                (["GafferDispatch::SystemCommand"], {"pool": i}, {"command": "command{}".format(i)})
+            )
+            profiles.append((["GafferTest::Fake{}".format(i)], {"pool": -1}, {}))
+
+        def linearMatch(node):
+            for typeNames, settings, plugValues in profiles:
+                if node.typeName() not in typeNames:
+                    continue
+                if all(
+                    name not in node.keys() or node[name].getValue() == value
+                    for name, value in plugValues.items()
+                ):
+                    return settings
+            return None
+
+        nodes = s.children(GafferDispatch.TaskNode)
+
+        expected = [linearMatch(n) for n in nodes]
+
+        matcher = GafferDeadline.SubmissionProfileMatcher()
+        for profile in profiles:
+            matcher.addProfile(*profile)
+        result = [matcher.match(n) for n in nodes]
+
+        self.assertEqual(result, expected)
+        self.assertEqual(len([r for r in result if r is not None]), 100)
+
+
+if __name__ == "__main__":
+    unittest.main()
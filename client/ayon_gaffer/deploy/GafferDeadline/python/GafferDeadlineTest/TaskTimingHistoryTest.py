@@ -0,0 +1,118 @@
+##########################################################################
+#
+#  Copyright (c) 2019, Hypothetical Inc. All rights reserved.
+#
+#  Redistribution and use in source and binary forms, with or without
+#  modification, are permitted provided that the following conditions are
+#  met:
+#
+#      * Redistributions of source code must retain the above
+#        copyright notice, this list of conditions and the following
+#        disclaimer.
+#
+#      * Redistributions in binary form must reproduce the above
+#        copyright notice, this list of conditions and the following
+#        disclaimer in the documentation and/or other materials provided with
+#        the distribution.
+#
+#      * Neither the name of Hypothetical Inc. nor the names of
+#        any other contributors to this software may be used to endorse or
+#        promote products derived from this software without specific prior
+#        written permission.
+#
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS
+#  IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO,
+#  THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR
+#  PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+#  CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+#  EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+#  PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+#  PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+#  LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+#  NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+#  SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+##########################################################################
+
+import os
+import json
+import unittest
+
+import GafferTest
+
+import GafferDeadline
+
+
+class TaskTimingHistoryTest(GafferTest.TestCase):
+
+    def __task(self, frames, seconds, status=5):
+        return {
+            "Frames": frames,
+            "Stat": status,
+            "StartRen": "2024-05-01T10:00:00.250Z",
+            "Comp": "2024-05-01T10:{:02d}:{:02d}.250Z".format(seconds // 60, seconds % 60),
+        }
+
+    def testJobTasks(self):
+        history = GafferDeadline.TaskTimingHistory(self.temporaryDirectory())
+        self.assertIsNone(history.secondsPerFrame("n"))
+
+        history.addPendingJob("n", "job1")
+        history.addPendingJob("n", "job1")
+        self.assertEqual(history.pendingJobs(), {"n": ["job1"]})
+
+        # Incomplete jobs stay pending, but their completed tasks are measured
+        history.addJobTasks("n", "job1", [self.__task("1-10", 100), self.__task("11-20", 0, 2)])
+        self.assertEqual(history.secondsPerFrame("n"), 10.0)
+        self.assertEqual(history.pendingJobs(), {"n": ["job1"]})
+
+        history.addJobTasks("n", "job1", [self.__task("11-19x2", 150)])
+        self.assertEqual(history.secondsPerFrame("n"), 20.0)
+        self.assertEqual(history.pendingJobs(), {})
+
+        # Tasks of a pending job are only measured once, however often they are read
+        history.addPendingJob("n", "job3")
+        tasks = [self.__task("1-10", 100), self.__task("11-20", 0, 2)]
+        tasks[0]["TaskID"] = 0
+        tasks[1]["TaskID"] = 1
+        history.addJobTasks("n", "job3", tasks)
+        self.assertEqual(history.secondsPerFrame("n"), 15.0)
+        history.addJobTasks("n", "job3", tasks)
+        self.assertEqual(history.secondsPerFrame("n"), 15.0)
+        self.assertEqual(history.pendingJobs(), {"n": ["job3"]})
+
+        tasks[1] = self.__task("11-20", 100)
+        tasks[1]["TaskID"] = 1
+        history.addJobTasks("n", "job3", tasks)
+        self.assertEqual(history.secondsPerFrame("n"), 12.5)
+        self.assertEqual(history.pendingJobs(), {})
+
+        # Tasks that never started are ignored
+        task = self.__task("1", 10)
+        task["StartRen"] = "0001-01-01T00:00:00Z"
+        history.addJobTasks("n", "job2", [task])
+        self.assertEqual(history.secondsPerFrame("n"), 12.5)
+
+    def testSave(self):
+        history = GafferDeadline.TaskTimingHistory(self.temporaryDirectory())
+        history.addTiming("n", 30, 3)
+        history.addPendingJob("m", "job1")
+        history.save()
+        self.assertTrue(os.path.isfile(history.path()))
+
+        history = GafferDeadline.TaskTimingHistory(self.temporaryDirectory())
+        self.assertEqual(history.secondsPerFrame("n"), 10.0)
+        self.assertEqual(history.pendingJobs(), {"m": ["job1"]})
+
+    def testVersion1Pending(self):
+        with open(os.path.join(self.temporaryDirectory(), "deadlineTaskTimings.json"), "w") as f:
+            json.dump({"version": 1, "nodes": {}, "pending": {"n": ["job1", "job2"]}}, f)
+
+        history = GafferDeadline.TaskTimingHistory(self.temporaryDirectory())
+        self.assertEqual(history.pendingJobs(), {"n": ["job1", "job2"]})
+        history.addJobTasks("n", "job1", [self.__task("1-10", 100)])
+        self.assertEqual(history.pendingJobs(), {"n": ["job2"]})
+
+
+if __name__ == "__main__":
+    unittest.main()
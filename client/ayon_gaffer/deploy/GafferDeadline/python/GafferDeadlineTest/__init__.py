@@ -36,8 +36,19 @@
 
 import unittest
 
+from .FakeWebService import FakeWebService
+
 from .DeadlineDispatcherTest import DeadlineDispatcherTest
 from .GafferDeadlineJobTest import GafferDeadlineJobTest
+from .DeadlineToolsTest import DeadlineToolsTest
+from .FrameRangeAlgoTest import FrameRangeAlgoTest
+from .TaskTimingHistoryTest import TaskTimingHistoryTest
+from .BatchDependencyTest import BatchDependencyTest
+from .DispatchTraceTest import DispatchTraceTest
+from .DeadlineListCacheTest import DeadlineListCacheTest
+from .ImportTimeTest import ImportTimeTest
+from .SubmissionProfileMatcherTest import SubmissionProfileMatcherTest
+from .PerformanceTest import PerformanceTest
 
 if __name__ == "__main__":
     unittest.main()
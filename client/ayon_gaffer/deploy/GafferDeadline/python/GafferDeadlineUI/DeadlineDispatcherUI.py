@@ -37,6 +37,8 @@
 # TODO: figure out how to get the secondary pool list from Deadline API
 
 
+import IECore
+
 import Gaffer
 import GafferDispatch
 import GafferDeadline
@@ -48,7 +50,71 @@ Gaffer.Metadata.registerNode(
     "description",
     """
     Dispatches tasks to Deadline.
-    """
+    """,
+
+    plugs={
+
+        "incremental": [
+
+            "description",
+            """
+            Reuses the Deadline jobs from earlier dispatches of the same job name
+            when nothing about them has changed, including the upstream scenes and
+            images they depend on. Only changed jobs are submitted again. Reused jobs
+            must still exist in Deadline and must not have failed.
+            """,
+
+        ],
+
+        "submitInBackground": [
+
+            "description",
+            """
+            Builds and submits the Deadline jobs on a background thread, so the UI
+            stays responsive while a large job is submitted. The script is still saved
+            before dispatching returns. Editing the graph cancels the submission, and
+            any jobs already submitted are left on Deadline. Whether the jobs were
+            submitted is reported in the message log once the submission finishes.
+            """,
+
+        ],
+
+        "adaptiveBatching": [
+
+            "description",
+            """
+            Chooses how many frames go in each Deadline task from how long each node's
+            frames took in earlier dispatches of the same job name, so every task takes
+            about the target task duration. Cheap nodes get fewer, longer tasks and
+            expensive nodes are split across more Workers. Nodes that haven't been
+            measured yet use their batch size.
+            """,
+
+        ],
+
+        "targetTaskDuration": [
+
+            "description",
+            """
+            The number of seconds each Deadline task should take when adaptive batching
+            is on.
+            """,
+
+        ],
+
+        "dryRun": [
+
+            "description",
+            """
+            Builds the Deadline jobs without submitting them. Each job payload is
+            written to the "dryRun" folder of the job directory, together with a
+            "dispatchPlan.json" summary of the jobs' frames, tasks and dependencies.
+            Use it to check a large dispatch before using farm capacity.
+            """,
+
+        ],
+
+    }
 
 )
 
@@ -166,6 +232,15 @@ Gaffer.Metadata.registerNode(
             If set to 0, this parameter is ignored.
             """
         ],
+        "dispatcher.deadline.persistentWorker": [
+            "description",
+            """
+            Keeps one Gaffer process running on each Worker for all the tasks of the job
+            it renders, instead of starting Gaffer and loading the script for every task.
+            This is much faster for jobs with many short tasks, such as ImageWriters, but
+            the tasks share any state Gaffer keeps between executions.
+            """
+        ],
         "dispatcher.deadline.limitToSlaveLimit": [
             "description",
             """
@@ -324,3 +399,27 @@ Gaffer.Metadata.registerNode(
     }
 
 )
+
+##########################################################################
+# Submission messages
+##########################################################################
+
+# Background submissions finish after the dispatch dialogue has reported the
+# dispatch, so the outcome is reported in the message log once the jobs exist.
+
+def __submitted(dispatcher, jobs, status):
+
+    if status == "submitted":
+        IECore.msg(
+            IECore.Msg.Level.Info,
+            dispatcher.getName(),
+            "Submitted {} Deadline jobs".format(
+                len([j for j in jobs if j.getJobID() is not None])
+            )
+        )
+    elif status == "cancelled":
+        IECore.msg(IECore.Msg.Level.Warning, dispatcher.getName(), "Deadline submission cancelled")
+    else:
+        IECore.msg(IECore.Msg.Level.Error, dispatcher.getName(), "Deadline submission failed")
+
+GafferDeadline.DeadlineDispatcher.submittedSignal().connect(__submitted, scoped=False)
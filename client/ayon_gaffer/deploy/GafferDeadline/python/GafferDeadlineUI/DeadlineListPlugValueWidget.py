@@ -39,7 +39,7 @@ import GafferUI
 import GafferDeadlineUI
 import IECore
 
-from GafferDeadline import DeadlineTools
+import GafferDeadline
 
 
 class DeadlineListPlugValueWidget(GafferUI.PlugValueWidget):
@@ -84,18 +84,24 @@ class DeadlineListPlugValueWidget(GafferUI.PlugValueWidget):
             self.getPlug(),
             "deadlineListPlugValueWidget:multiSelect"
         )
-        if Gaffer.Metadata.value(self.getPlug(), "deadlineListPlugValueWidget:type") == "pools":
-            deadlineListString = ",".join(DeadlineTools.getPools())
-            dialogTitle = "Select Pools"
-        elif Gaffer.Metadata.value(self.getPlug(), "deadlineListPlugValueWidget:type") == "groups":
-            deadlineListString = ",".join(DeadlineTools.getGroups())
-            dialogTitle = "Select Groups"
-        elif Gaffer.Metadata.value(self.getPlug(), "deadlineListPlugValueWidget:type") == "slaves":
-            deadlineListString = ",".join(DeadlineTools.getMachineList())
-            dialogTitle = "Select Slaves"
-        elif Gaffer.Metadata.value(self.getPlug(), "deadlineListPlugValueWidget:type") == "limits":
-            deadlineListString = ",".join(DeadlineTools.getLimitGroups())
-            dialogTitle = "Select Limits"
+        listType = Gaffer.Metadata.value(self.getPlug(), "deadlineListPlugValueWidget:type")
+        dialogTitle = {
+            "pools": "Select Pools",
+            "groups": "Select Groups",
+            "slaves": "Select Slaves",
+            "limits": "Select Limits",
+        }[listType]
+
+        # Lists are cached across sessions and refreshed in the background when they get old,
+        # so the dialogue only waits for Deadline the first time a list is used.
+        cache = GafferDeadline.DeadlineListCache.defaultCache()
+        deadlineList = cache.values(listType, refresh=False)
+        if cache.isStale(listType):
+            if deadlineList:
+                cache.refresh(listType)
+            else:
+                deadlineList = cache.fetch(listType)
+        deadlineListString = ",".join(deadlineList)
 
         optionListString = deadlineListString.split(",")
         selectionString = self.getPlug().getValue().split(",")
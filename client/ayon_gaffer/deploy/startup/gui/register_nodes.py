@@ -8,7 +8,6 @@ from ayon_gaffer.api.nodes import (
 )
 import ayon_gaffer.api.pipeline
 from ayon_gaffer import GAFFER_HOST_DIR
-import GafferDeadline
 
 
 application = application  # noqa
@@ -34,6 +33,3 @@ boxnode_path = os.path.join(GAFFER_HOST_DIR, "api", "nodes", "boxnodes")
 ayon_gaffer.api.nodes.register_boxnode_path(boxnode_path)
 ayon_gaffer.api.nodes.update_boxnode_menu(application)
 
-
-ayon_gaffer.api.pipeline.DEADLINE_LIMIT_GROUPS = GafferDeadline.DeadlineTools.getLimitGroups()
-
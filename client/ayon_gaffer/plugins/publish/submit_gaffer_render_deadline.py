@@ -9,7 +9,7 @@ import requests
 import pyblish.api
 
 
-from ayon_core.pipeline import AYONPyblishPluginMixin
+from ayon_core.pipeline import AYONPyblishPluginMixin, publish
 
 from ayon_core.lib import (
     BoolDef,
@@ -29,6 +29,15 @@ import ayon_gaffer.api.pipeline
 log = Logger.get_logger("ayon_gaffer.plugins.publish.submit_gaffer_render_deadline")
 
 
+def get_render_nodes(root_node):
+    """Return the Render nodes directly inside `root_node`."""
+    try:
+        import GafferScene
+    except ModuleNotFoundError:
+        return []
+    return root_node.children(GafferScene.Render)
+
+
 class GafferSubmitDeadline(pyblish.api.InstancePlugin,
                            AYONPyblishPluginMixin):
     """Submit write to Deadline
@@ -53,6 +62,7 @@ class GafferSubmitDeadline(pyblish.api.InstancePlugin,
     secondary_pool = ""
     department = ""
     limit_groups = {}
+    submission_profiles = GafferDeadline.SubmissionProfileMatcher()
     use_gpu = False
     env_allowed_keys = []
     env_search_replace_values = {}
@@ -80,10 +90,40 @@ class GafferSubmitDeadline(pyblish.api.InstancePlugin,
         settings = project_settings["gaffer"]["deadline"]["default_submission_settings"]  # noqa
         cls.priority = settings["priority"]
         cls.limit_groups = project_settings["gaffer"]["deadline"]["limit_groups"]
+        cls.submission_profiles = cls.build_submission_profiles(
+            project_settings["gaffer"]["deadline"]
+            ["task_node_submission_settings"])
+
+    @staticmethod
+    def build_submission_profiles(task_node_settings):
+        """
+        Index the per-type submission settings by task node type name, so
+        they are only compiled once per publish rather than searched for
+        every task node.
+        """
+        matcher = GafferDeadline.SubmissionProfileMatcher()
+        for entry in task_node_settings:
+            node_settings = entry["submission_settings"]
+            settings = {
+                "priority": node_settings["priority"],
+                "pool": node_settings["primary_pool"],
+                "secondaryPool": node_settings["secondary_pool"],
+                "group": node_settings["group"],
+            }
+            for task_entry in entry["task_node"]:
+                matcher.addProfile(
+                    task_entry["type_names"],
+                    settings,
+                    {
+                        plug["name"]: plug[plug["type"]]
+                        for plug in task_entry["plugs"]
+                    }
+                )
+        return matcher
 
     @classmethod
     def get_attribute_defs(cls):
-        limit_groups = [""] + ayon_gaffer.api.pipeline.DEADLINE_LIMIT_GROUPS
+        limit_groups = [""] + ayon_gaffer.api.pipeline.get_deadline_limit_groups()
         return [
             NumberDef(
                 "priority",
@@ -122,75 +162,38 @@ class GafferSubmitDeadline(pyblish.api.InstancePlugin,
 
         node = instance.data["transientData"]["node"]
 
-        self.log.info(f"Submitting {node}")
-        with node.scriptNode().context() as ctxt:
-            render_shot_name = instance.data["folderPath"].split("/")[-1]
-            # create a dispatcher
-            dispatcher = GafferDeadline.DeadlineDispatcher()
-            # set some dispatcher settings
-            job_name = ctxt.substitute('${script:name}')
-            job_directory = ctxt.substitute(
-                '${project:rootDirectory}/dispatcher/deadline'
-                )
-            self.log.info(f"Job name: {job_name}, dir: {job_directory}")
-            dispatcher['jobName'].setValue(job_name)
-            dispatcher['jobsDirectory'].setValue(job_directory)
+        self.log.info(f"Preparing {node} for submission")
+        render_shot_name = instance.data["folderPath"].split("/")[-1]
 
-            dispatcher['framesMode'].setValue(2)
-            dispatcher['frameRange'].setValue(
-                ','.join([str(f) for f in frames])
-            )
-            self.log.info(
-                f"{dispatcher['framesMode'].getValue()}; "
-                "{dispatcher['frameRange'].getValue()}"
-            )
-            self.populate_dispatcher_env_vars(node)
-
-            # clear the dispatcher limits plug, since we construct it with
-            # the arnold limit, the calculated limit groups and user input
-            self.clear_limits(node)
-            # these methods add their results to their respective task node
-            # limits knob for the deadline dispatcher.
-            self.add_arnold_limits(node)
-            self.add_limit_groups(node)
-            saved_settings = self.apply_submission_settings(node, instance)
-
-            saved_context_vars = self.set_render_context_vars(
-                node, render_shot_name)
-
-            dispatcher.dispatch([node])
-
-            self.restore_render_context_vars(node, saved_context_vars)
-
-            self.clear_dispatcher_env_vars(node)
-            self.restore_submission_settings(node, saved_settings)
-
-            submitted_jobs = [job for job in dispatcher._deadlineJobs
-                              if job._jobId is not None]
-
-            # if the job is zero frames or not doing anything, then it gets a
-            # job id of None
-            if len(submitted_jobs) == 0:
-                # we submitted no jobs
-                raise Exception('No jobs were submitted, check framerange')
-
-            # since GafferDeadline has it's own job class, we need to map from
-            # that one to the proper Deadline job class used in other places
-            # within Ayon
-            fake_deadline_job = {}
-            for j in submitted_jobs:
-                self.log.info(f'submitted job {j._jobId}')
-            last_submitted_job = submitted_jobs[-1]
-            fake_deadline_job["_id"] = last_submitted_job._jobId
-            fake_deadline_job["Props"] = {
-                "Env": last_submitted_job._environmentVariables.copy(),
-                "Batch": job_name,
-                "User": instance.context.data.get(
-                    "deadlineUser", getpass.getuser())
-            }
+        # The submission is customised through overrides applied by the
+        # dispatcher when it builds the jobs, so the script isn't edited.
+        overrides = GafferDeadline.SubmissionOverrides()
+        self.populate_dispatcher_env_vars(node, overrides)
 
-            instance.data["deadlineSubmissionJob"] = fake_deadline_job
-            instance.data["deadlineSubmissionWaitForIds"] = [j._jobId for j in submitted_jobs]
+        # the dispatcher limits are constructed from the arnold limit and
+        # user input, replacing the limits set on the task nodes. Limit
+        # groups are added by the dispatcher to the jobs that need them.
+        limits = {
+            task_node: ""
+            for task_node in node.children(GafferDispatch.TaskNode)
+        }
+        self.add_arnold_limits(node, limits)
+        self.add_limit_groups(node, instance, overrides)
+        self.apply_submission_settings(node, instance, overrides, limits)
+
+        # a render:shot member left on the layer by older publishes would
+        # override the one set by the dispatcher
+        for plug in ayon_gaffer.api.lib.disable_render_shot_members(node):
+            self.log.warning(f"Disabled {plug.fullName()}")
+        self.set_render_context_vars(overrides, render_shot_name)
+
+        # The render instances are dispatched together by
+        # GafferSubmitDeadlineJobs once they are all prepared.
+        instance.data["transientData"]["deadlineSubmission"] = {
+            "overrides": overrides,
+            "frames": frames,
+            "render_shot": render_shot_name,
+        }
 
     def get_env_var_value(self, var, val):
         if val == '':
@@ -198,59 +201,29 @@ class GafferSubmitDeadline(pyblish.api.InstancePlugin,
         else:
             return val
 
-    def populate_dispatcher_env_vars(self, root_node):
+    def populate_dispatcher_env_vars(self, root_node, overrides):
         self.log.info(f"Setting env vars for {root_node} ...")
 
         for node in root_node.children(GafferDispatch.TaskNode):
             try:
-                env_var_plug = node['dispatcher']['deadline']['environmentVariables']
+                node['dispatcher']['deadline']['environmentVariables']
             except KeyError:
                 log.error(f"No dispatcher settings found on {node}")
                 continue
-            existing_var_plugs = {var['name'].getValue(): var for var in env_var_plug.children()}
             self.log.info(f"- Setting vars for {node}")
 
             for var, value in self.env_vars_to_submit.items():
-                if var not in existing_var_plugs.keys():
-                    the_plug = Gaffer.NameValuePlug(var,
-                        Gaffer.StringPlug("varval",defaultValue='', flags=Gaffer.Plug.Flags.Default | Gaffer.Plug.Flags.Dynamic),
-                        True,
-                        "env_var",
-                        Gaffer.Plug.Flags.Default | Gaffer.Plug.Flags.Dynamic
-                    )
-                    env_var_plug.addChild(the_plug)
-                else:
-                    the_plug = existing_var_plugs[var]
-                the_plug['value'].setValue(self.get_env_var_value(var, value))
+                overrides.addEnvironmentVariable(
+                    var, self.get_env_var_value(var, value), node)
         self.log.info('... done!')
 
-    def clear_dispatcher_env_vars(self, root_node):
-        self.log.info(f"Clearing env vars for {root_node} ...")
-        for node in root_node.children(GafferDispatch.TaskNode):
-            try:
-                deadline_env_plug = node['dispatcher']['deadline']['environmentVariables']
-            except KeyError:
-                # something is missing.
-                continue
-            self.log.info(f"- Clearing vars for {node}")
-            for plug in deadline_env_plug.children():
-                if plug['name'].getValue() in self.env_vars_to_submit.keys():
-                    deadline_env_plug.removeChild(plug)
-        self.log.info('... done!')
-
-    def add_arnold_limits(self, root_node):
+    def add_arnold_limits(self, root_node, limits):
         """
-        Traverses the script for either ArnoldRender nodes or Render nodes set
-        to "Arnold", if they are found add the "arnold" limit to the deadline
-        submission
+        Looks in the render layer for either ArnoldRender nodes or Render
+        nodes set to "Arnold", if they are found add the "arnold" limit to
+        the deadline submission
         """
-        try:
-            import GafferScene
-        except ModuleNotFoundError:
-            # no arnold
-            return
-
-        for node in root_node.children(GafferScene.Render):
+        for node in get_render_nodes(root_node):
             self.log.info(f"Arnold limit search: {node}")
             if node.typeName() == "GafferScene::Render":
                 try:
@@ -261,90 +234,61 @@ class GafferSubmitDeadline(pyblish.api.InstancePlugin,
                     # there is no renderer plug, abort, abort!
                     continue
             try:
-                limit_plug = node['dispatcher']['deadline']['limits']
+                node['dispatcher']['deadline']['limits']
             except KeyError as err:
                 # something is wrong here, can't find either "deadline"
                 # or "limits"
                 log.error(f"Could not find deadline dispatcher plugs: {err}")
                 continue
             self.log.info("made it!")
-            ayon_gaffer.api.lib.append_to_csv_plug(limit_plug, "arnold")
+            limits[node] = ayon_gaffer.api.lib.append_to_csv(
+                limits[node], "arnold")
 
-    def add_limit_groups(self, root_node):
+    def add_limit_groups(self, root_node, instance, overrides):
+        """
+        Registers the limit groups with a node type used in the script, so
+        the dispatcher adds them to the jobs evaluating those nodes rather
+        than to every job of the script.
+        """
         if len(self.limit_groups) == 0:
             # no limit groups, nothing to check!
             return
 
-        script_node = root_node.scriptNode()
-        all_nodes = ayon_gaffer.api.lib.get_all_children(script_node)
-
         # first see if we have interesting nodes in here
-        active_node_types = set()
-        for node in all_nodes:
-            tn = node.typeName()
-            if tn in active_node_types:
-                continue
-            if "enabled" not in node.keys():
-                self.log.debug(f"No enabled on {node}")
-                continue
-            if node["enabled"].getValue():
-                active_node_types.add(tn)
-        limits_to_add = []
+        node_index = self.get_node_type_index(
+            instance, root_node.scriptNode())
+        active_node_types = node_index.active_type_names()
         for limit_group in self.limit_groups:
             limit_name = limit_group["name"]
+            type_names = limit_group["value"]
+            if any(t in active_node_types for t in type_names):
+                self.log.info(f"Adding limit group {limit_name}")
+                overrides.setLimitGroup(limit_name, type_names)
 
-            for type_name in limit_group["value"]:
-                if type_name in active_node_types:
-                    limits_to_add.append(limit_name)
-                    break
-
-        if len(limits_to_add) > 0:
-            self.log.info(f"Adding limits {limits_to_add}")
-            for node in root_node.children(GafferDispatch.TaskNode):
-                limit_plug = node['dispatcher']['deadline']['limits']
-                ayon_gaffer.api.lib.append_to_csv_plug(
-                    limit_plug, ",".join(limits_to_add))
-
-    def clear_limits(self, root_node):
-        for node in root_node.children(GafferDispatch.TaskNode):
-            deadline_settings_plug = node['dispatcher']['deadline']
-            self.log.debug(
-                f"Clearing dispatcher limits for [{node.getName()}]")
-            deadline_settings_plug["limits"].setValue("")
-
-    def get_submission_settings(self, node, instance, default_settings):
-        project_settings = instance.context.data["project_settings"]
-        task_node_settings = (project_settings["gaffer"]["deadline"]
-                              ["task_node_submission_settings"])
-
+    @staticmethod
+    def get_node_type_index(instance, script_node):
+        """
+        Returns the NodeTypeIndex of the script, which is built once per
+        publish and shared by all of its instances.
+        """
+        indices = instance.context.data.setdefault(
+            "gafferNodeTypeIndices", {})
+        node_index = indices.get(script_node)
+        if node_index is None:
+            node_index = ayon_gaffer.api.lib.NodeTypeIndex(script_node)
+            indices[script_node] = node_index
+        return node_index
+
+    def get_submission_settings(self, node, default_settings):
         submission_settings = copy.copy(default_settings)
-        for entry in task_node_settings:
-            # first we check the node typeName
-            for task_entry in entry["task_node"]:
-                matching_node = False
-                for type_name in task_entry["type_names"]:
-                    if node.typeName() == type_name:
-                        matching_node = True
-                        # self.log.info(f"Found type {type_name}")
-                        # now we can check the other filters
-                        for plug in task_entry["plugs"]:
-                            pname = plug["name"]
-                            plug_type = plug["type"]
-                            if pname in node.keys():
-                                if node[pname].getValue() != plug[plug_type]:
-                                    matching_node = False
-                if matching_node:
-                    self.log.info(f"Insteresting node {node}")
-                    node_settings = entry["submission_settings"]
-                    submission_settings["priority"] = node_settings["priority"]
-                    submission_settings["pool"] = node_settings["primary_pool"]
-                    submission_settings["secondaryPool"] = node_settings["secondary_pool"]
-                    submission_settings["group"] = node_settings["group"]
-                    return submission_settings
+        node_settings = self.submission_profiles.match(node)
+        if node_settings is not None:
+            self.log.info(f"Insteresting node {node}")
+            submission_settings.update(node_settings)
         return submission_settings
 
-
-    def apply_submission_settings(self, root_node, instance):
+    def apply_submission_settings(self, root_node, instance, overrides,
+                                  limits):
         self.log.info(
             f"Applying submission settings for"
             f"[{root_node.getName()}]"
@@ -355,97 +299,30 @@ class GafferSubmitDeadline(pyblish.api.InstancePlugin,
         default_submission_settings = self.collect_submission_settings(
             instance)
 
-        saved_values = {}
         for node in root_node.children(GafferDispatch.TaskNode):
             self.log.info(f" ** {node.getName()} **")
             # check if we have task node type specific submission settings
             node_submission_settings = self.get_submission_settings(
-                node, instance, default_submission_settings)
+                node, default_submission_settings)
             self.log.info(json.dumps(node_submission_settings, indent=4))
 
-            # store the existing settings so we can reset them after submission
-            deadline_settings_plug = node['dispatcher']['deadline']
-            current_settings = {}
-            for plug in deadline_settings_plug.children():
-                if plug.typeName() == 'Gaffer::CompoundDataPlug':
-                    continue
-                current_settings[plug.getName()] = plug.getValue()
-            saved_values[node.getName()] = current_settings
-
-            # now se set the values
             for key, value in node_submission_settings.items():
                 log.debug(f"Setting [{key}] to [{value}]")
                 if key == "limits":
-                    ayon_gaffer.api.lib.append_to_csv_plug(
-                        deadline_settings_plug["limits"], value)
+                    limits[node] = ayon_gaffer.api.lib.append_to_csv(
+                        limits[node], value)
                 else:
-                    deadline_settings_plug[key].setValue(value)
-
-        return saved_values
-
-    def restore_submission_settings(self, root_node, old_settings):
-        self.log.info(
-            f"Restoring submission settings for"
-            f"[{root_node.getName()}]"
-        )
+                    overrides.setDeadlineSetting(key, value, node)
 
-        for node in root_node.children(GafferDispatch.TaskNode):
-            log.info(f" !! {node.getName()} !!")
-            deadline_settings = node['dispatcher']['deadline']
-            current_settings = old_settings[node.getName()]
-            for key, value in current_settings.items():
-                deadline_settings[key].setValue(value)
-
-    def get_last_context_var_node(self, root_node):
-        plugs = root_node.children(GafferDispatch.TaskNode.TaskPlug)
-        task_out_plug = None
-        for plug in plugs:
-            if plug.direction() == Gaffer.Plug.Direction.Out:
-                task_out_plug = plug
-                break
-        else:
-            raise RuntimeError(
-                f"Could not find a TaskPlug output for {root_node}")
-        task_out_plug_input = task_out_plug.getInput()
-        if task_out_plug_input is None:
-            raise RuntimeError(
-                f"Nothing inside {root_node} is connected to {task_out_plug}"
-                )
-        context_var_nodes = Gaffer.NodeAlgo.upstreamNodes(
-            task_out_plug_input.node(), Gaffer.ContextVariables)
-        if len(context_var_nodes) == 0:
-            # for now we can't insert context variable nodes so we error
-            raise RuntimeError(
-                f"No ContextVariables node found in {root_node}")
-        return context_var_nodes[0]
-
-    def set_render_context_vars(self, root_node, render_shot):
-        self.log.info(f"Setting render context var {root_node}")
-        # first find the task output plug
-        context_var_node = self.get_last_context_var_node(root_node)
-        if "render:shot" not in context_var_node["variables"].keys():
-            self.log.info("no render:shot in node, creating")
-            render_shot_plug = ayon_gaffer.api.lib.create_render_shot_plug()
-            context_var_node["variables"].addChild(render_shot_plug)
-        else:
-            self.log.info('render:shot in node!')
-            render_shot_plug = context_var_node["variables"]["render:shot"]
+        for node, node_limits in limits.items():
+            overrides.setDeadlineSetting("limits", node_limits, node)
 
-        old_render_shot_value = render_shot_plug["value"].getValue()
-        old_render_shot_enabled = render_shot_plug["enabled"].getValue()
-        render_shot_plug["value"].setValue(render_shot)
+    def set_render_context_vars(self, overrides, render_shot):
+        # The dispatcher sets `render:shot` in the context the render is
+        # dispatched in, so it replaces the script's `render:shot` variable
+        # and is taken into account when the tasks are batched.
         self.log.info(f'setting render:shot to {render_shot}')
-        render_shot_plug["enabled"].setValue(True)
-        return {"render:shot": {"value": old_render_shot_value,
-                                "enabled": old_render_shot_enabled}}
-
-    def restore_render_context_vars(self, root_node, old_settings):
-        context_var_node = self.get_last_context_var_node(root_node)
-        for var_name, var_data in old_settings.items():
-            if var_name in context_var_node["variables"].keys():
-                var_plug = context_var_node["variables"][var_name]
-                for key, value in var_data.items():
-                    var_plug[key].setValue(value)
+        overrides.setContextVariable("render:shot", render_shot)
 
     def collect_submission_settings(self, instance):
         """
@@ -472,3 +349,191 @@ class GafferSubmitDeadline(pyblish.api.InstancePlugin,
             "submitSuspended": suspended,
             "limits": limits,
         }
+
+
+class GafferSubmitDeadlineJobs(pyblish.api.ContextPlugin):
+    """Dispatch the render instances prepared by GafferSubmitDeadline
+
+    Instances rendering the same shot and frames of a script are dispatched
+    together, so the upstream tasks they share are only submitted once. The
+    script is serialised once for the whole publish.
+
+    """
+
+    label = "Submit Gaffer Renders to Deadline"
+    order = GafferSubmitDeadline.order + 0.01
+    hosts = ["gaffer"]
+    targets = ["local"]
+
+    def process(self, context):
+        submissions = {}
+        for instance in context:
+            transient_data = instance.data.get("transientData", {})
+            if "deadlineSubmission" not in transient_data:
+                continue
+            submission = transient_data["deadlineSubmission"]
+            script_node = transient_data["node"].scriptNode()
+            group_key = (
+                submission["render_shot"], tuple(submission["frames"]))
+            submissions.setdefault(script_node, {}).setdefault(
+                group_key, []).append(instance)
+
+        failed_instances = []
+        for script_node, groups in submissions.items():
+            failed_instances.extend(self.submit_script(script_node, groups))
+
+        # Every group is submitted before failing, since the ones that
+        # succeeded are already on the farm.
+        if failed_instances:
+            raise publish.KnownPublishError(
+                "Deadline submission failed for {}".format(", ".join(
+                    instance.data.get("label", instance.name)
+                    for instance in failed_instances
+                ))
+            )
+
+    def submit_script(self, script_node, groups):
+        """
+        Dispatches each group of instances, carrying on with the other
+        groups when one fails. Returns the instances that failed.
+        """
+        failed_instances = []
+        with script_node.context() as ctxt:
+            # create a dispatcher, shared by every group so the script is
+            # only serialised once
+            dispatcher = GafferDeadline.DeadlineDispatcher()
+            dispatcher.setReuseScript(True)
+            # set some dispatcher settings
+            job_name = ctxt.substitute('${script:name}')
+            job_directory = ctxt.substitute(
+                '${project:rootDirectory}/dispatcher/deadline'
+                )
+            self.log.info(f"Job name: {job_name}, dir: {job_directory}")
+            dispatcher['jobName'].setValue(job_name)
+            dispatcher['jobsDirectory'].setValue(job_directory)
+            dispatcher['framesMode'].setValue(2)
+
+            for (render_shot, frames), instances in groups.items():
+                nodes = [
+                    instance.data["transientData"]["node"]
+                    for instance in instances
+                ]
+                self.log.info(
+                    f"Submitting {[n.getName() for n in nodes]} "
+                    f"for {render_shot}"
+                )
+
+                overrides = GafferDeadline.SubmissionOverrides()
+                for instance in instances:
+                    overrides.update(
+                        instance.data["transientData"]["deadlineSubmission"]
+                        ["overrides"]
+                    )
+
+                dispatcher['frameRange'].setValue(
+                    ','.join([str(f) for f in frames])
+                )
+                dispatcher.setSubmissionOverrides(overrides)
+                try:
+                    dispatcher.dispatch(nodes)
+                except Exception:
+                    self.log.error(
+                        f"Failed to submit {[n.getName() for n in nodes]} "
+                        f"for {render_shot}", exc_info=True)
+                    failed_instances.extend(instances)
+                    continue
+
+                for instance in instances:
+                    try:
+                        self.set_submitted_jobs(
+                            instance, dispatcher, job_name)
+                    except Exception:
+                        self.log.error(
+                            f"Failed to submit {instance}", exc_info=True)
+                        failed_instances.append(instance)
+
+        return failed_instances
+
+    def set_submitted_jobs(self, instance, dispatcher, job_name):
+        node = instance.data["transientData"]["node"]
+
+        # the jobs for the instance's node and everything upstream of them,
+        # including jobs shared with other instances
+        instance_jobs = set()
+        pending = [
+            job for job in dispatcher._deadlineJobs
+            if job.getGafferNode() == node or
+            node.isAncestorOf(job.getGafferNode())
+        ]
+        while pending:
+            job = pending.pop()
+            if id(job) in instance_jobs:
+                continue
+            instance_jobs.add(id(job))
+            pending.extend(job.getParentJobs())
+
+        submitted_jobs = [job for job in dispatcher._deadlineJobs
+                          if id(job) in instance_jobs and
+                          job._jobId is not None]
+
+        # if the job is zero frames or not doing anything, then it gets a
+        # job id of None
+        if len(submitted_jobs) == 0:
+            # we submitted no jobs
+            raise publish.KnownPublishError(
+                f'No jobs were submitted for {node}, check framerange')
+
+        for j in submitted_jobs:
+            self.log.info(f'submitted job {j._jobId}')
+        render_job = self.get_render_job(node, submitted_jobs)
+        if render_job is None:
+            raise publish.KnownPublishError(
+                f"None of the submitted jobs renders {node}")
+        self.log.info(
+            f"{render_job.getGafferNode().getName()} job {render_job._jobId} "
+            f"is the render job for {node}")
+
+        # since GafferDeadline has it's own job class, we need to map from
+        # that one to the proper Deadline job class used in other places
+        # within Ayon
+        fake_deadline_job = {}
+        fake_deadline_job["_id"] = render_job._jobId
+        fake_deadline_job["Props"] = {
+            "Env": render_job._environmentVariables.copy(),
+            "Batch": job_name,
+            "User": instance.context.data.get(
+                "deadlineUser", getpass.getuser())
+        }
+
+        instance.data["deadlineSubmissionJob"] = fake_deadline_job
+        instance.data["deadlineSubmissionWaitForIds"] = [
+            j._jobId for j in submitted_jobs]
+
+    def get_render_job(self, node, submitted_jobs):
+        """
+        Returns the job of the instance's render node, or None if none of
+        the submitted jobs is for the instance's own nodes. The dispatcher
+        lists the jobs in the order it walked the task graph, so the
+        position of a job in the list says nothing about which node it
+        renders.
+        """
+        render_nodes = get_render_nodes(node)
+        for job in submitted_jobs:
+            if job.getGafferNode() in render_nodes:
+                return job
+
+        # Without a Render node, use a job of the instance's own nodes
+        # that no other job of the instance depends on.
+        parent_jobs = set(
+            id(parent) for job in submitted_jobs
+            for parent in job.getParentJobs()
+        )
+        for job in submitted_jobs:
+            job_node = job.getGafferNode()
+            if (
+                id(job) not in parent_jobs and
+                (job_node == node or node.isAncestorOf(job_node))
+            ):
+                return job
+
+        return None
@@ -0,0 +1,50 @@
+import unittest
+
+import Gaffer
+import GafferTest
+import GafferScene
+
+import ayon_gaffer.api.lib
+
+
+class LibTest(GafferTest.TestCase):
+
+    def testDisableRenderShotMembers(self):
+        # a render layer published before render:shot was set by the
+        # dispatcher, which left an enabled, empty member behind
+        s = Gaffer.ScriptNode()
+        s["b"] = Gaffer.Box()
+        s["b"]["sphere"] = GafferScene.Sphere()
+        s["b"]["vars"] = Gaffer.ContextVariables()
+        s["b"]["vars"].setup(GafferScene.ScenePlug())
+        s["b"]["vars"]["in"].setInput(s["b"]["sphere"]["out"])
+        s["b"]["render"] = GafferScene.Render()
+        s["b"]["render"]["in"].setInput(s["b"]["vars"]["out"])
+        Gaffer.PlugAlgo.promote(s["b"]["render"]["task"])
+
+        s["b"]["vars"]["variables"].addChild(
+            ayon_gaffer.api.lib.create_render_shot_plug())
+        s["b"]["vars"]["variables"].addChild(
+            Gaffer.NameValuePlug(
+                "layer", "beauty", True, "layer",
+                Gaffer.Plug.Flags.Default | Gaffer.Plug.Flags.Dynamic
+            )
+        )
+        members = {
+            m["name"].getValue(): m
+            for m in s["b"]["vars"]["variables"].children()
+        }
+
+        disabled = ayon_gaffer.api.lib.disable_render_shot_members(s["b"])
+
+        self.assertEqual(disabled, [members["render:shot"]])
+        self.assertFalse(members["render:shot"]["enabled"].getValue())
+        self.assertTrue(members["layer"]["enabled"].getValue())
+
+        # already migrated scripts are left as they are
+        self.assertEqual(
+            ayon_gaffer.api.lib.disable_render_shot_members(s["b"]), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
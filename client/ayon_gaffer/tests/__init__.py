@@ -0,0 +1,6 @@
+import unittest
+
+from .LibTest import LibTest
+
+if __name__ == "__main__":
+    unittest.main()